@@ -6,6 +6,13 @@ from app.db.base import Base
 from app.db.models.user_model import User
 from app.db.models.card_model import Card
 from app.db.models.transaction_model import Transaction
+from app.db.models.card_daily_spend_model import CardDailySpend
+from app.db.models.report_rollup_model import (
+    ReportHourlySuccess, ReportUserMonthly, ReportCardMonthly, RollupWatermark
+)
+from app.db.models.fee_bucket_model import FeeDailyBucket, FeeDailyPrefix
+from app.db.models.idempotency_key_model import IdempotencyKey
+from app.db.models.ledger_model import LedgerEntry, LedgerCheckpoint
 from app.core.config import settings
 
 config = context.config
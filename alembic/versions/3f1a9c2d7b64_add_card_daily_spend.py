@@ -0,0 +1,45 @@
+"""add card_daily_spend counters
+
+Revision ID: 3f1a9c2d7b64
+Revises: ddcb9d225ef9
+Create Date: 2026-10-18 09:12:04.381527
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1a9c2d7b64'
+down_revision: Union[str, Sequence[str], None] = 'ddcb9d225ef9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('card_daily_spend',
+    sa.Column('card_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('total', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['card_id'], ['cards.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('card_id', 'day')
+    )
+
+    # --- پر کردن شمارنده‌ها از روی تراکنش‌های موجود ---
+    op.execute("""
+        INSERT INTO card_daily_spend (card_id, day, total)
+        SELECT source_card_id, (created_at AT TIME ZONE 'UTC')::date, SUM(amount)
+        FROM transactions
+        WHERE status = 'SUCCESS'
+          AND source_card_id IS NOT NULL
+          AND created_at IS NOT NULL
+        GROUP BY 1, 2;
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('card_daily_spend')
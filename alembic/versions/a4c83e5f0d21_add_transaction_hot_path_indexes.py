@@ -0,0 +1,66 @@
+"""add hot-path indexes for transactions and cards
+
+Revision ID: a4c83e5f0d21
+Revises: 3f1a9c2d7b64
+Create Date: 2026-10-18 10:02:47.915360
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c83e5f0d21'
+down_revision: Union[str, Sequence[str], None] = '3f1a9c2d7b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY نمی‌تواند داخل تراکنش اجرا شود
+    with op.get_context().autocommit_block():
+        # تاریخچه‌ی تراکنش‌های خروجی کارت (همه‌ی وضعیت‌ها) با ترتیب keyset
+        op.create_index(
+            'ix_transactions_source_card_created_at', 'transactions',
+            ['source_card_id', 'created_at', 'id'],
+            postgresql_concurrently=True,
+        )
+        # مجموع برداشت‌های موفق کارت در یک بازه (شمارنده‌ی روزانه، گزارش ماهانه)
+        op.create_index(
+            'ix_transactions_source_card_success', 'transactions',
+            ['source_card_id', 'created_at'],
+            postgresql_include=['amount'],
+            postgresql_where=sa.text("status = 'SUCCESS'"),
+            postgresql_concurrently=True,
+        )
+        # تاریخچه‌ی تراکنش‌های ورودی کارت
+        op.create_index(
+            'ix_transactions_dest_card_created_at', 'transactions',
+            ['dest_card_id', 'created_at', 'id'],
+            postgresql_concurrently=True,
+        )
+        # درآمد کارمزد و گزارش ساعتی روی تراکنش‌های موفق
+        op.create_index(
+            'ix_transactions_created_at_success', 'transactions',
+            ['created_at'],
+            postgresql_include=['fee'],
+            postgresql_where=sa.text("status = 'SUCCESS'"),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_cards_user_id', 'cards', ['user_id'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_cards_user_id', table_name='cards', postgresql_concurrently=True)
+        op.drop_index('ix_transactions_created_at_success', table_name='transactions', postgresql_concurrently=True)
+        op.drop_index('ix_transactions_dest_card_created_at', table_name='transactions', postgresql_concurrently=True)
+        op.drop_index('ix_transactions_source_card_success', table_name='transactions', postgresql_concurrently=True)
+        op.drop_index('ix_transactions_source_card_created_at', table_name='transactions', postgresql_concurrently=True)
@@ -0,0 +1,226 @@
+"""add ledger entries and balance checkpoints
+
+Revision ID: b7d3e9f2a416
+Revises: f6a1c3e8b5d2
+Create Date: 2026-10-18 21:05:37.204118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3e9f2a416'
+down_revision: Union[str, Sequence[str], None] = 'f6a1c3e8b5d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# همان تابع bank_transfer (5b8e1f3c9a72) به‌علاوه‌ی نوشتن سطرهای دفتر کل
+BANK_TRANSFER_SQL = """
+CREATE OR REPLACE FUNCTION bank_transfer(
+    p_src_number varchar,
+    p_dst_number varchar,
+    p_amount numeric,
+    p_user_id integer,
+    p_description varchar,
+    p_fee_rate numeric DEFAULT 0.10,
+    p_fee_cap numeric DEFAULT 100000,
+    p_daily_cap numeric DEFAULT 50000000
+)
+RETURNS TABLE (
+    error_code text,
+    id integer,
+    source_card_id integer,
+    dest_card_id integer,
+    amount numeric,
+    fee numeric,
+    status transactionstatus,
+    description varchar,
+    created_at timestamptz
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_src cards%ROWTYPE;
+    v_dst cards%ROWTYPE;
+    v_tx transactions%ROWTYPE;
+    v_today date := (now() AT TIME ZONE 'UTC')::date;
+    v_spent numeric;
+    v_fee numeric;
+BEGIN
+    IF p_amount IS NULL OR p_amount <= 0 THEN
+        error_code := 'INVALID_AMOUNT';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    IF p_src_number = p_dst_number THEN
+        error_code := 'SAME_CARD';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    -- lock both cards in id order so concurrent transfers cannot deadlock
+    PERFORM 1 FROM cards c
+    WHERE c.card_number IN (p_src_number, p_dst_number)
+    ORDER BY c.id
+    FOR UPDATE;
+
+    SELECT * INTO v_src FROM cards c WHERE c.card_number = p_src_number;
+    SELECT * INTO v_dst FROM cards c WHERE c.card_number = p_dst_number;
+
+    IF v_src.id IS NULL OR v_dst.id IS NULL THEN
+        error_code := 'CARD_NOT_FOUND';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    IF v_src.user_id IS DISTINCT FROM p_user_id THEN
+        error_code := 'FORBIDDEN';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    IF NOT COALESCE(v_src.is_active, FALSE) OR NOT COALESCE(v_dst.is_active, FALSE) THEN
+        error_code := 'CARD_INACTIVE';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    SELECT s.total INTO v_spent
+    FROM card_daily_spend s
+    WHERE s.card_id = v_src.id AND s.day = v_today;
+
+    IF COALESCE(v_spent, 0) + p_amount > p_daily_cap THEN
+        error_code := 'DAILY_LIMIT';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    v_fee := LEAST(floor(p_amount * p_fee_rate), p_fee_cap);
+
+    IF COALESCE(v_src.balance, 0) < p_amount + v_fee THEN
+        error_code := 'INSUFFICIENT_FUNDS';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    INSERT INTO transactions (source_card_id, dest_card_id, amount, fee, status, description, created_at)
+    VALUES (v_src.id, v_dst.id, p_amount, v_fee, 'SUCCESS', p_description, now())
+    RETURNING * INTO v_tx;
+
+    INSERT INTO card_daily_spend (card_id, day, total)
+    VALUES (v_src.id, v_today, p_amount)
+    ON CONFLICT (card_id, day)
+    DO UPDATE SET total = card_daily_spend.total + EXCLUDED.total;
+
+    INSERT INTO fee_daily_buckets (day, slot, total, tx_count)
+    VALUES ((v_tx.created_at AT TIME ZONE 'UTC')::date, v_src.id % 16, v_fee, 1)
+    ON CONFLICT (day, slot)
+    DO UPDATE SET total = fee_daily_buckets.total + EXCLUDED.total,
+                  tx_count = fee_daily_buckets.tx_count + EXCLUDED.tx_count;
+
+    INSERT INTO ledger_entries (transaction_id, card_id, entry_type, amount)
+    VALUES (v_tx.id, v_src.id, 'TRANSFER', -v_tx.amount),
+           (v_tx.id, v_dst.id, 'TRANSFER', v_tx.amount),
+           (v_tx.id, v_src.id, 'FEE', -v_tx.fee),
+           (v_tx.id, NULL, 'FEE', v_tx.fee);
+
+    UPDATE cards c SET balance = c.balance - (p_amount + v_fee) WHERE c.id = v_src.id;
+    UPDATE cards c SET balance = c.balance + p_amount WHERE c.id = v_dst.id;
+
+    RETURN QUERY SELECT NULL::text, v_tx.id, v_tx.source_card_id, v_tx.dest_card_id,
+        v_tx.amount, v_tx.fee, v_tx.status, v_tx.description, v_tx.created_at;
+END;
+$$;
+"""
+
+# چهار سطر هر تراکنش SUCCESS؛ برای برداشت طرف مقصد خالی است و سطر دوم به حساب نقد بانک می‌رود
+POSTINGS = """
+    CROSS JOIN LATERAL (VALUES
+        (t.source_card_id, CASE WHEN t.dest_card_id IS NULL THEN 'WITHDRAWAL' ELSE 'TRANSFER' END::ledger_entry_type,
+         -t.amount),
+        (t.dest_card_id, CASE WHEN t.dest_card_id IS NULL THEN 'WITHDRAWAL' ELSE 'TRANSFER' END::ledger_entry_type,
+         t.amount),
+        (t.source_card_id, 'FEE'::ledger_entry_type, -t.fee),
+        (NULL::integer, 'FEE'::ledger_entry_type, t.fee)
+    ) p(card_id, entry_type, amount)
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('ledger_entries',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('transaction_id', sa.Integer(), nullable=True),
+    sa.Column('card_id', sa.Integer(), nullable=True),
+    sa.Column('entry_type', sa.Enum('TRANSFER', 'WITHDRAWAL', 'FEE', 'OPENING', name='ledger_entry_type'),
+              nullable=False),
+    sa.Column('amount', sa.Numeric(precision=20, scale=2), nullable=False),
+    sa.Column('posted_at', sa.DateTime(timezone=True), server_default=sa.text('clock_timestamp()'), nullable=False),
+    sa.CheckConstraint("card_id IS NOT NULL OR entry_type <> 'TRANSFER'", name='ck_ledger_entries_bank_side'),
+    sa.ForeignKeyConstraint(['card_id'], ['cards.id']),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('ledger_checkpoints',
+    sa.Column('card_id', sa.Integer(), nullable=False),
+    sa.Column('posted_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('entry_id', sa.BigInteger(), nullable=False),
+    sa.Column('balance', sa.Numeric(precision=20, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['card_id'], ['cards.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('card_id', 'posted_at', 'entry_id')
+    )
+
+    # --- دفتر کل از روی تراکنش‌های موجود؛ اختلاف موجودی فعلی کارت با جمع حرکت‌هایش سطر افتتاحیه می‌شود ---
+    op.execute(f"""
+        INSERT INTO ledger_entries (transaction_id, card_id, entry_type, amount, posted_at)
+        SELECT NULL, v.card_id, 'OPENING', v.amount, o.posted_at
+        FROM (
+            SELECT c.id AS card_id,
+                   c.balance - COALESCE(m.net, 0) AS amount,
+                   COALESCE(LEAST(c.created_at, m.first_at), now()) AS posted_at
+            FROM cards c
+            LEFT JOIN (
+                SELECT p.card_id, SUM(p.amount) AS net, MIN(t.created_at) AS first_at
+                FROM transactions t
+                {POSTINGS}
+                WHERE t.status = 'SUCCESS' AND t.source_card_id IS NOT NULL AND p.card_id IS NOT NULL
+                GROUP BY p.card_id
+            ) m ON m.card_id = c.id
+        ) o
+        CROSS JOIN LATERAL (VALUES (o.card_id, o.amount), (NULL::integer, -o.amount)) v(card_id, amount)
+        WHERE o.amount <> 0
+        ORDER BY o.posted_at, o.card_id;
+    """)
+    op.execute(f"""
+        INSERT INTO ledger_entries (transaction_id, card_id, entry_type, amount, posted_at)
+        SELECT t.id, p.card_id, p.entry_type, p.amount, t.created_at
+        FROM transactions t
+        {POSTINGS}
+        WHERE t.status = 'SUCCESS' AND t.source_card_id IS NOT NULL
+        ORDER BY t.created_at, t.id;
+    """)
+    op.create_index('ix_ledger_entries_card_posted_at', 'ledger_entries', ['card_id', 'posted_at', 'id'],
+                    postgresql_include=['amount'], postgresql_where=sa.text('card_id IS NOT NULL'))
+    op.execute("ANALYZE ledger_entries;")
+
+    # checkpointها را دستور app.db.ledger_checkpoints از id صفر به بعد می‌سازد
+    op.execute("INSERT INTO rollup_watermark (name, last_id) VALUES ('ledger', 0);")
+
+    op.execute(BANK_TRANSFER_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    previous = op.get_context().script.get_revision('5b8e1f3c9a72')
+    op.execute(previous.module.BANK_TRANSFER_SQL)
+
+    op.execute("DELETE FROM rollup_watermark WHERE name = 'ledger';")
+    op.drop_table('ledger_checkpoints')
+    op.drop_index('ix_ledger_entries_card_posted_at', table_name='ledger_entries')
+    op.drop_table('ledger_entries')
+    sa.Enum(name='ledger_entry_type').drop(op.get_bind(), checkfirst=True)
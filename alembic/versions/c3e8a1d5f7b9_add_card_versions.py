@@ -0,0 +1,156 @@
+"""add card versions
+
+Revision ID: c3e8a1d5f7b9
+Revises: b7d3e9f2a416
+Create Date: 2026-10-18 23:41:12.518304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8a1d5f7b9'
+down_revision: Union[str, Sequence[str], None] = 'b7d3e9f2a416'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# همان تابع bank_transfer (b7d3e9f2a416) که version هر دو کارت را هم یکی بالا می‌برد
+BANK_TRANSFER_SQL = """
+CREATE OR REPLACE FUNCTION bank_transfer(
+    p_src_number varchar,
+    p_dst_number varchar,
+    p_amount numeric,
+    p_user_id integer,
+    p_description varchar,
+    p_fee_rate numeric DEFAULT 0.10,
+    p_fee_cap numeric DEFAULT 100000,
+    p_daily_cap numeric DEFAULT 50000000
+)
+RETURNS TABLE (
+    error_code text,
+    id integer,
+    source_card_id integer,
+    dest_card_id integer,
+    amount numeric,
+    fee numeric,
+    status transactionstatus,
+    description varchar,
+    created_at timestamptz
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_src cards%ROWTYPE;
+    v_dst cards%ROWTYPE;
+    v_tx transactions%ROWTYPE;
+    v_today date := (now() AT TIME ZONE 'UTC')::date;
+    v_spent numeric;
+    v_fee numeric;
+BEGIN
+    IF p_amount IS NULL OR p_amount <= 0 THEN
+        error_code := 'INVALID_AMOUNT';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    IF p_src_number = p_dst_number THEN
+        error_code := 'SAME_CARD';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    -- lock both cards in id order so concurrent transfers cannot deadlock
+    PERFORM 1 FROM cards c
+    WHERE c.card_number IN (p_src_number, p_dst_number)
+    ORDER BY c.id
+    FOR UPDATE;
+
+    SELECT * INTO v_src FROM cards c WHERE c.card_number = p_src_number;
+    SELECT * INTO v_dst FROM cards c WHERE c.card_number = p_dst_number;
+
+    IF v_src.id IS NULL OR v_dst.id IS NULL THEN
+        error_code := 'CARD_NOT_FOUND';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    IF v_src.user_id IS DISTINCT FROM p_user_id THEN
+        error_code := 'FORBIDDEN';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    IF NOT COALESCE(v_src.is_active, FALSE) OR NOT COALESCE(v_dst.is_active, FALSE) THEN
+        error_code := 'CARD_INACTIVE';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    SELECT s.total INTO v_spent
+    FROM card_daily_spend s
+    WHERE s.card_id = v_src.id AND s.day = v_today;
+
+    IF COALESCE(v_spent, 0) + p_amount > p_daily_cap THEN
+        error_code := 'DAILY_LIMIT';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    v_fee := LEAST(floor(p_amount * p_fee_rate), p_fee_cap);
+
+    IF COALESCE(v_src.balance, 0) < p_amount + v_fee THEN
+        error_code := 'INSUFFICIENT_FUNDS';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    INSERT INTO transactions (source_card_id, dest_card_id, amount, fee, status, description, created_at)
+    VALUES (v_src.id, v_dst.id, p_amount, v_fee, 'SUCCESS', p_description, now())
+    RETURNING * INTO v_tx;
+
+    INSERT INTO card_daily_spend (card_id, day, total)
+    VALUES (v_src.id, v_today, p_amount)
+    ON CONFLICT (card_id, day)
+    DO UPDATE SET total = card_daily_spend.total + EXCLUDED.total;
+
+    INSERT INTO fee_daily_buckets (day, slot, total, tx_count)
+    VALUES ((v_tx.created_at AT TIME ZONE 'UTC')::date, v_src.id % 16, v_fee, 1)
+    ON CONFLICT (day, slot)
+    DO UPDATE SET total = fee_daily_buckets.total + EXCLUDED.total,
+                  tx_count = fee_daily_buckets.tx_count + EXCLUDED.tx_count;
+
+    INSERT INTO ledger_entries (transaction_id, card_id, entry_type, amount)
+    VALUES (v_tx.id, v_src.id, 'TRANSFER', -v_tx.amount),
+           (v_tx.id, v_dst.id, 'TRANSFER', v_tx.amount),
+           (v_tx.id, v_src.id, 'FEE', -v_tx.fee),
+           (v_tx.id, NULL, 'FEE', v_tx.fee);
+
+    UPDATE cards c SET balance = c.balance - (p_amount + v_fee), version = c.version + 1 WHERE c.id = v_src.id;
+    UPDATE cards c SET balance = c.balance + p_amount, version = c.version + 1 WHERE c.id = v_dst.id;
+
+    RETURN QUERY SELECT NULL::text, v_tx.id, v_tx.source_card_id, v_tx.dest_card_id,
+        v_tx.amount, v_tx.fee, v_tx.status, v_tx.description, v_tx.created_at;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # default ثابت در PostgreSQL 11+ جدول را بازنویسی نمی‌کند
+    op.add_column('cards', sa.Column('version', sa.BigInteger(), server_default=sa.text('1'), nullable=False))
+
+    op.execute(BANK_TRANSFER_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    previous = op.get_context().script.get_revision('b7d3e9f2a416')
+    op.execute(previous.module.BANK_TRANSFER_SQL)
+
+    op.drop_column('cards', 'version')
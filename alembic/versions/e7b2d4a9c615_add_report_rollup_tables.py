@@ -0,0 +1,59 @@
+"""add report rollup tables
+
+Revision ID: e7b2d4a9c615
+Revises: c92e4b7a1f3d
+Create Date: 2026-10-18 13:02:47.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2d4a9c615'
+down_revision: Union[str, Sequence[str], None] = 'c92e4b7a1f3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('report_hourly_success',
+    sa.Column('hour_utc', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('success_count', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('hour_utc')
+    )
+    op.create_table('report_user_monthly',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('month_utc', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('total_amount', sa.Numeric(precision=20, scale=2), nullable=False),
+    sa.Column('tx_count', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'month_utc')
+    )
+    op.create_table('report_card_monthly',
+    sa.Column('card_id', sa.Integer(), nullable=False),
+    sa.Column('month_utc', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('total_amount', sa.Numeric(precision=20, scale=2), nullable=False),
+    sa.Column('tx_count', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['card_id'], ['cards.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('card_id', 'month_utc')
+    )
+    op.create_table('rollup_watermark',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('last_id', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    # جدول‌ها خالی می‌مانند؛ پر کردن آن‌ها (به صورت تکه‌تکه) کار دستور refresh_rollups است
+    op.execute("INSERT INTO rollup_watermark (name, last_id) VALUES ('transactions', 0);")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rollup_watermark')
+    op.drop_table('report_card_monthly')
+    op.drop_table('report_user_monthly')
+    op.drop_table('report_hourly_success')
@@ -0,0 +1,192 @@
+"""partition transactions by created_at month
+
+Revision ID: f6a1c3e8b5d2
+Revises: d4f2a8c61e93
+Create Date: 2026-10-18 18:40:12.552904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a1c3e8b5d2'
+down_revision: Union[str, Sequence[str], None] = 'd4f2a8c61e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# ماه‌های پیش‌ساخته بعد از ماه جاری
+MONTHS_AHEAD = 3
+
+SECONDARY_INDEXES = (
+    "CREATE INDEX ix_transactions_source_card_created_at ON transactions (source_card_id, created_at, id)",
+    "CREATE INDEX ix_transactions_source_card_success ON transactions (source_card_id, created_at) "
+    "INCLUDE (amount) WHERE status = 'SUCCESS'",
+    "CREATE INDEX ix_transactions_dest_card_created_at ON transactions (dest_card_id, created_at, id)",
+    "CREATE INDEX ix_transactions_created_at_success ON transactions (created_at) "
+    "INCLUDE (fee) WHERE status = 'SUCCESS'",
+)
+
+FOREIGN_KEYS = ("transactions_source_card_id_fkey", "transactions_dest_card_id_fkey")
+
+COLUMNS = "id, source_card_id, dest_card_id, amount, fee, status, created_at, description"
+
+# Each UTC month gets a partition named transactions_YYYY_MM. Rows that arrived in
+# transactions_default before their month existed are moved into the new
+# partition before it is attached, so a missed maintenance run never blocks
+# creating the partition later.
+ENSURE_PARTITIONS_SQL = """
+CREATE OR REPLACE FUNCTION ensure_transaction_partitions(p_from date, p_to date)
+RETURNS SETOF text
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_month date := date_trunc('month', p_from)::date;
+    v_name text;
+    v_lower timestamptz;
+    v_upper timestamptz;
+BEGIN
+    WHILE v_month < p_to LOOP
+        v_name := 'transactions_' || to_char(v_month, 'YYYY_MM');
+        IF to_regclass(v_name) IS NULL THEN
+            v_lower := v_month::timestamp AT TIME ZONE 'UTC';
+            v_upper := (v_month + interval '1 month')::timestamp AT TIME ZONE 'UTC';
+            EXECUTE format('CREATE TABLE %I (LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM transactions_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved', v_lower, v_upper, v_name);
+            EXECUTE format('ALTER TABLE transactions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           v_name, v_lower, v_upper);
+            RETURN NEXT v_name;
+        END IF;
+        v_month := (v_month + interval '1 month')::date;
+    END LOOP;
+END;
+$$;
+"""
+
+# Detaches (and optionally drops) every monthly partition that ends on or before p_before.
+DETACH_PARTITIONS_SQL = """
+CREATE OR REPLACE FUNCTION detach_transaction_partitions(p_before date, p_drop boolean DEFAULT false)
+RETURNS SETOF text
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_name text;
+BEGIN
+    FOR v_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'transactions'::regclass
+          AND c.relname ~ '^transactions_[0-9]{4}_[0-9]{2}$'
+          AND (to_date(substr(c.relname, 14), 'YYYY_MM') + interval '1 month')::date <= p_before
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE transactions DETACH PARTITION %I', v_name);
+        IF p_drop THEN
+            EXECUTE format('DROP TABLE %I', v_name);
+        END IF;
+        RETURN NEXT v_name;
+    END LOOP;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE transactions RENAME TO transactions_unpartitioned;")
+    for constraint in ("transactions_pkey", *FOREIGN_KEYS):
+        op.execute(f"ALTER TABLE transactions_unpartitioned RENAME CONSTRAINT {constraint} "
+                   f"TO {constraint.replace('transactions', 'transactions_unpartitioned', 1)};")
+    for index in ("ix_transactions_id", "ix_transactions_source_card_created_at", "ix_transactions_source_card_success",
+                  "ix_transactions_dest_card_created_at", "ix_transactions_created_at_success"):
+        op.execute(f"ALTER INDEX {index} RENAME TO {index.replace('ix_transactions', 'ix_transactions_unpartitioned')};")
+
+    # کلید partition باید جزء PK باشد؛ یکتایی id از دنباله می‌آید و PK خودش جستجو با id را پوشش می‌دهد
+    op.execute("""
+        CREATE TABLE transactions (
+            id integer NOT NULL DEFAULT nextval('transactions_id_seq'),
+            source_card_id integer CONSTRAINT transactions_source_card_id_fkey REFERENCES cards(id),
+            dest_card_id integer CONSTRAINT transactions_dest_card_id_fkey REFERENCES cards(id),
+            amount numeric(15, 2) NOT NULL,
+            fee numeric(15, 2) NOT NULL,
+            status transactionstatus NOT NULL,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            description varchar(255),
+            CONSTRAINT transactions_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+    """)
+    op.execute("CREATE TABLE transactions_default PARTITION OF transactions DEFAULT;")
+    op.execute(ENSURE_PARTITIONS_SQL)
+    op.execute(DETACH_PARTITIONS_SQL)
+    op.execute(f"""
+        SELECT ensure_transaction_partitions(
+            COALESCE((SELECT MIN(created_at) FROM transactions_unpartitioned), now())::date,
+            (now() + interval '{MONTHS_AHEAD + 1} months')::date
+        );
+    """)
+
+    # ردیف‌های بدون created_at (ستون قبلاً nullable بود) با epoch در partition پیش‌فرض می‌مانند
+    op.execute(f"""
+        INSERT INTO transactions ({COLUMNS})
+        SELECT id, source_card_id, dest_card_id, amount, fee, status,
+               COALESCE(created_at, to_timestamp(0)), description
+        FROM transactions_unpartitioned;
+    """)
+    # ایندکس‌ها بعد از کپی ساخته می‌شوند؛ روی parent تعریف و روی هر partition ساخته می‌شوند
+    for sql in SECONDARY_INDEXES:
+        op.execute(sql + ";")
+
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id;")
+    op.execute("DROP TABLE transactions_unpartitioned;")
+    op.execute("ANALYZE transactions;")
+
+    # بازپخش کلید idempotency با (id, created_at) فقط partition همان ماه را می‌خواند
+    op.add_column('idempotency_keys', sa.Column('transaction_created_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute("""
+        UPDATE idempotency_keys k SET transaction_created_at = t.created_at
+        FROM transactions t WHERE t.id = k.transaction_id;
+    """)
+    op.execute("DELETE FROM idempotency_keys WHERE transaction_created_at IS NULL;")
+    op.alter_column('idempotency_keys', 'transaction_created_at', nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('idempotency_keys', 'transaction_created_at')
+    op.execute("ALTER TABLE transactions RENAME TO transactions_partitioned;")
+    for constraint in ("transactions_pkey", *FOREIGN_KEYS):
+        op.execute(f"ALTER TABLE transactions_partitioned RENAME CONSTRAINT {constraint} "
+                   f"TO {constraint.replace('transactions', 'transactions_partitioned', 1)};")
+    for sql in SECONDARY_INDEXES:
+        index = sql.split()[2]
+        op.execute(f"ALTER INDEX {index} RENAME TO {index.replace('ix_transactions', 'ix_transactions_partitioned')};")
+
+    op.execute("""
+        CREATE TABLE transactions (
+            id integer NOT NULL DEFAULT nextval('transactions_id_seq'),
+            source_card_id integer CONSTRAINT transactions_source_card_id_fkey REFERENCES cards(id),
+            dest_card_id integer CONSTRAINT transactions_dest_card_id_fkey REFERENCES cards(id),
+            amount numeric(15, 2) NOT NULL,
+            fee numeric(15, 2) NOT NULL,
+            status transactionstatus NOT NULL,
+            created_at timestamptz DEFAULT now(),
+            description varchar(255),
+            CONSTRAINT transactions_pkey PRIMARY KEY (id)
+        );
+    """)
+    op.execute(f"INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_partitioned;")
+    op.execute("CREATE INDEX ix_transactions_id ON transactions (id);")
+    for sql in SECONDARY_INDEXES:
+        op.execute(sql + ";")
+
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id;")
+    op.execute("DROP TABLE transactions_partitioned CASCADE;")
+    op.execute("DROP FUNCTION detach_transaction_partitions(date, boolean);")
+    op.execute("DROP FUNCTION ensure_transaction_partitions(date, date);")
+    op.execute("ANALYZE transactions;")
@@ -1,21 +1,28 @@
-from typing import Optional
+from typing import AsyncGenerator, Optional
+from asyncpg import Connection
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
-from asyncpg import Connection
 
+from app.core.card_versions import invalidate_card_version
+from app.core.principals import get_cached_principal, cache_principal, principal_generation
 from app.core.security import decode_access_token
-from app.db.session import get_db_connection
+from app.db.replica import replica_monitor
+from app.db.session import (
+    get_db_connection,
+    get_read_connection,
+    get_fresh_read_connection,
+    get_analytics_connection,
+    get_batch_connection,
+    acquire_read_connection
+)
 from app.repositories.user_repo import UserRepository
 from app.schemas.auth_schema import TokenPayload
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 
 
-async def get_current_user(
-        token: str = Depends(oauth2_scheme),
-        conn: Connection = Depends(get_db_connection),
-) -> dict:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -30,10 +37,29 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user_repo = UserRepository(conn)
-    user_data = await user_repo.get_by_id(int(token_data.sub))
+    user_id = int(token_data.sub)
+    principal = get_cached_principal(user_id)
+    if principal is not None:
+        return principal
+
+    # فقط در miss کش یک اتصال از pool گرفته می‌شود
+    generation = principal_generation()
+    async with acquire_read_connection(user_id) as conn:
+        user_data = await UserRepository(conn).get_by_id(user_id)
 
     if user_data is None:
         raise credentials_exception
 
-    return user_data
\ No newline at end of file
+    return cache_principal(user_data, generation)
+
+
+async def get_user_read_connection(current_user: dict = Depends(get_current_user)) -> AsyncGenerator[Connection, None]:
+    """get_read_connection for the current user's own data; stays on the primary until the replica has their last write."""
+    async with acquire_read_connection(current_user['id']) as connection:
+        yield connection
+
+
+def note_write(user_id: int):
+    """Endpoints call this after a user's write commits, so their next reads see it."""
+    replica_monitor.note_write(user_id)
+    invalidate_card_version(user_id)
@@ -3,7 +3,7 @@ from fastapi.security import OAuth2PasswordRequestForm
 from asyncpg import Connection
 
 from app.schemas.auth_schema import UserCreate, Token, UserOut
-from app.api.v1.deps import get_db_connection, get_current_user
+from app.api.v1.deps import get_db_connection, get_fresh_read_connection, get_current_user, note_write
 from app.repositories.user_repo import UserRepository
 from app.services.auth_services import AuthService
 
@@ -18,16 +18,19 @@ async def register(user_in: UserCreate, conn: Connection = Depends(get_db_connec
         created = await auth_svc.register_user(user_in)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": str(e)})
+    note_write(created['id'])
     return created
 
 
 @router.post("/token", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends(),
-                conn: Connection = Depends(get_db_connection)):
+                conn: Connection = Depends(get_fresh_read_connection)):
     user_repo = UserRepository(conn)
     auth_svc = AuthService(user_repo)
     try:
         user = await auth_svc.authenticate(form_data.username, form_data.password)
+    except HTTPException:
+        raise
     except Exception:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail={"error": "Authentication failed"})
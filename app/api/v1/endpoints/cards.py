@@ -1,20 +1,72 @@
-from fastapi import APIRouter, Depends
-from typing import List, Dict, Any
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from typing import List, Dict, Any, Optional
 from asyncpg import Connection
 
-from app.api.v1.deps import get_db_connection, get_current_user
+from app.api.v1.deps import get_user_read_connection, get_current_user
+from app.core.card_versions import get_cached_card_version, cache_card_version
+from app.core.etags import make_etag, etag_matches, with_etag, not_modified
+from app.core.json_encoding import RecordEncoder
+from app.db.session import acquire_read_connection
 from app.repositories.card_repo import CardRepository
-from app.schemas.card_schema import CardOut
+from app.repositories.ledger_repo import LedgerRepository
+from app.schemas.card_schema import CardOut, CardBalanceOut
 
 router = APIRouter(prefix="/api/v1/cards", tags=["cards"])
 
+# ستون‌های حساس (cvv2، تاریخ انقضا) چون در CardOut نیستند نوشته نمی‌شوند
+CARD_JSON = RecordEncoder(CardOut)
+
 
 @router.get("/", response_model=List[CardOut])
 async def list_user_cards(
     current_user: Dict[str, Any] = Depends(get_current_user),
-    conn: Connection = Depends(get_db_connection),
+    if_none_match: Optional[str] = Header(None),
+):
+    user_id = current_user['id']
+    if if_none_match:
+        # نسخه‌ی کش‌شده‌ی همین worker: بدون گرفتن اتصال
+        version = get_cached_card_version(user_id)
+        if version is not None and etag_matches(if_none_match, etag := make_etag(user_id, version)):
+            return not_modified(etag)
+
+    async with acquire_read_connection(user_id) as conn:
+        card_repo = CardRepository(conn)
+        if if_none_match:
+            version = cache_card_version(user_id, await card_repo.version_for_user(user_id))
+            if etag_matches(if_none_match, etag := make_etag(user_id, version)):
+                return not_modified(etag)
+        cards = await card_repo.list_records_by_user(user_id)
+
+    # نسخه از همان سطرهایی حساب می‌شود که در پاسخ هستند
+    version = cache_card_version(user_id, sum(card['version'] for card in cards))
+    return with_etag(CARD_JSON.response(cards), make_etag(user_id, version))
+
+
+@router.get("/{card_number}/balance", response_model=CardBalanceOut)
+async def card_balance_as_of(
+    card_number: str,
+    response: Response,
+    at: Optional[datetime] = Query(None, description="point in time; defaults to now"),
+    if_none_match: Optional[str] = Header(None),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    conn: Connection = Depends(get_user_read_connection),
 ):
+    card = await CardRepository(conn).get_by_number(card_number)
+    if card is None or card['user_id'] != current_user['id']:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail="Card does not belong to the current user.")
+
+    # version ثابت یعنی هیچ سطر دفتر کلی برای کارت اضافه نشده، پس موجودی در همان لحظه همان است؛
+    # at (به UTC، بدون tz مثل asyncpg به وقت محلی) جزو ETag است چون هر لحظه موجودی خودش را دارد.
+    # weak چون بدون at بدنه زمان فعلی را دارد
+    at_utc = at.astimezone(timezone.utc).isoformat() if at else "now"
+    etag = make_etag(card['id'], card['version'], at_utc, weak=True)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    with_etag(response, etag)
 
-    card_repo = CardRepository(conn)
-    cards = await card_repo.list_by_user(current_user['id'])
-    return [CardOut(**card) for card in cards]  # explicit mapping
+    at = at or datetime.now(timezone.utc)
+    result = await LedgerRepository(conn).balance_as_of(card['id'], at)
+    return CardBalanceOut(card_number=card_number, at=at, balance=result['balance'],
+                          checkpoint_at=result['checkpoint_at'])
@@ -0,0 +1,88 @@
+import logging
+import traceback
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from asyncpg import Connection
+
+from app.api.v1.deps import get_analytics_connection, get_current_user
+from app.core.pagination import encode_cursor, decode_cursor
+from app.repositories.report_repo import ReportRepository
+from app.schemas.report_schema import HourlySuccessOut, UserMonthlyPage, CardMonthlyPage
+from app.services.report_service import ReportService
+
+router = APIRouter(prefix="/api/v1/reports", tags=["reports"])
+
+
+def get_report_repo(conn: Connection = Depends(get_analytics_connection)) -> ReportRepository:
+    return ReportRepository(conn)
+
+def get_report_service(
+        conn: Connection = Depends(get_analytics_connection),
+        report_repo: ReportRepository = Depends(get_report_repo)
+) -> ReportService:
+    return ReportService(conn, report_repo)
+
+
+@router.get("/success-per-hour", response_model=List[HourlySuccessOut])
+async def success_per_hour(
+        report_service: ReportService = Depends(get_report_service),
+        current_user: dict = Depends(get_current_user)
+):
+    try:
+        return await report_service.success_per_hour()
+    except Exception as e:
+        logging.error(f"Error fetching hourly report: {e}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Failed to fetch hourly report.")
+
+def _page_position(cursor: Optional[str]) -> Optional[tuple[datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+
+def _page(rows: list[dict], limit: int, id_field: str) -> dict:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['month_utc'], rows[-1][id_field])
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+# گزارش‌های ماهانه فقط داده‌ی خود کاربر را برمی‌گردانند؛ نام و شماره‌ی کارت دیگران در آن‌ها نیست
+@router.get("/user-monthly", response_model=UserMonthlyPage)
+async def user_monthly(
+        limit: int = Query(12, gt=0, le=120),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        report_service: ReportService = Depends(get_report_service),
+        current_user: dict = Depends(get_current_user)
+):
+    before = _page_position(cursor)
+    try:
+        rows = await report_service.user_monthly(current_user['id'], limit + 1, before)
+    except Exception as e:
+        logging.error(f"Error fetching user monthly report: {e}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Failed to fetch user monthly report.")
+    return _page(rows, limit, 'user_id')
+
+@router.get("/card-monthly", response_model=CardMonthlyPage)
+async def card_monthly(
+        limit: int = Query(12, gt=0, le=120),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        report_service: ReportService = Depends(get_report_service),
+        current_user: dict = Depends(get_current_user)
+):
+    before = _page_position(cursor)
+    try:
+        rows = await report_service.card_monthly(current_user['id'], limit + 1, before)
+    except Exception as e:
+        logging.error(f"Error fetching card monthly report: {e}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Failed to fetch card monthly report.")
+    return _page(rows, limit, 'card_id')
@@ -1,14 +1,25 @@
 import logging
 import traceback
 from datetime import datetime
-from typing import Optional
+from typing import AsyncGenerator, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
 from decimal import Decimal
 
 from asyncpg import Connection
 
-from app.api.v1.deps import get_db_connection, get_current_user
+from app.api.v1.deps import (
+    get_read_connection,
+    get_user_read_connection,
+    get_batch_connection,
+    get_current_user,
+    note_write
+)
+from app.core.config import settings
+from app.core.json_encoding import RecordEncoder, encode_nullable_str, json_response
+from app.db.session import ANALYTICS, get_pool, acquire_connection, acquire_read_connection
+from app.core.pagination import encode_cursor, decode_cursor
 from app.services.transaction_service import (
     TransactionService,
     InsufficientFunds,
@@ -17,52 +28,79 @@ from app.services.transaction_service import (
 )
 from app.schemas.transaction_schema import (
     TransferIn,
+    TransferBatchIn,
+    TransferBatchOut,
     WithdrawIn,
     TransactionOut,
+    TransactionPage,
     TotalRevenueResponse,
     RevenueFilters
 )
 from app.repositories.transaction_repo import TransactionRepository
 from app.repositories.card_repo import CardRepository
+from app.services.export_service import StatementExporter, MEDIA_TYPES
+from app.services.card_lanes import card_lanes
+from app.services.group_commit import group_commit
+from app.services.idempotency import IdempotencyConflict
 
 router = APIRouter(prefix="/api/v1/transactions", tags=["transactions"])
 
+# لیست‌های تراکنش مستقیم از Record به بایت JSON نوشته می‌شوند؛ response_model فقط برای مستندات است
+TRANSACTION_JSON = RecordEncoder(TransactionOut)
+
 
-def get_card_repo(conn: Connection = Depends(get_db_connection)) -> CardRepository:
-    return CardRepository(conn)
+def get_history_repo(conn: Connection = Depends(get_user_read_connection)) -> TransactionRepository:
+    return TransactionRepository(conn)
 
-def get_transaction_repo(conn: Connection = Depends(get_db_connection)) -> TransactionRepository:
+def get_revenue_repo(conn: Connection = Depends(get_read_connection)) -> TransactionRepository:
     return TransactionRepository(conn)
 
-def get_transaction_service(
-        conn: Connection = Depends(get_db_connection),
-        tx_repo: TransactionRepository = Depends(get_transaction_repo),
-        card_repo: CardRepository = Depends(get_card_repo)
-) -> TransactionService:
-    return TransactionService(conn, tx_repo, card_repo)
+def get_batch_service(conn: Connection = Depends(get_batch_connection)) -> TransactionService:
+    # دسته‌ها اتصال را طولانی نگه می‌دارند؛ از pool تحلیلی تا انتقال‌های تکی منتظرشان نمانند
+    return TransactionService(conn, TransactionRepository(conn), CardRepository(conn))
+
+async def get_transfer_service() -> AsyncGenerator[TransactionService, None]:
+    # در حالت lanes و group درخواست تا نوبت کارتش اتصالی از pool نگه نمی‌دارد
+    if settings.TRANSFER_EXECUTION == "lanes":
+        yield TransactionService.on_lanes(card_lanes)
+        return
+    if settings.TRANSFER_EXECUTION == "group":
+        yield TransactionService.on_group_commit(group_commit)
+        return
+    async with acquire_connection() as conn:
+        yield TransactionService(conn, TransactionRepository(conn), CardRepository(conn))
 
 
 @router.post("/withdraw", response_model=TransactionOut, status_code=status.HTTP_201_CREATED)
 async def withdraw(
         body: WithdrawIn,
         current_user: dict = Depends(get_current_user),
-        tx_service: TransactionService = Depends(get_transaction_service),
+        tx_service: TransactionService = Depends(get_transfer_service),
+        idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
 ):
     try:
         tx = await tx_service.withdraw_from_card(
             body.card_number,
             body.amount,
             body.description,
-            user_id=current_user['id']
+            user_id=current_user['id'],
+            idempotency_key=idempotency_key
         )
+        note_write(current_user['id'])
         return tx
 
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
     except (BusinessRuleViolation, InsufficientFunds, ForbiddenOperation) as e:
         status_code = status.HTTP_400_BAD_REQUEST
         if isinstance(e, ForbiddenOperation):
             status_code = status.HTTP_403_FORBIDDEN
         raise HTTPException(status_code=status_code, detail=str(e))
 
+    except HTTPException:
+        raise
+
     except Exception as e:
         logging.error(f"Internal Server Error in withdraw: {e}\n{traceback.format_exc()}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -72,7 +110,8 @@ async def withdraw(
 async def transfer(
         body: TransferIn,
         current_user: dict = Depends(get_current_user),
-        tx_service: TransactionService = Depends(get_transaction_service),
+        tx_service: TransactionService = Depends(get_transfer_service),
+        idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
 ):
     try:
         tx = await tx_service.transfer(
@@ -80,47 +119,149 @@ async def transfer(
             body.dest_card,
             body.amount,
             body.description,
-            user_id=current_user['id']
+            user_id=current_user['id'],
+            idempotency_key=idempotency_key
         )
+        note_write(current_user['id'])
         return tx
 
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
     except (BusinessRuleViolation, InsufficientFunds, ForbiddenOperation) as e:
         status_code = status.HTTP_400_BAD_REQUEST
         if isinstance(e, ForbiddenOperation):
             status_code = status.HTTP_403_FORBIDDEN
         raise HTTPException(status_code=status_code, detail=str(e))
 
+    except HTTPException:
+        raise
+
     except Exception as e:
         logging.error(f"Internal Server Error in transfer: {e}\n{traceback.format_exc()}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="An unknown error occurred.")
 
+@router.post("/batch", response_model=TransferBatchOut)
+async def transfer_batch(
+        body: TransferBatchIn,
+        current_user: dict = Depends(get_current_user),
+        tx_service: TransactionService = Depends(get_batch_service),
+):
+    try:
+        results = await tx_service.transfer_batch(
+            [item.model_dump() for item in body.items],
+            user_id=current_user['id'],
+            atomic=body.mode == "atomic"
+        )
+        note_write(current_user['id'])
+    except (BusinessRuleViolation, InsufficientFunds, ForbiddenOperation) as e:
+        status_code = status.HTTP_400_BAD_REQUEST
+        if isinstance(e, ForbiddenOperation):
+            status_code = status.HTTP_403_FORBIDDEN
+        raise HTTPException(status_code=status_code, detail=str(e))
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logging.error(f"Internal Server Error in batch transfer: {e}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="An unknown error occurred.")
+
+    succeeded = sum(1 for r in results if r['status'] == "SUCCESS")
+    return TransferBatchOut(mode=body.mode, succeeded=succeeded, failed=len(results) - succeeded,
+                            results=results)
+
 @router.get("/recent", response_model=list[TransactionOut])
 async def recent_transactions(
         limit: int = Query(10, gt=0, le=50),
-        tx_repo: TransactionRepository = Depends(get_transaction_repo),
+        tx_repo: TransactionRepository = Depends(get_history_repo),
         current_user: dict = Depends(get_current_user)
 ):
     try:
-        txs = await tx_repo.recent_for_user(current_user['id'], limit=limit)
-        return txs
+        txs = await tx_repo.history_records_for_user(current_user['id'], limit)
+        return TRANSACTION_JSON.response(txs)
     except Exception as e:
         logging.error(f"Error fetching recent transactions: {e}\n{traceback.format_exc()}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="Failed to fetch recent transactions.")
 
+@router.get("/history", response_model=TransactionPage)
+async def transaction_history(
+        limit: int = Query(20, gt=0, le=100),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        tx_repo: TransactionRepository = Depends(get_history_repo),
+        current_user: dict = Depends(get_current_user)
+):
+    before = None
+    if cursor:
+        try:
+            before = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+    try:
+        txs = await tx_repo.history_records_for_user(current_user['id'], limit + 1, before=before)
+    except Exception as e:
+        logging.error(f"Error fetching transaction history: {e}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Failed to fetch transaction history.")
+
+    next_cursor = None
+    if len(txs) > limit:
+        txs = txs[:limit]
+        next_cursor = encode_cursor(txs[-1]['created_at'], txs[-1]['id'])
+    return json_response(
+        f'{{"items":{TRANSACTION_JSON.encode_many(txs)},"next_cursor":{encode_nullable_str(next_cursor)}}}')
+
+@router.get("/export")
+async def export_statement(
+        request: Request,
+        fmt: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+        card_number: Optional[str] = Query(None, min_length=16, max_length=16),
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        current_user: dict = Depends(get_current_user)
+):
+    # اتصال استریم داخل خود generator گرفته می‌شود؛ اینجا فقط کارت‌ها خوانده می‌شوند
+    async with acquire_read_connection(current_user['id']) as conn:
+        cards = await CardRepository(conn).list_by_user(current_user['id'])
+
+    card_ids = [c['id'] for c in cards if card_number is None or c['card_number'] == card_number]
+    if card_number is not None and not card_ids:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail="Card does not belong to the current user.")
+
+    exporter = StatementExporter(await get_pool(ANALYTICS))
+    filename = f"statement-{card_number or 'all'}.{fmt}"
+    return StreamingResponse(
+        exporter.stream(fmt, card_ids, start_date, end_date, is_disconnected=request.is_disconnected),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 @router.get("/revenue", response_model=TotalRevenueResponse)
 async def get_total_revenue(
         filters: RevenueFilters = Depends(),
-        tx_repo: TransactionRepository = Depends(get_transaction_repo)
+        tx_repo: TransactionRepository = Depends(get_revenue_repo)
 ):
+    if filters.granularity is not None and filters.transaction_id is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="granularity cannot be combined with transaction_id.")
+
     try:
         total_income = await tx_repo.fee_sum(
             date_from=filters.start_date,
             date_to=filters.end_date,
             tx_id=filters.transaction_id
         )
-        return TotalRevenueResponse(total_revenue=total_income)
+        series = None
+        if filters.granularity is not None:
+            series = await tx_repo.fee_series(filters.granularity, filters.start_date, filters.end_date)
+        return TotalRevenueResponse(total_revenue=total_income, granularity=filters.granularity, series=series)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logging.error(f"Error fetching revenue: {e}\n{traceback.format_exc()}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
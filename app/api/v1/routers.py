@@ -1,8 +1,9 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, cards, transactions
+from app.api.v1.endpoints import auth, cards, transactions, reports
 
 router = APIRouter()
 
 router.include_router(auth.router)
 router.include_router(cards.router)
-router.include_router(transactions.router)
\ No newline at end of file
+router.include_router(transactions.router)
+router.include_router(reports.router)
@@ -0,0 +1,23 @@
+from typing import Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+# user_id → جمع version کارت‌های کاربر؛ نوشتن خود کاربر در همین worker آن را پاک می‌کند و بقیه را TTL محدود می‌کند
+card_version_cache = TTLCache(
+    maxsize=settings.CARD_VERSION_CACHE_SIZE,
+    ttl=settings.CARD_VERSION_CACHE_TTL_SECONDS,
+)
+
+
+def get_cached_card_version(user_id: int) -> Optional[int]:
+    return card_version_cache.get(user_id)
+
+
+def cache_card_version(user_id: int, version: int) -> int:
+    card_version_cache.set(user_id, version)
+    return version
+
+
+def invalidate_card_version(user_id: int):
+    card_version_cache.invalidate(user_id)
@@ -1,3 +1,4 @@
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings
 
 
@@ -6,12 +7,90 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
 
+    # "client": قفل و اعتبارسنجی در پایتون | "procedure": تابع bank_transfer در دیتابیس
+    TRANSFER_MODE: Literal["client", "procedure"] = "client"
+
+    # "lanes": انتقال/برداشت‌های هر کارت در صف درون‌پردازه‌ای همان کارت و پشت سر هم روی یک اتصال اجرا می‌شوند
+    # "group": انتقال/برداشت‌های هم‌زمان روی کارت‌های جدا با هم در یک تراکنش دیتابیس (هر کدام در savepoint خودش) commit می‌شوند
+    TRANSFER_EXECUTION: Literal["direct", "lanes", "group"] = "direct"
+    # هر lane حداکثر یک اتصال می‌گیرد؛ باید از DB_POOL_TRANSACTIONAL_MAX_SIZE کمتر باشد
+    CARD_LANE_SHARDS: int = 8
+    CARD_LANE_BATCH_SIZE: int = 32
+    CARD_LANE_MAX_PENDING: int = 5000
+    # هر گروه از قدیمی‌ترین کار حداکثر این‌قدر برای کارهای بعدی صبر می‌کند یا این تعداد کار برمی‌دارد
+    GROUP_COMMIT_WINDOW_SECONDS: float = 0.002
+    GROUP_COMMIT_MAX_ITEMS: int = 64
+    # گروه‌هایی که هم‌زمان commit می‌شوند، هر کدام با یک اتصال؛ باید از DB_POOL_TRANSACTIONAL_MAX_SIZE کمتر باشد
+    GROUP_COMMIT_CONCURRENCY: int = 2
+    GROUP_COMMIT_MAX_PENDING: int = 5000
+
+    # تراکنشی که با deadlock یا serialization failure شکست بخورد تا این تعداد بار دوباره اجرا می‌شود؛
+    # فاصله‌ها تصادفی (full jitter) و نمایی از BASE تا MAX ثانیه‌اند
+    TRANSFER_RETRY_ATTEMPTS: int = 4
+    TRANSFER_RETRY_BASE_DELAY_SECONDS: float = 0.005
+    TRANSFER_RETRY_MAX_DELAY_SECONDS: float = 0.2
+
+    # کاربر احراز‌شده در کش هر worker؛ غیرفعال‌سازی یا تغییر کاربر در workerهای دیگر حداکثر این‌قدر دیر دیده می‌شود
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30.0
+
+    # توکن‌های تأییدشده تا exp خودشان در کش هر worker می‌مانند و دوباره امضایشان بررسی نمی‌شود؛
+    # توکن ردشده این‌قدر بدون decode دوباره رد می‌شود (0 = بدون کش منفی)
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_REJECTED_TOKEN_CACHE_SIZE: int = 1000
+    AUTH_REJECTED_TOKEN_CACHE_TTL_SECONDS: float = 60.0
+
+    # نسخه‌ی کارت‌های هر کاربر (ETag لیست کارت‌ها) در کش هر worker؛ درخواست شرطی در این مدت بدون دیتابیس 304 می‌گیرد،
+    # پس واریز به کارت‌های کاربر یا تغییری از worker دیگر حداکثر این‌قدر دیرتر دیده می‌شود (0 = همیشه از دیتابیس)
+    CARD_VERSION_CACHE_SIZE: int = 10000
+    CARD_VERSION_CACHE_TTL_SECONDS: float = 1.0
+
+    # bcrypt بیرون از event loop: "thread" | "process" | "inline" (فقط برای مقایسه)
+    PASSWORD_HASH_EXECUTOR: Literal["thread", "process", "inline"] = "thread"
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS: float = 2.0
+
+    BATCH_TRANSFER_MAX_ITEMS: int = 1000
+
+    # کلیدهای Idempotency-Key تکمیل‌شده در کش هر worker؛ منبع اصلی جدول idempotency_keys است
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    IDEMPOTENCY_CACHE_TTL_SECONDS: float = 600.0
+
+    # هدر Server-Timing (انتظار برای اتصال pool و زمان کل) روی هر پاسخ؛ برای بنچمارک‌ها
+    SERVER_TIMING_ENABLED: bool = False
+
+    # اندپوینت /metrics (Prometheus)، histogram مسیرها و زمان هر کوئری catalog
+    METRICS_ENABLED: bool = True
+
     DB_HOST: str
     DB_PORT: int
     DB_NAME: str
     DB_USER: str
     DB_PASS: str
 
+    # هر pool (transactional: انتقال/برداشت و ثبت‌نام، read: خواندن‌ها و ورود، analytics: گزارش‌ها، export، انتقال
+    # دسته‌ای و اسکریپت‌ها) اندازه، حداکثر انتظار برای گرفتن اتصال (بعد از آن 503) و statement_timeout
+    # (میلی‌ثانیه، 0 = بدون سقف) خودش را دارد
+    DB_POOL_TRANSACTIONAL_MIN_SIZE: int = 5
+    DB_POOL_TRANSACTIONAL_MAX_SIZE: int = 20
+    DB_POOL_TRANSACTIONAL_ACQUIRE_TIMEOUT_SECONDS: float = 10.0
+    DB_POOL_TRANSACTIONAL_STATEMENT_TIMEOUT_MS: int = 15000
+    DB_POOL_READ_MIN_SIZE: int = 2
+    DB_POOL_READ_MAX_SIZE: int = 10
+    DB_POOL_READ_ACQUIRE_TIMEOUT_SECONDS: float = 5.0
+    DB_POOL_READ_STATEMENT_TIMEOUT_MS: int = 5000
+    DB_POOL_ANALYTICS_MIN_SIZE: int = 1
+    DB_POOL_ANALYTICS_MAX_SIZE: int = 4
+    DB_POOL_ANALYTICS_ACQUIRE_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_ANALYTICS_STATEMENT_TIMEOUT_MS: int = 0
+
+    # DSN یک standby (streaming replica) برای endpoint های فقط‌خواندنی؛ خالی یعنی همه‌چیز از primary
+    DB_REPLICA_URL: Optional[str] = None
+    # اگر replica بیش از این عقب باشد (یا در دسترس نباشد) خواندن‌ها به primary برمی‌گردند
+    REPLICA_MAX_LAG_SECONDS: float = 2.0
+    REPLICA_LAG_CHECK_INTERVAL_SECONDS: float = 0.2
+
     @property
     def database_url(self) -> str:
         return (
@@ -0,0 +1,31 @@
+from typing import Optional
+
+from starlette.responses import Response
+
+# پاسخ‌ها مال یک کاربرند؛ کلاینت (نه cacheهای مشترک) نگهشان می‌دارد و هر بار با If-None-Match می‌پرسد
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts, weak: bool = False) -> str:
+    tag = '"' + ".".join(str(p) for p in parts) + '"'
+    return "W/" + tag if weak else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against ``etag`` (RFC 9110 §13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+def not_modified(etag: str) -> Response:
+    return with_etag(Response(status_code=304), etag)
@@ -30,3 +30,35 @@ class TokenInvalidException(HTTPException):
             detail="Token is invalid.",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+class PasswordHashingBusyException(HTTPException):
+    def __init__(self, retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, please retry.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+class CardLaneBusyException(HTTPException):
+    def __init__(self, retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many pending transfers, please retry.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+class TransferContentionException(HTTPException):
+    def __init__(self, retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The cards are busy with other transfers, please retry.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+class DatabaseBusyException(HTTPException):
+    def __init__(self, retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The service is busy, please retry.",
+            headers={"Retry-After": str(retry_after)},
+        )
@@ -0,0 +1,99 @@
+# app/core/json_encoding.py
+
+from datetime import datetime
+from decimal import Decimal
+from json.encoder import encode_basestring
+from typing import Any, Callable, Iterable, Mapping, Optional, Union, get_args, get_origin
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+
+def _encode_datetime(value: datetime) -> str:
+    # همان قالب pydantic: isoformat و Z به‌جای +00:00
+    text = value.isoformat()
+    if text.endswith("+00:00"):
+        text = text[:-6] + "Z"
+    return '"' + text + '"'
+
+
+def _encode_decimal(value: Decimal) -> str:
+    # pydantic مقدار Decimal را به شکل رشته و بدون گرد کردن برمی‌گرداند
+    return '"' + str(value) + '"'
+
+
+def _encode_bool(value: bool) -> str:
+    return "true" if value else "false"
+
+
+ENCODERS: dict[type, Callable[[Any], str]] = {
+    int: str,
+    str: encode_basestring,
+    bool: _encode_bool,
+    Decimal: _encode_decimal,
+    datetime: _encode_datetime,
+}
+
+
+def _field_type(annotation) -> tuple[type, bool]:
+    """(type, nullable) of a plain or Optional[...] annotation."""
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1 and len(get_args(annotation)) == 2:
+            return args[0], True
+    return annotation, False
+
+
+class RecordEncoder:
+    """
+    JSON encoder compiled from the fields of a flat pydantic response model.
+
+    Rows (asyncpg Records or dicts) are written straight to the bytes the
+    model would serialize to through FastAPI, so a handler can return them
+    without building dicts or model instances and without the response
+    validation pass. Columns the model does not declare are skipped, as
+    pydantic would. Only int, str, bool, Decimal and datetime fields (or
+    Optional of them) are supported; anything else fails at import time.
+    """
+
+    def __init__(self, model: type[BaseModel]):
+        self.model = model
+        self.encode_row = self._compile(model)
+
+    @staticmethod
+    def _compile(model: type[BaseModel]) -> Callable[[Mapping], str]:
+        # یک تابع با یک عبارت الحاق رشته برای هر مدل؛ نه حلقه‌ای روی فیلدها و نه dict میانی
+        namespace = {}
+        parts = []
+        for i, (name, field) in enumerate(model.model_fields.items()):
+            if field.serialization_alias or field.alias not in (None, name):
+                raise TypeError(f"{model.__name__}.{name}: aliases are not supported")
+            field_type, nullable = _field_type(field.annotation)
+            if field_type not in ENCODERS:
+                raise TypeError(f"{model.__name__}.{name}: cannot encode {field.annotation!r}")
+            namespace[f"_e{i}"] = ENCODERS[field_type]
+            prefix = repr(("," if parts else "{") + encode_basestring(name) + ":")
+            if nullable:
+                parts.append(f'{prefix} + ("null" if (v := row[{name!r}]) is None else _e{i}(v))')
+            else:
+                parts.append(f"{prefix} + _e{i}(row[{name!r}])")
+        if not parts:
+            raise TypeError(f"{model.__name__} has no fields")
+        source = "def encode_row(row):\n    return " + " + ".join(parts) + " + '}'\n"
+        exec(compile(source, f"<RecordEncoder {model.__name__}>", "exec"), namespace)
+        return namespace["encode_row"]
+
+    def encode_many(self, rows: Iterable[Mapping]) -> str:
+        return "[" + ",".join(map(self.encode_row, rows)) + "]"
+
+    def response(self, rows: Iterable[Mapping], status_code: int = 200) -> Response:
+        """The rows as a JSON array; FastAPI passes a returned Response through untouched."""
+        return json_response(self.encode_many(rows), status_code)
+
+
+def encode_nullable_str(value: Optional[str]) -> str:
+    return "null" if value is None else encode_basestring(value)
+
+
+def json_response(body: str, status_code: int = 200) -> Response:
+    return Response(content=body.encode("utf-8"), status_code=status_code, media_type="application/json")
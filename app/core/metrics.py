@@ -0,0 +1,209 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.responses import Response
+from starlette.routing import Match
+
+# مرزهای histogram بر حسب ثانیه؛ از زیر میلی‌ثانیه (کوئری‌های ساده) تا چند ثانیه (انتظار قفل)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "<unmatched>"
+# کش (متد، مسیر خام) → الگوی route؛ با پر شدن (مثلاً مسیرهای تصادفی اسکنرها) خالی می‌شود
+ROUTE_CACHE_SIZE = 4096
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served, by route.", ["method", "route"])
+
+# هر pool با نامش (transactional/read/analytics) و سروری که به آن وصل است (primary/replica)
+POOL_LABELS = ["pool", "server"]
+DB_POOL_SIZE = Gauge("db_pool_size", "Open connections in the asyncpg pool.", POOL_LABELS)
+DB_POOL_IDLE = Gauge("db_pool_idle", "Idle connections in the asyncpg pool.", POOL_LABELS)
+DB_POOL_MAX_SIZE = Gauge("db_pool_max_size", "Configured maximum size of the asyncpg pool.", POOL_LABELS)
+DB_POOL_SATURATION = Gauge(
+    "db_pool_saturation", "Share of the pool's maximum size checked out right now (0..1).", POOL_LABELS,
+)
+DB_ACQUIRE_SECONDS = Histogram(
+    "db_pool_acquire_seconds", "Time spent waiting for a pool connection.", POOL_LABELS, buckets=LATENCY_BUCKETS,
+)
+DB_ACQUIRE_TIMEOUTS = Counter(
+    "db_pool_acquire_timeouts_total", "Requests turned away because the pool had no free connection in time.",
+    POOL_LABELS,
+)
+DB_REPLICA_LAG_SECONDS = Gauge("db_replica_lag_seconds", "Upper bound on how stale the read replica is (+Inf when unknown).")
+DB_READ_ROUTES = Counter(
+    "db_read_routes_total", "Read-only requests by the server they were sent to and why.", ["target", "reason"],
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Statement execution time by query catalog name.",
+    ["statement"], buckets=LATENCY_BUCKETS,
+)
+
+TRANSFERS = Counter("bank_transfers_total", "Money movements by operation and outcome.", ["operation", "outcome"])
+REJECTIONS = Counter("bank_transfer_rejections_total", "Money movements rejected by a business rule.", ["rule"])
+TRANSFER_RETRIES = Counter(
+    "bank_transfer_retries_total", "Money movements re-run after a deadlock or serialization failure.",
+    ["operation", "error"],
+)
+
+# شمارش نتیجه‌ی کارهای یک group commit تا COMMIT گروه عقب می‌افتد (گروه ممکن است rollback و کارها دوباره اجرا شوند)
+_deferred_counts: ContextVar[Optional[list]] = ContextVar("deferred_counts", default=None)
+
+
+def count(counter):
+    """Increments ``counter`` (a labelled child) now, or later if inside deferred_counts()."""
+    deferred = _deferred_counts.get()
+    if deferred is None:
+        counter.inc()
+    else:
+        deferred.append(counter)
+
+
+@contextmanager
+def deferred_counts():
+    """Collects the count() calls of the block; the caller increments them once its transaction has committed."""
+    counters = []
+    token = _deferred_counts.set(counters)
+    try:
+        yield counters
+    finally:
+        _deferred_counts.reset(token)
+
+
+# هر worker رجیستری خودش را دارد، پس این‌ها نرخ hit همان worker اند
+AUTH_TOKEN_CACHE_LOOKUPS = Counter(
+    "auth_token_cache_lookups_total", "Bearer token checks by verified-token cache outcome.", ["result"],
+)
+# فرزندهای برچسب‌دار یک بار ساخته می‌شوند؛ labels() روی هر درخواست از خود hit گران‌تر است
+AUTH_TOKEN_CACHE_HITS = AUTH_TOKEN_CACHE_LOOKUPS.labels("hit")
+AUTH_TOKEN_CACHE_REJECTED_HITS = AUTH_TOKEN_CACHE_LOOKUPS.labels("rejected_hit")
+AUTH_TOKEN_CACHE_MISSES = AUTH_TOKEN_CACHE_LOOKUPS.labels("miss")
+AUTH_TOKEN_CACHE_HIT_RATIO = Gauge(
+    "auth_token_cache_hit_ratio", "Share of bearer token checks answered from the cache since the worker started.",
+)
+AUTH_TOKEN_CACHE_SIZE = Gauge("auth_token_cache_size", "Tokens held by the token cache.", ["cache"])
+
+CARD_LANE_PENDING = Gauge("card_lane_pending", "Money movements queued or running on the card lanes.")
+CARD_LANE_WAIT_SECONDS = Histogram(
+    "card_lane_wait_seconds", "Time a money movement waited for its card lanes.", buckets=LATENCY_BUCKETS,
+)
+CARD_LANE_REJECTED = Counter("card_lane_rejected_total", "Money movements turned away because the card lanes were full.")
+
+GROUP_COMMIT_PENDING = Gauge("group_commit_pending", "Money movements queued for or running in a group commit.")
+GROUP_COMMIT_WAIT_SECONDS = Histogram(
+    "group_commit_wait_seconds", "Time a money movement waited for its group to start.", buckets=LATENCY_BUCKETS,
+)
+GROUP_COMMIT_SIZE = Histogram(
+    "group_commit_size", "Money movements committed by one group transaction.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+GROUP_COMMIT_FALLBACKS = Counter(
+    "group_commit_fallbacks_total", "Group transactions rolled back before COMMIT whose jobs were re-run one by one.",
+)
+GROUP_COMMIT_REJECTED = Counter(
+    "group_commit_rejected_total", "Money movements turned away because the group commit queue was full.",
+)
+
+
+def watch_pool(name: str, server: str, pool):
+    gauges = (DB_POOL_SIZE, DB_POOL_IDLE, DB_POOL_MAX_SIZE, DB_POOL_SATURATION)
+    if pool is None:
+        for gauge in gauges:
+            gauge.labels(name, server).set_function(lambda: 0)
+        return
+    DB_POOL_SIZE.labels(name, server).set_function(pool.get_size)
+    DB_POOL_IDLE.labels(name, server).set_function(pool.get_idle_size)
+    DB_POOL_MAX_SIZE.labels(name, server).set_function(pool.get_max_size)
+    DB_POOL_SATURATION.labels(name, server).set_function(
+        lambda: (pool.get_size() - pool.get_idle_size()) / pool.get_max_size())
+
+
+_acquire_histograms: dict = {}
+
+
+def observe_acquire(name: str, server: str, seconds: float):
+    histogram = _acquire_histograms.get((name, server))
+    if histogram is None:
+        histogram = _acquire_histograms[(name, server)] = DB_ACQUIRE_SECONDS.labels(name, server)
+    histogram.observe(seconds)
+
+
+_statement_histograms: dict = {}
+
+
+def observe_statement(name: str, seconds: float):
+    """Called by BaseRepository after every catalog statement."""
+    histogram = _statement_histograms.get(name)
+    if histogram is None:
+        histogram = _statement_histograms[name] = DB_QUERY_SECONDS.labels(name)
+    histogram.observe(seconds)
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """Request latency histogram and in-flight gauge, labelled by route template (not raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: dict[tuple[str, str], str] = {}
+        self._children: dict[tuple[str, str], tuple] = {}
+
+    def _route_of(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        route = self._routes.get(key)
+        if route is None:
+            # مثل خود Router: اولین تطابق کامل، وگرنه اولین تطابق مسیر با متد دیگر (405)
+            route = UNMATCHED_ROUTE
+            for candidate in scope["app"].router.routes:
+                match, _ = candidate.matches(scope)
+                if match == Match.FULL:
+                    route = candidate.path
+                    break
+                if match == Match.PARTIAL and route == UNMATCHED_ROUTE:
+                    route = candidate.path
+            if len(self._routes) >= ROUTE_CACHE_SIZE:
+                self._routes.clear()
+            self._routes[key] = route
+        return route
+
+    def _metrics_for(self, method: str, route: str) -> tuple:
+        # labels() قفل و lookup دارد؛ child هر (method, route) یک بار گرفته می‌شود
+        key = (method, route)
+        children = self._children.get(key)
+        if children is None:
+            children = self._children[key] = (HTTP_IN_FLIGHT.labels(method, route), {})
+        return children
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_of(scope)
+        in_flight, histograms = self._metrics_for(method, route)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            histogram = histograms.get(status_code)
+            if histogram is None:
+                histogram = histograms[status_code] = HTTP_REQUEST_SECONDS.labels(method, route, str(status_code))
+            histogram.observe(time.perf_counter() - started)
@@ -0,0 +1,44 @@
+from typing import Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+# فقط فیلدهایی که endpoint ها لازم دارند (بدون hashed_password)
+PRINCIPAL_FIELDS = ("id", "national_code", "full_name", "phone_number", "email", "is_active")
+
+# کش هر worker جداست و invalidate فقط همین worker را پاک می‌کند؛ غیرفعال شدن یا تغییر کاربر در workerهای دیگر
+# تا PRINCIPAL_CACHE_TTL_SECONDS دیده نمی‌شود
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+# با هر invalidate زیاد می‌شود؛ miss ای که پیش از آن ردیف کاربر را خوانده نتیجه‌اش را کش نمی‌کند
+_generation = 0
+
+
+def to_principal(user: dict) -> dict:
+    return {field: user.get(field) for field in PRINCIPAL_FIELDS}
+
+
+def get_cached_principal(user_id: int) -> Optional[dict]:
+    return principal_cache.get(user_id)
+
+
+def principal_generation() -> int:
+    """Read before loading a user row; pass it to cache_principal."""
+    return _generation
+
+
+def cache_principal(user: dict, generation: int) -> dict:
+    """Caches the row unless an invalidate_principal() ran since ``generation`` was read."""
+    principal = to_principal(user)
+    if generation == _generation:
+        principal_cache.set(principal["id"], principal)
+    return principal
+
+
+def invalidate_principal(user_id: int):
+    global _generation
+    _generation += 1
+    principal_cache.invalidate(user_id)
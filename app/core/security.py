@@ -1,8 +1,15 @@
+import asyncio
+import math
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from jose import jwt
+from jose import JWTError, jwt
 from typing import Optional
+from app.core import metrics
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.exceptions import PasswordHashingBusyException
 import hashlib
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -16,6 +23,76 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     digest = hashlib.sha256(plain_password.encode("utf-8")).hexdigest()
     return pwd_context.verify(digest, hashed_password)
 
+
+class PasswordHasher:
+    """
+    Runs hash_password/verify_password on a bounded worker pool so bcrypt
+    never blocks the event loop.
+
+    At most ``max_pending`` calls are queued or running at once; callers
+    that cannot get a slot within ``queue_timeout`` seconds get a
+    PasswordHashingBusyException (503) instead of piling up behind a login
+    storm.
+    """
+
+    def __init__(self, executor: str = "thread", workers: int = 4, max_pending: int = 64,
+                 queue_timeout: float = 2.0):
+        if executor not in ("thread", "process", "inline"):
+            raise ValueError(f"Unknown password hash executor {executor!r}")
+        self.executor_kind = executor
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.rejected = 0
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self.executor_kind == "inline":
+            return None
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PasswordHashingBusyException(retry_after=max(1, math.ceil(self.queue_timeout)))
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                return fn(*args)
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        finally:
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    executor=settings.PASSWORD_HASH_EXECUTOR,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    queue_timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS,
+)
+
+
 def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = {"sub": str(subject)}
     if expires_delta:
@@ -26,6 +103,58 @@ def create_access_token(subject: str, expires_delta: Optional[timedelta] = None)
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+# کلید هر دو کش digest توکن است تا خود توکن‌ها در حافظه نمانند
+# digest → payload تا exp توکن
+verified_tokens = TTLCache(
+    maxsize=settings.AUTH_TOKEN_CACHE_SIZE,
+    ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+# digest → پیام خطای decode؛ جدا از کش بالا تا توکن‌های بی‌اعتبار زیاد توکن‌های معتبر را بیرون نکنند
+rejected_tokens = TTLCache(
+    maxsize=settings.AUTH_REJECTED_TOKEN_CACHE_SIZE,
+    ttl=settings.AUTH_REJECTED_TOKEN_CACHE_TTL_SECONDS,
+)
+
+
+def _token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
 def decode_access_token(token: str) -> dict:
-    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    """
+    Verifies ``token`` and returns its claims; raises JWTError if it is invalid.
+
+    Verified tokens are answered from a per-worker cache until their ``exp``
+    and rejected ones are rejected again from it for a short while, so only
+    a token this worker has not seen yet pays for the signature check.
+    """
+    key = _token_digest(token)
+    payload = verified_tokens.get(key)
+    if payload is not None:
+        metrics.AUTH_TOKEN_CACHE_HITS.inc()
+        return payload
+    error = rejected_tokens.get(key)
+    if error is not None:
+        metrics.AUTH_TOKEN_CACHE_REJECTED_HITS.inc()
+        raise JWTError(error)
+    metrics.AUTH_TOKEN_CACHE_MISSES.inc()
+
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError as e:
+        rejected_tokens.set(key, str(e) or type(e).__name__)
+        raise
+    exp = payload.get("exp")
+    # توکن بدون exp منقضی نمی‌شود و با TTL پیش‌فرض (عمر توکن‌ها) می‌ماند
+    verified_tokens.set(key, payload, ttl=exp - time.time() if isinstance(exp, (int, float)) else None)
     return payload
+
+
+def token_cache_hit_ratio() -> float:
+    lookups = verified_tokens.hits + verified_tokens.misses
+    return (verified_tokens.hits + rejected_tokens.hits) / lookups if lookups else 0.0
+
+
+metrics.AUTH_TOKEN_CACHE_HIT_RATIO.set_function(token_cache_hit_ratio)
+metrics.AUTH_TOKEN_CACHE_SIZE.labels("verified").set_function(verified_tokens.__len__)
+metrics.AUTH_TOKEN_CACHE_SIZE.labels("rejected").set_function(rejected_tokens.__len__)
@@ -0,0 +1,40 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+
+from app.db.session import acquire_waits
+
+
+class ServerTimingMiddleware:
+    """
+    Adds a ``Server-Timing`` header with the time the request spent waiting
+    for pool connections (``db-acquire``, with the number of acquires as
+    ``desc``) and the total time spent in the app (``app``), both in ms.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        waits: list[float] = []
+        token = acquire_waits.set(waits)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db-acquire;dur={sum(waits) * 1000:.3f};desc="{len(waits)}", app;dur={elapsed * 1000:.3f}',
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            acquire_waits.reset(token)
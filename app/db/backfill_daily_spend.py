@@ -0,0 +1,24 @@
+# app/db/backfill_daily_spend.py
+import asyncio
+
+from app.db.session import ANALYTICS, connect_db_pool, get_pool, close_db_pool
+from app.repositories.card_repo import CardRepository
+
+
+async def backfill():
+    await connect_db_pool(ANALYTICS)
+    pool = await get_pool(ANALYTICS)
+    if pool is None:
+        raise RuntimeError("Database pool could not be initialized")
+
+    async with pool.acquire() as conn:
+        print("🔁 بازسازی جدول card_daily_spend از روی transactions...")
+        async with conn.transaction():
+            rows = await CardRepository(conn).rebuild_daily_spend()
+        print(f"✅ {rows} ردیف ساخته شد.")
+
+    await close_db_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill())
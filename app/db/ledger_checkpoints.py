@@ -0,0 +1,52 @@
+# app/db/ledger_checkpoints.py
+import argparse
+import asyncio
+
+from app.db.session import ANALYTICS, connect_db_pool, get_pool, close_db_pool
+from app.repositories.ledger_repo import LedgerRepository
+from app.services.ledger_service import LedgerService, LEDGER_CHUNK_SIZE, CHECKPOINT_EVERY_ENTRIES
+
+
+async def checkpoint(rebuild: bool, chunk_size: int, every: int, reconcile: bool) -> int:
+    await connect_db_pool(ANALYTICS)
+    pool = await get_pool(ANALYTICS)
+    if pool is None:
+        raise RuntimeError("Database pool could not be initialized")
+
+    mismatches = []
+    async with pool.acquire() as conn:
+        service = LedgerService(conn, LedgerRepository(conn))
+        if rebuild:
+            print("🔁 بازسازی کامل checkpointهای موجودی کارت‌ها...")
+            old, new, created = await service.rebuild_checkpoints(chunk_size, every)
+        else:
+            print("🔁 ساخت checkpointهای موجودی برای سطرهای جدید دفتر کل...")
+            old, new, created = await service.refresh_checkpoints(chunk_size, every)
+        print(f"✅ watermark از {old} به {new} رسید؛ {created:,} checkpoint جدید.")
+
+        if reconcile:
+            print("🧮 مقایسه‌ی موجودی کارت‌ها با دفتر کل...")
+            mismatches = await service.reconcile()
+            for row in mismatches:
+                print(f"   ⚠️ کارت {row['card_number']} (id={row['card_id']}): موجودی {row['balance']}، "
+                      f"دفتر کل {row['ledger_balance']}")
+            print(f"{'❌' if mismatches else '✅'} {len(mismatches)} کارت مغایرت دارد.")
+
+    await close_db_pool()
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Checkpoint per-card ledger balances (run from cron) and optionally reconcile them.")
+    parser.add_argument("--rebuild", action="store_true", help="drop every checkpoint and start again from entry 0")
+    parser.add_argument("--chunk-size", type=int, default=LEDGER_CHUNK_SIZE,
+                        help="ledger entry ids per database transaction")
+    parser.add_argument("--every", type=int, default=CHECKPOINT_EVERY_ENTRIES,
+                        help="also checkpoint every N-th new entry of a card")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="compare every card balance with its ledger balance; exit 1 on a mismatch")
+    args = parser.parse_args()
+    if args.every < 1:
+        parser.error("--every must be at least 1")
+    raise SystemExit(asyncio.run(checkpoint(args.rebuild, args.chunk_size, args.every, args.reconcile)))
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, Numeric, ForeignKey, Date
+from app.db.base import Base
+
+
+class CardDailySpend(Base):
+    __tablename__ = "card_daily_spend"
+
+    card_id = Column(Integer, ForeignKey("cards.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True, doc="UTC day")
+    total = Column(Numeric(15, 2), nullable=False, default=0, doc="Sum of SUCCESS debits on this day")
+
+    def __repr__(self):
+        return f"<CardDailySpend(card_id={self.card_id}, day={self.day}, total={self.total})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Numeric, Boolean, DateTime, func
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, Numeric, Boolean, DateTime, func, text
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -11,8 +11,10 @@ class Card(Base):
     expire_date = Column(String(5), nullable=False, doc="MM/YY format")
     balance = Column(Numeric(18, 0), default=0, nullable=False, doc="Balance in Rials")  # ✅ ریال
     is_active = Column(Boolean, default=True)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # با هر تغییر موجودی یا وضعیت کارت یکی بالا می‌رود؛ جمع آن روی کارت‌های کاربر ETag لیست کارت‌هاست
+    version = Column(BigInteger, nullable=False, server_default=text("1"))
 
     owner = relationship("User", back_populates="cards")
     transactions_from = relationship(
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, SmallInteger, BigInteger, Numeric, Date
+from app.db.base import Base
+
+
+class FeeDailyBucket(Base):
+    __tablename__ = "fee_daily_buckets"
+
+    day = Column(Date, primary_key=True, doc="UTC day of transactions.created_at")
+    slot = Column(SmallInteger, primary_key=True, doc="source_card_id % 16; spreads concurrent writers over rows")
+    total = Column(Numeric(20, 2), nullable=False, default=0)
+    tx_count = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<FeeDailyBucket(day={self.day}, slot={self.slot}, total={self.total})>"
+
+
+class FeeDailyPrefix(Base):
+    __tablename__ = "fee_daily_prefix"
+
+    day = Column(Date, primary_key=True)
+    total = Column(Numeric(20, 2), nullable=False)
+    cumulative = Column(Numeric(24, 2), nullable=False, doc="Sum of fees on every day up to and including this one")
+
+    def __repr__(self):
+        return f"<FeeDailyPrefix(day={self.day}, cumulative={self.cumulative})>"
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, func
+from app.db.base import Base
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String(255), primary_key=True, doc="Idempotency-Key header sent by the client")
+    operation = Column(String(16), nullable=False, doc="transfer | withdraw")
+    request_hash = Column(String(64), nullable=False, doc="sha256 of the request the key was first used with")
+    transaction_id = Column(Integer, nullable=False, doc="transactions.id written in the same DB transaction")
+    transaction_created_at = Column(DateTime(timezone=True), nullable=False,
+                                    doc="created_at of that transaction, so the lookup hits one partition")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<IdempotencyKey(user_id={self.user_id}, key={self.key!r}, transaction_id={self.transaction_id})>"
@@ -0,0 +1,48 @@
+from sqlalchemy import Column, Integer, BigInteger, Numeric, ForeignKey, DateTime, Enum, Index, CheckConstraint, text
+from app.db.base import Base
+import enum
+
+
+class LedgerEntryType(str, enum.Enum):
+    TRANSFER = "TRANSFER"
+    WITHDRAWAL = "WITHDRAWAL"
+    FEE = "FEE"
+    OPENING = "OPENING"
+
+
+class LedgerEntry(Base):
+    __tablename__ = "ledger_entries"
+
+    # هر تراکنش SUCCESS چهار سطر دارد که جمعشان صفر است؛ card_id خالی یعنی طرف بانک
+    # (درآمد کارمزد، وجه نقد پرداختی یا سرمایه‌ی افتتاحیه بسته به entry_type)
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    transaction_id = Column(Integer, nullable=True, doc="transactions.id; NULL for OPENING entries")
+    card_id = Column(Integer, ForeignKey("cards.id"), nullable=True)
+    entry_type = Column(Enum(LedgerEntryType, name="ledger_entry_type", create_type=True), nullable=False)
+    amount = Column(Numeric(20, 2), nullable=False, doc="Signed: credits are positive, debits negative")
+    posted_at = Column(DateTime(timezone=True), nullable=False, server_default=text("clock_timestamp()"),
+                       doc="Written while the card row is locked, so it only grows per card")
+
+    __table_args__ = (
+        Index(
+            "ix_ledger_entries_card_posted_at", "card_id", "posted_at", "id",
+            postgresql_include=["amount"], postgresql_where=text("card_id IS NOT NULL"),
+        ),
+        CheckConstraint("card_id IS NOT NULL OR entry_type <> 'TRANSFER'", name="ck_ledger_entries_bank_side"),
+    )
+
+    def __repr__(self):
+        return f"<LedgerEntry(card_id={self.card_id}, entry_type={self.entry_type}, amount={self.amount})>"
+
+
+class LedgerCheckpoint(Base):
+    __tablename__ = "ledger_checkpoints"
+
+    card_id = Column(Integer, ForeignKey("cards.id", ondelete="CASCADE"), primary_key=True)
+    posted_at = Column(DateTime(timezone=True), primary_key=True)
+    entry_id = Column(BigInteger, primary_key=True, doc="Last ledger_entries.id the balance includes")
+    balance = Column(Numeric(20, 2), nullable=False,
+                     doc="Sum of the card's entries up to and including (posted_at, entry_id)")
+
+    def __repr__(self):
+        return f"<LedgerCheckpoint(card_id={self.card_id}, posted_at={self.posted_at}, balance={self.balance})>"
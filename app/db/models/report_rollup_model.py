@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, BigInteger, Numeric, ForeignKey, DateTime, String
+from app.db.base import Base
+
+
+class ReportHourlySuccess(Base):
+    __tablename__ = "report_hourly_success"
+
+    hour_utc = Column(DateTime(timezone=True), primary_key=True)
+    success_count = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ReportHourlySuccess(hour_utc={self.hour_utc}, success_count={self.success_count})>"
+
+
+class ReportUserMonthly(Base):
+    __tablename__ = "report_user_monthly"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    month_utc = Column(DateTime(timezone=True), primary_key=True)
+    total_amount = Column(Numeric(20, 2), nullable=False, default=0)
+    tx_count = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ReportUserMonthly(user_id={self.user_id}, month_utc={self.month_utc}, tx_count={self.tx_count})>"
+
+
+class ReportCardMonthly(Base):
+    __tablename__ = "report_card_monthly"
+
+    card_id = Column(Integer, ForeignKey("cards.id", ondelete="CASCADE"), primary_key=True)
+    month_utc = Column(DateTime(timezone=True), primary_key=True)
+    total_amount = Column(Numeric(20, 2), nullable=False, default=0)
+    tx_count = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ReportCardMonthly(card_id={self.card_id}, month_utc={self.month_utc}, tx_count={self.tx_count})>"
+
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermark"
+
+    name = Column(String(50), primary_key=True)
+    last_id = Column(BigInteger, nullable=False, default=0, doc="Highest transactions.id already rolled up")
+
+    def __repr__(self):
+        return f"<RollupWatermark(name={self.name}, last_id={self.last_id})>"
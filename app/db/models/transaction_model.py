@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Numeric, ForeignKey, DateTime, String, func, Enum
+from sqlalchemy import Column, Integer, Numeric, ForeignKey, DateTime, String, func, Enum, Index, text
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 import enum
@@ -11,7 +11,8 @@ class TransactionStatus(str, enum.Enum):
 class Transaction(Base):
     __tablename__ = "transactions"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # جدول بر اساس ماه created_at پارتیشن شده (transactions_YYYY_MM + transactions_default)؛ کلید partition جزء PK است
+    id = Column(Integer, primary_key=True, autoincrement=True)
     source_card_id = Column(Integer, ForeignKey("cards.id"))
     dest_card_id = Column(Integer, ForeignKey("cards.id"))
     amount = Column(Numeric(15, 2), nullable=False)
@@ -22,7 +23,21 @@ class Transaction(Base):
         nullable=False,
     )
     description = Column(String(255), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_transactions_source_card_created_at", "source_card_id", "created_at", "id"),
+        Index(
+            "ix_transactions_source_card_success", "source_card_id", "created_at",
+            postgresql_include=["amount"], postgresql_where=text("status = 'SUCCESS'"),
+        ),
+        Index("ix_transactions_dest_card_created_at", "dest_card_id", "created_at", "id"),
+        Index(
+            "ix_transactions_created_at_success", "created_at",
+            postgresql_include=["fee"], postgresql_where=text("status = 'SUCCESS'"),
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     source_card = relationship("Card", foreign_keys=[source_card_id], back_populates="transactions_from")
     dest_card = relationship("Card", foreign_keys=[dest_card_id], back_populates="transactions_to")
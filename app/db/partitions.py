@@ -0,0 +1,69 @@
+# app/db/partitions.py
+import argparse
+import asyncio
+from datetime import date, datetime, timezone
+
+from app.db.session import ANALYTICS, connect_db_pool, get_pool, close_db_pool
+from app.repositories.partition_repo import PartitionRepository
+
+MONTHS_AHEAD = 3
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def parse_month(value: str) -> date:
+    """YYYY-MM or YYYY-MM-DD; partitions that end on or before this day are affected."""
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        return date.fromisoformat(value)
+
+
+async def maintain(ahead: int, detach_before: date | None, drop: bool):
+    await connect_db_pool(ANALYTICS)
+    pool = await get_pool(ANALYTICS)
+    if pool is None:
+        raise RuntimeError("Database pool could not be initialized")
+
+    async with pool.acquire() as conn:
+        repo = PartitionRepository(conn)
+        this_month = datetime.now(timezone.utc).date().replace(day=1)
+        print(f"🗓️ ساخت partitionهای تراکنش تا {ahead} ماه بعد...")
+        async with conn.transaction():
+            created = await repo.ensure_partitions(this_month, add_months(this_month, ahead + 1))
+        print(f"✅ {len(created)} partition جدید: {', '.join(created) or '-'}")
+
+        if detach_before is not None:
+            if detach_before > this_month:
+                raise SystemExit("--detach-before must not be after the current month")
+            action = "حذف" if drop else "جدا کردن"
+            print(f"✂️ {action} partitionهای تمام‌شده تا {detach_before}...")
+            async with conn.transaction():
+                detached = await repo.detach_partitions(detach_before, drop)
+            print(f"✅ {len(detached)} partition: {', '.join(detached) or '-'}")
+
+        for partition in await repo.list_partitions():
+            print(f"   {partition['name']:<22} ~{partition['estimated_rows']:>12,} ردیف "
+                  f"{partition['total_bytes'] / 2 ** 20:>9.1f} MB  {partition['bound']}")
+        stray = await repo.default_rows()
+        if stray:
+            print(f"⚠️ {stray:,} تراکنش در transactions_default است؛ با ساخت partition ماهشان منتقل می‌شوند.")
+
+    await close_db_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pre-create monthly transactions partitions and detach or drop old ones (run from cron).")
+    parser.add_argument("--ahead", type=int, default=MONTHS_AHEAD,
+                        help="months after the current one that must already have a partition")
+    parser.add_argument("--detach-before", type=parse_month, metavar="YYYY-MM",
+                        help="detach every monthly partition that ends on or before this month")
+    parser.add_argument("--drop", action="store_true", help="drop the detached partitions instead of keeping them")
+    args = parser.parse_args()
+    if args.drop and args.detach_before is None:
+        parser.error("--drop needs --detach-before")
+    asyncio.run(maintain(args.ahead, args.detach_before, args.drop))
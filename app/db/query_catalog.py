@@ -0,0 +1,122 @@
+# app/db/query_catalog.py
+import importlib
+import pkgutil
+import re
+from pathlib import Path
+
+import asyncpg
+
+QUERIES_DIR = Path(__file__).resolve().parent / "queries"
+_PLACEHOLDER = re.compile(r"\$(\d+)")
+
+
+class CatalogConnection(asyncpg.Connection):
+    """Connection that can pre-populate its statement cache from the catalog."""
+
+    async def prepare_catalog(self, statements: list[str]):
+        # asyncpg بعد از Parse پیام Sync نمی‌فرستد؛ بدون این تراکنش، قفل‌های گرفته‌شده هنگام Parse
+        # (مثلاً RowExclusiveLock روی transactions) تا اولین استفاده از اتصال باز می‌مانند
+        async with self.transaction():
+            for sql in statements:
+                # از cache خود asyncpg استفاده می‌شود؛ fetch/fetchrow بعدی با همین متن دیگر Parse نمی‌کند.
+                # متد عمومی prepare() به کار نمی‌آید: از cache رد می‌شود و PreparedStatement برگشتی با هر
+                # بازگشت اتصال به pool باطل می‌شود. _prepare خصوصی است، پس asyncpg در requirements.txt
+                # pin شده و tests/test_query_catalog.py با تغییر امضای آن شکست می‌خورد
+                await self._prepare(sql, use_cache=True)
+
+
+class QueryCatalog:
+    """
+    Named SQL statements used by the repositories.
+
+    Repositories register their statements at import time (inline SQL or a
+    file under app/db/queries/). ``load()`` reads the files and checks every
+    statement once at startup, ``validate()`` asks the server to parse them,
+    and ``prepare_connection()`` is the pool ``init=`` hook that prepares the
+    hot ones on each new connection.
+    """
+
+    def __init__(self):
+        self._statements: dict[str, str] = {}
+        self._files: dict[str, str] = {}
+        self._hot: set[str] = set()
+        self._loaded = False
+
+    def register(self, name: str, sql: str, hot: bool = False) -> str:
+        existing = self._statements.get(name)
+        if existing is not None and existing != sql:
+            raise ValueError(f"Query {name!r} is already registered with different SQL")
+        self._statements[name] = sql
+        if hot:
+            self._hot.add(name)
+        return name
+
+    def register_file(self, name: str, filename: str, hot: bool = False) -> str:
+        self._files[name] = filename
+        if hot:
+            self._hot.add(name)
+        return name
+
+    def sql(self, name: str) -> str:
+        if not self._loaded:
+            self.load()
+        try:
+            return self._statements[name]
+        except KeyError:
+            raise KeyError(f"Unknown query {name!r}") from None
+
+    @property
+    def names(self) -> list[str]:
+        return sorted(self._statements)
+
+    @property
+    def hot(self) -> list[str]:
+        return sorted(self._hot)
+
+    def load(self):
+        if self._loaded:
+            return
+        # همه‌ی ریپازیتوری‌ها import می‌شوند تا کوئری‌هایشان ثبت شود
+        import app.repositories as repositories
+        for module in pkgutil.iter_modules(repositories.__path__):
+            importlib.import_module(f"{repositories.__name__}.{module.name}")
+
+        for name, filename in self._files.items():
+            path = QUERIES_DIR / filename
+            if not path.is_file():
+                raise RuntimeError(f"Query file for {name!r} not found: {path}")
+            self.register(name, path.read_text(encoding="utf-8"))
+
+        errors = []
+        for name, sql in self._statements.items():
+            if not sql.strip():
+                errors.append(f"{name}: empty statement")
+                continue
+            used = {int(n) for n in _PLACEHOLDER.findall(sql)}
+            if used and used != set(range(1, max(used) + 1)):
+                errors.append(f"{name}: placeholders are not contiguous ({sorted(used)})")
+        unknown_hot = self._hot - self._statements.keys()
+        errors.extend(f"{name}: marked hot but never registered" for name in sorted(unknown_hot))
+        if errors:
+            raise RuntimeError("Invalid query catalog:\n  " + "\n  ".join(errors))
+        self._loaded = True
+
+    async def validate(self, conn: asyncpg.Connection):
+        """Parses every statement on the server without executing it."""
+        self.load()
+        errors = []
+        for name, sql in self._statements.items():
+            try:
+                await conn.prepare(sql)
+            except asyncpg.PostgresError as e:
+                errors.append(f"{name}: {e}")
+        if errors:
+            raise RuntimeError("Query catalog failed server-side validation:\n  " + "\n  ".join(errors))
+
+    async def prepare_connection(self, conn: asyncpg.Connection):
+        self.load()
+        if isinstance(conn, CatalogConnection):
+            await conn.prepare_catalog([self._statements[name] for name in self.hot])
+
+
+catalog = QueryCatalog()
@@ -0,0 +1,37 @@
+# app/db/refresh_rollups.py
+import argparse
+import asyncio
+
+from app.db.session import ANALYTICS, connect_db_pool, get_pool, close_db_pool
+from app.repositories.report_repo import ReportRepository
+from app.services.report_service import ReportService, ROLLUP_CHUNK_SIZE
+
+
+async def refresh(rebuild: bool, chunk_size: int):
+    await connect_db_pool(ANALYTICS)
+    pool = await get_pool(ANALYTICS)
+    if pool is None:
+        raise RuntimeError("Database pool could not be initialized")
+
+    async with pool.acquire() as conn:
+        service = ReportService(conn, ReportRepository(conn))
+        if rebuild:
+            print("🔁 بازسازی کامل جدول‌های rollup گزارش‌ها...")
+            old, new = await service.rebuild_rollups(chunk_size)
+        else:
+            print("🔁 به‌روزرسانی جدول‌های rollup گزارش‌ها...")
+            old, new = await service.refresh_rollups(chunk_size)
+        print(f"✅ watermark از {old} به {new} رسید ({new - old} شناسه‌ی تراکنش).")
+        days = await service.refresh_fee_prefix()
+        print(f"✅ جمع تجمعی کارمزد برای {days} روز ساخته شد.")
+
+    await close_db_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Roll new transactions up into the report tables.")
+    parser.add_argument("--rebuild", action="store_true", help="clear the rollups and start again from id 0")
+    parser.add_argument("--chunk-size", type=int, default=ROLLUP_CHUNK_SIZE,
+                        help="transaction ids per database transaction")
+    args = parser.parse_args()
+    asyncio.run(refresh(args.rebuild, args.chunk_size))
@@ -0,0 +1,110 @@
+# app/db/replica.py
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from typing import Optional
+
+from asyncpg.pool import Pool
+
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.repositories.replication_repo import ReplicationRepository
+
+# کاربرانی که اخیراً نوشته‌اند؛ بعد از max_lag ثانیه هر replica قابل‌استفاده‌ای نوشته‌ی آن‌ها را دارد
+RECENT_WRITERS_SIZE = 100_000
+
+
+class ReplicaMonitor:
+    """
+    Decides whether a read may go to the replica.
+
+    Every ``interval`` seconds the primary's WAL position is sampled with
+    the time it was taken and compared with the replica's replay position.
+    The newest sample the replica has replayed is ``caught_up_at``: every
+    commit made before that moment is visible there. A read goes to the
+    replica only while that moment is at most ``max_lag`` seconds old and,
+    for a user, not older than the user's last write in this process (so a
+    client reads its own writes). When the replica cannot be reached the
+    moment simply stops advancing and reads fall back to the primary.
+    """
+
+    def __init__(self, max_lag: float, interval: float):
+        self.max_lag = max_lag
+        self.interval = interval
+        self.caught_up_at: Optional[float] = None
+        self._samples: deque[tuple[float, int]] = deque(maxlen=max(16, int(4 * max_lag / interval)))
+        self._writes = TTLCache(maxsize=RECENT_WRITERS_SIZE, ttl=max_lag)
+        self._task: Optional[asyncio.Task] = None
+        self._failing = False
+
+    def lag(self) -> float:
+        """Upper bound on how stale the replica is, in seconds (inf when unknown)."""
+        if self.caught_up_at is None:
+            return float("inf")
+        return time.monotonic() - self.caught_up_at
+
+    def note_write(self, user_id: int):
+        """Called after ``user_id``'s write has committed on the primary."""
+        self._writes.set(user_id, time.monotonic())
+
+    def route(self, user_id: Optional[int] = None) -> str:
+        """Returns "replica" or the reason the read has to go to the primary."""
+        if self.lag() > self.max_lag:
+            return "lagging"
+        if user_id is not None:
+            written_at = self._writes.get(user_id)
+            if written_at is not None and written_at > self.caught_up_at:
+                return "recent_write"
+        return "replica"
+
+    async def check(self, primary: Pool, replica: Pool):
+        sampled_at = time.monotonic()
+        async with primary.acquire() as conn:
+            self._samples.append((sampled_at, await ReplicationRepository(conn).wal_position()))
+        async with replica.acquire() as conn:
+            replayed = await ReplicationRepository(conn).replay_position()
+        if replayed is None:
+            raise RuntimeError("the replica is not a standby (pg_last_wal_replay_lsn() is NULL)")
+        while self._samples and self._samples[0][1] <= replayed:
+            self.caught_up_at = self._samples.popleft()[0]
+
+    async def _watch(self, primary: Pool, replica: Pool):
+        while True:
+            try:
+                await self.check(primary, replica)
+                if self._failing:
+                    logging.info("Replica lag check recovered.")
+                self._failing = False
+            except Exception as e:
+                # فقط اولین خطا لاگ می‌شود؛ تا برگشتن replica خواندن‌ها از primary انجام می‌شوند
+                if not self._failing:
+                    logging.warning(f"Replica lag check failed, reads go to the primary: {e}")
+                self._failing = True
+            await asyncio.sleep(self.interval)
+
+    def start(self, primary: Pool, replica: Pool):
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch(primary, replica), name="replica-monitor",
+                                             context=contextvars.Context())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.caught_up_at = None
+        self._samples.clear()
+
+
+replica_monitor = ReplicaMonitor(
+    max_lag=settings.REPLICA_MAX_LAG_SECONDS,
+    interval=settings.REPLICA_LAG_CHECK_INTERVAL_SECONDS,
+)
+metrics.DB_REPLICA_LAG_SECONDS.set_function(replica_monitor.lag)
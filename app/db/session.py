@@ -1,41 +1,217 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
 import asyncpg
 from asyncpg.pool import Pool
 from asyncpg import Connection
 from typing import AsyncGenerator
+from app.core import metrics
 from app.core.config import settings
+from app.core.exceptions import DatabaseBusyException
+from app.db.query_catalog import catalog, CatalogConnection
+from app.db.replica import replica_monitor
+
+# هر نوع کار pool خودش را دارد تا گزارش‌ها یا طوفان لاگین اتصال‌های انتقال را نگیرند
+TRANSACTIONAL = "transactional"  # انتقال/برداشت، صف کارت‌ها، ثبت‌نام
+READ = "read"                    # endpoint های فقط‌خواندنی و ورود
+ANALYTICS = "analytics"          # گزارش‌ها، export، انتقال دسته‌ای و اسکریپت‌های نگهداری
+POOL_NAMES = (TRANSACTIONAL, READ, ANALYTICS)
+# روی replica فقط کارهای فقط‌خواندنی
+REPLICA_POOL_NAMES = (READ, ANALYTICS)
+
+pools: dict[str, Pool] = {}
+# فقط وقتی DB_REPLICA_URL تنظیم شده و replica هنگام شروع در دسترس بوده
+replica_pools: dict[str, Pool] = {}
+
+# باید از تعداد عبارت‌های پرمصرف catalog بزرگ‌تر باشد تا از cache بیرون نیفتند
+STATEMENT_CACHE_SIZE = 256
+
+# زمان‌های انتظار برای گرفتن اتصال در درخواست جاری؛ ServerTimingMiddleware لیست را می‌گذارد و می‌خواند
+acquire_waits: ContextVar[list[float] | None] = ContextVar("acquire_waits", default=None)
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    min_size: int
+    max_size: int
+    acquire_timeout: float
+    # میلی‌ثانیه؛ 0 یعنی بدون سقف
+    statement_timeout_ms: int
+
 
-db_pool: Pool | None = None
+POOL_CONFIGS = {
+    TRANSACTIONAL: PoolConfig(settings.DB_POOL_TRANSACTIONAL_MIN_SIZE, settings.DB_POOL_TRANSACTIONAL_MAX_SIZE,
+                              settings.DB_POOL_TRANSACTIONAL_ACQUIRE_TIMEOUT_SECONDS,
+                              settings.DB_POOL_TRANSACTIONAL_STATEMENT_TIMEOUT_MS),
+    READ: PoolConfig(settings.DB_POOL_READ_MIN_SIZE, settings.DB_POOL_READ_MAX_SIZE,
+                     settings.DB_POOL_READ_ACQUIRE_TIMEOUT_SECONDS, settings.DB_POOL_READ_STATEMENT_TIMEOUT_MS),
+    ANALYTICS: PoolConfig(settings.DB_POOL_ANALYTICS_MIN_SIZE, settings.DB_POOL_ANALYTICS_MAX_SIZE,
+                          settings.DB_POOL_ANALYTICS_ACQUIRE_TIMEOUT_SECONDS,
+                          settings.DB_POOL_ANALYTICS_STATEMENT_TIMEOUT_MS),
+}
 
-async def get_pool() -> Pool:
-    global db_pool
-    if db_pool is None:
-        await connect_db_pool()
-    return db_pool
+async def get_pool(name: str = TRANSACTIONAL) -> Pool:
+    if name not in pools:
+        await connect_db_pool(name)
+    return pools[name]
 
-async def connect_db_pool():
-    global db_pool
-    if db_pool is None:
+async def _create_pool(dsn: str, config: PoolConfig) -> Pool:
+    pool = await asyncpg.create_pool(
+        dsn=dsn,
+        min_size=config.min_size,
+        max_size=config.max_size,
+        timeout=30,
+        connection_class=CatalogConnection,
+        init=catalog.prepare_connection,
+        statement_cache_size=STATEMENT_CACHE_SIZE,
+        server_settings={"statement_timeout": str(config.statement_timeout_ms)},
+    )
+    try:
+        async with pool.acquire() as conn:
+            await catalog.validate(conn)
+    except Exception:
+        await pool.close()
+        raise
+    return pool
+
+async def connect_db_pool(*names: str):
+    """Opens the named pools (all of them by default); maintenance scripts open only ANALYTICS."""
+    names = names or POOL_NAMES
+    catalog.load()
+    for name in names:
+        if name in pools:
+            continue
         try:
-            db_pool = await asyncpg.create_pool(
-                dsn=settings.asyncpg_url,
-                min_size=5,
-                max_size=20,
-                timeout=30,
-            )
-            print("✅ AsyncPG Connection Pool created successfully.")
+            pools[name] = await _create_pool(settings.asyncpg_url, POOL_CONFIGS[name])
         except Exception as e:
-            print(f"❌ Error connecting to database: {e}")
+            print(f"❌ Error connecting to database ({name} pool): {e}")
             raise
+        metrics.watch_pool(name, "primary", pools[name])
+        print(f"✅ AsyncPG {name} pool created successfully.")
+    if settings.DB_REPLICA_URL and READ in names:
+        await connect_replica_pools()
+
+async def connect_replica_pools():
+    # بدون replica سرویس کار می‌کند؛ فقط همه‌ی خواندن‌ها به primary می‌روند
+    try:
+        for name in REPLICA_POOL_NAMES:
+            if name not in replica_pools:
+                replica_pools[name] = await _create_pool(settings.DB_REPLICA_URL, POOL_CONFIGS[name])
+                metrics.watch_pool(name, "replica", replica_pools[name])
+    except Exception as e:
+        print(f"⚠️ Read replica is not available, reading from the primary: {e}")
+        await _close_replica_pools()
+        return
+    replica_monitor.start(pools[READ], replica_pools[READ])
+    print("✅ Read replica pools created successfully.")
+
+async def _close_replica_pools():
+    await replica_monitor.stop()
+    for name, pool in list(replica_pools.items()):
+        await pool.close()
+        metrics.watch_pool(name, "replica", None)
+    replica_pools.clear()
 
 async def close_db_pool():
-    global db_pool
-    if db_pool:
-        await db_pool.close()
-        db_pool = None
-        print("❌ AsyncPG Connection Pool closed.")
+    await _close_replica_pools()
+    if pools:
+        for name, pool in list(pools.items()):
+            await pool.close()
+            metrics.watch_pool(name, "primary", None)
+        pools.clear()
+        print("❌ AsyncPG Connection Pools closed.")
+
+async def _acquire(pool: Pool, name: str, server: str) -> Connection:
+    started = time.perf_counter()
+    try:
+        connection = await pool.acquire(timeout=POOL_CONFIGS[name].acquire_timeout)
+    except asyncio.TimeoutError:
+        metrics.DB_ACQUIRE_TIMEOUTS.labels(name, server).inc()
+        raise DatabaseBusyException()
+    waited = time.perf_counter() - started
+    metrics.observe_acquire(name, server, waited)
+    waits = acquire_waits.get()
+    if waits is not None:
+        waits.append(waited)
+    return connection
+
+@asynccontextmanager
+async def acquire_connection(name: str = TRANSACTIONAL) -> AsyncGenerator[Connection, None]:
+    """A primary connection from the named pool; DatabaseBusyException (503) when none frees up in time."""
+    pool = await get_pool(name)
+    connection = await _acquire(pool, name, "primary")
+    try:
+        yield connection
+    finally:
+        await pool.release(connection)
+
+@asynccontextmanager
+async def acquire_read_connection(user_id: int | None = None, name: str = READ) -> AsyncGenerator[Connection, None]:
+    """
+    A connection for read-only work: the replica while it is at most
+    REPLICA_MAX_LAG_SECONDS behind and, given ``user_id``, already has that
+    user's last write; otherwise the primary.
+    """
+    pool = replica_pools.get(name)
+    if pool is None:
+        async with acquire_connection(name) as connection:
+            yield connection
+        return
+
+    reason = replica_monitor.route(user_id)
+    if reason == "replica":
+        try:
+            connection = await _acquire(pool, name, "replica")
+        except Exception as e:
+            logging.warning(f"Could not get a replica connection, reading from the primary: {e}")
+            reason = "unavailable"
+        else:
+            metrics.DB_READ_ROUTES.labels("replica", "fresh").inc()
+            try:
+                yield connection
+            finally:
+                await pool.release(connection)
+            return
+
+    metrics.DB_READ_ROUTES.labels("primary", reason).inc()
+    async with acquire_connection(name) as connection:
+        yield connection
 
 async def get_db_connection() -> AsyncGenerator[Connection, None]:
-    if db_pool is None:
+    """Transactional pool: money movement and other writes."""
+    if not pools:
+        raise Exception("Database pool is not initialized.")
+    async with acquire_connection(TRANSACTIONAL) as connection:
+        yield connection
+
+async def get_read_connection() -> AsyncGenerator[Connection, None]:
+    """get_db_connection for read-only endpoints that are not tied to one user."""
+    if not pools:
+        raise Exception("Database pool is not initialized.")
+    async with acquire_read_connection(name=READ) as connection:
+        yield connection
+
+async def get_fresh_read_connection() -> AsyncGenerator[Connection, None]:
+    """Read pool on the primary, for reads that must not be stale (login)."""
+    if not pools:
+        raise Exception("Database pool is not initialized.")
+    async with acquire_connection(READ) as connection:
+        yield connection
+
+async def get_analytics_connection() -> AsyncGenerator[Connection, None]:
+    """Read-only reports; may be served by the replica."""
+    if not pools:
+        raise Exception("Database pool is not initialized.")
+    async with acquire_read_connection(name=ANALYTICS) as connection:
+        yield connection
+
+async def get_batch_connection() -> AsyncGenerator[Connection, None]:
+    """Long writes (batch transfers) on the primary's analytics pool, away from single transfers."""
+    if not pools:
         raise Exception("Database pool is not initialized.")
-    async with db_pool.acquire() as connection:
+    async with acquire_connection(ANALYTICS) as connection:
         yield connection
@@ -3,6 +3,12 @@ from contextlib import asynccontextmanager
 from app.api.v1 import routers
 import logging
 from app.db.session import connect_db_pool, close_db_pool
+from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, metrics_response
+from app.core.security import password_hasher
+from app.core.server_timing import ServerTimingMiddleware
+from app.services.card_lanes import card_lanes
+from app.services.group_commit import group_commit
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -10,7 +16,10 @@ logging.basicConfig(level=logging.DEBUG)
 async def lifespan(app: FastAPI):
     await connect_db_pool()
     yield
+    await card_lanes.close()
+    await group_commit.close()
     await close_db_pool()
+    password_hasher.shutdown()
 
 app = FastAPI(
     title="Bank API",
@@ -19,8 +28,18 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+if settings.SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(routers.router)
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to Bank API 🚀"}
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return metrics_response()
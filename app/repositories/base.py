@@ -0,0 +1,46 @@
+import time
+from typing import Any, Optional
+
+from asyncpg import Connection, Record
+from asyncpg.cursor import CursorFactory
+
+from app.core import metrics
+from app.core.config import settings
+from app.db.query_catalog import catalog
+
+
+class BaseRepository:
+    """
+    Executes catalog statements by name. On app pool connections the hot
+    statements were prepared by the pool ``init`` hook, so these calls go
+    straight to Bind/Execute. Each call's duration is recorded per
+    statement name in the db_query_duration_seconds histogram.
+    """
+
+    def __init__(self, conn: Connection):
+        self.conn = conn
+
+    async def _timed(self, method, name: str, args):
+        if not settings.METRICS_ENABLED:
+            return await method(catalog.sql(name), *args)
+        started = time.perf_counter()
+        try:
+            return await method(catalog.sql(name), *args)
+        finally:
+            metrics.observe_statement(name, time.perf_counter() - started)
+
+    async def _fetch(self, name: str, *args) -> list[Record]:
+        return await self._timed(self.conn.fetch, name, args)
+
+    async def _fetchrow(self, name: str, *args) -> Optional[Record]:
+        return await self._timed(self.conn.fetchrow, name, args)
+
+    async def _fetchval(self, name: str, *args) -> Any:
+        return await self._timed(self.conn.fetchval, name, args)
+
+    async def _execute(self, name: str, *args) -> str:
+        return await self._timed(self.conn.execute, name, args)
+
+    def _cursor(self, name: str, *args, prefetch: Optional[int] = None) -> CursorFactory:
+        """Server-side cursor over a catalog statement; iterate it inside a transaction."""
+        return self.conn.cursor(catalog.sql(name), *args, prefetch=prefetch)
@@ -1,67 +1,156 @@
 from decimal import Decimal
-from asyncpg import Connection, UniqueViolationError
-from datetime import datetime, timezone
+from asyncpg import Record, UniqueViolationError
+from datetime import date
 from typing import Optional
 
-class CardRepository:
+from app.db.query_catalog import catalog
+from app.repositories.base import BaseRepository
 
-    def __init__(self, conn: Connection):
-        self.conn = conn
+GET_BY_ID = catalog.register("cards.get_by_id", "SELECT * FROM cards WHERE id = $1;")
+
+GET_BY_NUMBER = catalog.register("cards.get_by_number", "SELECT * FROM cards WHERE card_number = $1;")
+
+LIST_BY_USER = catalog.register(
+    "cards.list_by_user",
+    "SELECT * FROM cards WHERE user_id = $1 ORDER BY id;",
+    hot=True,
+)
+
+# version هر کارت فقط بالا می‌رود و کارت تازه با 1 شروع می‌شود، پس این جمع با هر تغییری در کارت‌های کاربر بزرگ‌تر می‌شود
+VERSION_FOR_USER = catalog.register(
+    "cards.version_for_user",
+    "SELECT COALESCE(SUM(version), 0) FROM cards WHERE user_id = $1;",
+    hot=True,
+)
+
+CREATE_CARD = catalog.register("cards.create", """
+    INSERT INTO cards (user_id, card_number, cvv2, expire_date, balance, is_active)
+    VALUES ($1, $2, $3, $4, 0.00, TRUE)
+    RETURNING *;
+""")
+
+LOCK_BY_ID = catalog.register("cards.lock_by_id", "SELECT * FROM cards WHERE id = $1 FOR UPDATE;")
+
+CHANGE_BALANCE = catalog.register(
+    "cards.change_balance",
+    "UPDATE cards SET balance = balance + $1, version = version + 1 WHERE id = $2 RETURNING balance;",
+    hot=True,
+)
+
+DAILY_SPEND = catalog.register(
+    "cards.daily_spend",
+    "SELECT total FROM card_daily_spend WHERE card_id = $1 AND day = $2;",
+    hot=True,
+)
+
+ADD_DAILY_SPEND = catalog.register("cards.add_daily_spend", """
+    INSERT INTO card_daily_spend (card_id, day, total)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (card_id, day)
+    DO UPDATE SET total = card_daily_spend.total + EXCLUDED.total
+    RETURNING total;
+""", hot=True)
+
+CHANGE_BALANCES = catalog.register("cards.change_balances", """
+    UPDATE cards c
+    SET balance = c.balance + d.delta, version = c.version + 1
+    FROM unnest($1::int[], $2::numeric[]) AS d(id, delta)
+    WHERE c.id = d.id;
+""")
+
+DAILY_SPEND_FOR_CARDS = catalog.register(
+    "cards.daily_spend_for_cards",
+    "SELECT card_id, total FROM card_daily_spend WHERE card_id = ANY($1::int[]) AND day = $2;",
+)
+
+ADD_DAILY_SPENDS = catalog.register("cards.add_daily_spends", """
+    INSERT INTO card_daily_spend (card_id, day, total)
+    SELECT d.card_id, $2, d.total
+    FROM unnest($1::int[], $3::numeric[]) AS d(card_id, total)
+    ON CONFLICT (card_id, day)
+    DO UPDATE SET total = card_daily_spend.total + EXCLUDED.total;
+""")
+
+CLEAR_DAILY_SPEND = catalog.register("cards.clear_daily_spend", "DELETE FROM card_daily_spend;")
+
+REBUILD_DAILY_SPEND = catalog.register("cards.rebuild_daily_spend", """
+    INSERT INTO card_daily_spend (card_id, day, total)
+    SELECT source_card_id, (created_at AT TIME ZONE 'UTC')::date, SUM(amount)
+    FROM transactions
+    WHERE status = 'SUCCESS'
+      AND source_card_id IS NOT NULL
+      AND created_at IS NOT NULL
+    GROUP BY 1, 2;
+""")
+
+
+class CardRepository(BaseRepository):
 
     async def get_by_id(self, card_id: int) -> Optional[dict]:
-        sql = "SELECT * FROM cards WHERE id = $1;"
-        record = await self.conn.fetchrow(sql, card_id)
+        record = await self._fetchrow(GET_BY_ID, card_id)
         return dict(record) if record else None
 
     async def get_by_number(self, card_number: str) -> Optional[dict]:
-        sql = "SELECT * FROM cards WHERE card_number = $1;"
-        record = await self.conn.fetchrow(sql, card_number)
+        record = await self._fetchrow(GET_BY_NUMBER, card_number)
         return dict(record) if record else None
 
     async def list_by_user(self, user_id: int) -> list[dict]:
-        sql = "SELECT * FROM cards WHERE user_id = $1 ORDER BY id;"
-        records = await self.conn.fetch(sql, user_id)
-        return [dict(r) for r in records]
+        return [dict(r) for r in await self.list_records_by_user(user_id)]
+
+    async def list_records_by_user(self, user_id: int) -> list[Record]:
+        """list_by_user without the dict copies, for handlers that encode the rows directly."""
+        return await self._fetch(LIST_BY_USER, user_id)
+
+    async def version_for_user(self, user_id: int) -> int:
+        """Grows whenever any of the user's cards is added or changes balance or state."""
+        return int(await self._fetchval(VERSION_FOR_USER, user_id))
 
     async def create_card(self, user_id: int, card_number: str, cvv2: str, expire_date: str) -> dict:
-        sql = """
-            INSERT INTO cards (user_id, card_number, cvv2, expire_date, balance, is_active)
-            VALUES ($1, $2, $3, $4, 0.00, TRUE)
-            RETURNING *;
-        """
         try:
-            record = await self.conn.fetchrow(sql, user_id, card_number, cvv2, expire_date)
+            record = await self._fetchrow(CREATE_CARD, user_id, card_number, cvv2, expire_date)
             return dict(record)
         except UniqueViolationError:
             raise ValueError("Card number already exists")
 
     async def lock_by_id(self, card_id: int) -> dict:
-        sql = "SELECT * FROM cards WHERE id = $1 FOR UPDATE;"
-        record = await self.conn.fetchrow(sql, card_id)
+        record = await self._fetchrow(LOCK_BY_ID, card_id)
         if not record:
             raise ValueError(f"Card with id {card_id} not found for update")
         return dict(record)
 
     async def change_balance(self, card_id: int, amount: Decimal) -> Decimal:
-        sql = "UPDATE cards SET balance = balance + $1 WHERE id = $2 RETURNING balance;"
-        new_balance = await self.conn.fetchval(sql, amount, card_id)
+        new_balance = await self._fetchval(CHANGE_BALANCE, amount, card_id)
         if new_balance is None:
             raise ValueError(f"Card with id {card_id} not found for balance update")
         return Decimal(new_balance)
 
-    async def daily_total_for_card(self, card_id: int, date_from: datetime, date_to: datetime) -> Decimal:
-        if date_from.tzinfo is None:
-            date_from = date_from.replace(tzinfo=timezone.utc)
-        if date_to.tzinfo is None:
-            date_to = date_to.replace(tzinfo=timezone.utc)
-
-        sql = """
-            SELECT COALESCE(SUM(amount), 0)
-            FROM transactions
-            WHERE source_card_id = $1
-              AND created_at >= $2
-              AND created_at < $3
-              AND status = 'SUCCESS';
-        """
-        total = await self.conn.fetchval(sql, card_id, date_from, date_to)
+    async def change_balances(self, deltas: dict[int, Decimal]) -> int:
+        """Applies every ``card_id -> delta`` in one UPDATE; each card must appear once."""
+        if not deltas:
+            return 0
+        result = await self._execute(CHANGE_BALANCES, list(deltas), list(deltas.values()))
+        return int(result.split()[-1])
+
+    async def daily_spend_for_card(self, card_id: int, day: date) -> Decimal:
+        total = await self._fetchval(DAILY_SPEND, card_id, day)
         return Decimal(total or 0)
+
+    async def add_daily_spend(self, card_id: int, day: date, amount: Decimal) -> Decimal:
+        total = await self._fetchval(ADD_DAILY_SPEND, card_id, day, amount)
+        return Decimal(total)
+
+    async def daily_spend_for_cards(self, card_ids: list[int], day: date) -> dict[int, Decimal]:
+        records = await self._fetch(DAILY_SPEND_FOR_CARDS, card_ids, day)
+        totals = {card_id: Decimal(0) for card_id in card_ids}
+        totals.update({r['card_id']: Decimal(r['total']) for r in records})
+        return totals
+
+    async def add_daily_spends(self, day: date, amounts: dict[int, Decimal]):
+        if amounts:
+            await self._execute(ADD_DAILY_SPENDS, list(amounts), day, list(amounts.values()))
+
+    async def rebuild_daily_spend(self) -> int:
+        """Recompute every card_daily_spend row from SUCCESS transactions."""
+        await self._execute(CLEAR_DAILY_SPEND)
+        result = await self._execute(REBUILD_DAILY_SPEND)
+        return int(result.split()[-1])
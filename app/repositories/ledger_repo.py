@@ -0,0 +1,196 @@
+from datetime import datetime
+
+from app.db.query_catalog import catalog
+from app.repositories.base import BaseRepository
+from app.repositories.report_repo import GET_WATERMARK, LOCK_WATERMARK, SET_WATERMARK
+
+LEDGER_WATERMARK = "ledger"
+
+# سطرهای دفتر کل یک تراکنش SUCCESS با نام مستعار t؛ جمع هر چهار سطر صفر است.
+# برای برداشت dest_card_id خالی است و سطر دوم به حساب نقد بانک می‌رود؛ سطر آخر درآمد کارمزد بانک است.
+# تابع bank_transfer و migration سازنده‌ی جدول همین سطرها را می‌نویسند
+POSTINGS = """
+    CROSS JOIN LATERAL (VALUES
+        (t.source_card_id, CASE WHEN t.dest_card_id IS NULL THEN 'WITHDRAWAL' ELSE 'TRANSFER' END::ledger_entry_type,
+         -t.amount),
+        (t.dest_card_id, CASE WHEN t.dest_card_id IS NULL THEN 'WITHDRAWAL' ELSE 'TRANSFER' END::ledger_entry_type,
+         t.amount),
+        (t.source_card_id, 'FEE'::ledger_entry_type, -t.fee),
+        (NULL::integer, 'FEE'::ledger_entry_type, t.fee)
+    ) p(card_id, entry_type, amount)
+"""
+
+# آخرین checkpoint تا $2 و جمع سطرهای بعد از آن تا $2؛ تعداد این سطرها را job ساخت checkpoint محدود نگه می‌دارد
+BALANCE_AS_OF = catalog.register("ledger.balance_as_of", """
+    SELECT COALESCE(cp.balance, 0) + COALESCE(SUM(e.amount), 0) AS balance,
+           cp.posted_at AS checkpoint_at,
+           COUNT(e.id) AS entries_after_checkpoint
+    FROM (SELECT 1) one
+    LEFT JOIN LATERAL (
+        SELECT balance, posted_at, entry_id
+        FROM ledger_checkpoints
+        WHERE card_id = $1 AND posted_at <= $2
+        ORDER BY posted_at DESC, entry_id DESC
+        LIMIT 1
+    ) cp ON TRUE
+    LEFT JOIN ledger_entries e
+        ON e.card_id = $1
+       AND (e.posted_at, e.id) > (COALESCE(cp.posted_at, '-infinity'), COALESCE(cp.entry_id, 0))
+       AND e.posted_at <= $2
+    GROUP BY cp.balance, cp.posted_at;
+""")
+
+SET_LOCK_TIMEOUT = catalog.register("ledger.set_lock_timeout", "SELECT set_config('lock_timeout', $1, true);")
+
+# مثل reports.lock_transactions: بعد از این قفل هیچ id کوچک‌تر از max(id) خوانده‌شده بعداً ظاهر نمی‌شود
+LOCK_ENTRIES = catalog.register("ledger.lock_entries", "LOCK TABLE ledger_entries IN SHARE MODE;")
+
+MAX_ENTRY_ID = catalog.register("ledger.max_entry_id", "SELECT COALESCE(MAX(id), 0) FROM ledger_entries;")
+
+# برای هر کارتی که در بازه‌ی id سطر دارد، یک checkpoint در هر $3 سطر و یکی روی آخرین سطرش.
+# ترتیب (posted_at, id) هر کارت با ترتیب id یکی است چون سطرهای هر کارت زیر قفل ردیف همان کارت نوشته می‌شوند
+APPLY_CHECKPOINTS = catalog.register("ledger.apply_checkpoints", """
+    INSERT INTO ledger_checkpoints (card_id, posted_at, entry_id, balance)
+    SELECT e.card_id, e.posted_at, e.id, COALESCE(cp.balance, 0) + e.running
+    FROM (
+        SELECT card_id, posted_at, id,
+               SUM(amount) OVER w AS running,
+               row_number() OVER w AS n,
+               COUNT(*) OVER (PARTITION BY card_id) AS entries
+        FROM ledger_entries
+        WHERE id > $1 AND id <= $2
+          AND card_id IS NOT NULL
+        WINDOW w AS (PARTITION BY card_id ORDER BY posted_at, id)
+    ) e
+    LEFT JOIN LATERAL (
+        SELECT balance
+        FROM ledger_checkpoints c
+        WHERE c.card_id = e.card_id
+        ORDER BY c.posted_at DESC, c.entry_id DESC
+        LIMIT 1
+    ) cp ON TRUE
+    WHERE e.n % $3 = 0 OR e.n = e.entries;
+""")
+
+CLEAR_CHECKPOINTS = catalog.register("ledger.clear_checkpoints", "TRUNCATE ledger_checkpoints;")
+
+CLEAR_ENTRIES = catalog.register(
+    "ledger.clear_entries",
+    "TRUNCATE ledger_entries, ledger_checkpoints RESTART IDENTITY;",
+)
+
+# اختلاف موجودی فعلی هر کارت با جمع حرکت‌هایش (مثلاً موجودی اولیه‌ی seed) سطر OPENING می‌شود
+REBUILD_OPENINGS = catalog.register("ledger.rebuild_openings", f"""
+    INSERT INTO ledger_entries (transaction_id, card_id, entry_type, amount, posted_at)
+    SELECT NULL, v.card_id, 'OPENING', v.amount, o.posted_at
+    FROM (
+        SELECT c.id AS card_id,
+               c.balance - COALESCE(m.net, 0) AS amount,
+               COALESCE(LEAST(c.created_at, m.first_at), now()) AS posted_at
+        FROM cards c
+        LEFT JOIN (
+            SELECT p.card_id, SUM(p.amount) AS net, MIN(t.created_at) AS first_at
+            FROM transactions t
+            {POSTINGS}
+            WHERE t.status = 'SUCCESS' AND t.source_card_id IS NOT NULL AND p.card_id IS NOT NULL
+            GROUP BY p.card_id
+        ) m ON m.card_id = c.id
+    ) o
+    CROSS JOIN LATERAL (VALUES (o.card_id, o.amount), (NULL::integer, -o.amount)) v(card_id, amount)
+    WHERE o.amount <> 0
+    ORDER BY o.posted_at, o.card_id;
+""")
+
+REBUILD_ENTRIES = catalog.register("ledger.rebuild_entries", f"""
+    INSERT INTO ledger_entries (transaction_id, card_id, entry_type, amount, posted_at)
+    SELECT t.id, p.card_id, p.entry_type, p.amount, t.created_at
+    FROM transactions t
+    {POSTINGS}
+    WHERE t.status = 'SUCCESS' AND t.source_card_id IS NOT NULL
+    ORDER BY t.created_at, t.id;
+""")
+
+# یک دستور = یک snapshot؛ انتقال‌ها کارت و دفتر کل را در یک تراکنش تغییر می‌دهند
+MISMATCHES = catalog.register("ledger.mismatches", """
+    SELECT c.id AS card_id, c.card_number, c.balance,
+           COALESCE(cp.balance, 0) + COALESCE(tail.total, 0) AS ledger_balance
+    FROM cards c
+    LEFT JOIN LATERAL (
+        SELECT balance, posted_at, entry_id
+        FROM ledger_checkpoints
+        WHERE card_id = c.id
+        ORDER BY posted_at DESC, entry_id DESC
+        LIMIT 1
+    ) cp ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT SUM(e.amount) AS total
+        FROM ledger_entries e
+        WHERE e.card_id = c.id
+          AND (e.posted_at, e.id) > (COALESCE(cp.posted_at, '-infinity'), COALESCE(cp.entry_id, 0))
+    ) tail ON TRUE
+    WHERE c.balance <> COALESCE(cp.balance, 0) + COALESCE(tail.total, 0)
+    ORDER BY c.id;
+""")
+
+
+class LedgerRepository(BaseRepository):
+    """
+    Double-entry ledger and per-card balance checkpoints.
+
+    Every SUCCESS transaction writes its ledger_entries in the statement
+    that inserts it (see TransactionRepository and bank_transfer()).
+    ledger_checkpoints hold the running balance of a card up to one of its
+    entries; every entry with id <= rollup_watermark['ledger'] is covered
+    by a checkpoint of its card. A balance is the newest checkpoint plus
+    the entries after it.
+    """
+
+    async def balance_as_of(self, card_id: int, at: datetime) -> dict:
+        """The card's balance after every entry posted at or before ``at``."""
+        return dict(await self._fetchrow(BALANCE_AS_OF, card_id, at))
+
+    async def watermark(self) -> int:
+        last_id = await self._fetchval(GET_WATERMARK, LEDGER_WATERMARK)
+        return int(last_id or 0)
+
+    async def lock_watermark(self) -> int:
+        """Serializes checkpoint runs; must run inside a transaction."""
+        last_id = await self._fetchval(LOCK_WATERMARK, LEDGER_WATERMARK)
+        return int(last_id or 0)
+
+    async def stable_max_entry_id(self, lock_timeout_ms: int) -> int:
+        """
+        Highest ledger_entries.id below which no entry can still appear. Must
+        run inside a transaction of its own. The SHARE lock waits for in-flight
+        transfers and new transfers queue behind it until the transaction
+        ends; after ``lock_timeout_ms`` of waiting it raises LockNotAvailableError.
+        """
+        await self._execute(SET_LOCK_TIMEOUT, f"{lock_timeout_ms}ms")
+        await self._execute(LOCK_ENTRIES)
+        return int(await self._fetchval(MAX_ENTRY_ID))
+
+    async def apply_checkpoints(self, after_id: int, up_to_id: int, every: int) -> int:
+        """Checkpoints entries with after_id < id <= up_to_id and moves the watermark; returns how many."""
+        result = await self._execute(APPLY_CHECKPOINTS, after_id, up_to_id, every)
+        await self._execute(SET_WATERMARK, LEDGER_WATERMARK, up_to_id)
+        return int(result.split()[-1])
+
+    async def reset_checkpoints(self):
+        await self._execute(CLEAR_CHECKPOINTS)
+        await self._execute(SET_WATERMARK, LEDGER_WATERMARK, 0)
+
+    async def rebuild_entries(self) -> int:
+        """
+        Rewrites the whole ledger from the SUCCESS transactions plus one
+        OPENING entry per card for whatever its balance does not explain.
+        Clears the checkpoints. For seeded or scratch databases only.
+        """
+        await self._execute(CLEAR_ENTRIES)
+        await self._execute(SET_WATERMARK, LEDGER_WATERMARK, 0)
+        openings = await self._execute(REBUILD_OPENINGS)
+        entries = await self._execute(REBUILD_ENTRIES)
+        return int(openings.split()[-1]) + int(entries.split()[-1])
+
+    async def mismatches(self) -> list[dict]:
+        """Cards whose balance differs from their ledger balance."""
+        return [dict(r) for r in await self._fetch(MISMATCHES)]
@@ -0,0 +1,49 @@
+from datetime import date
+
+from app.db.query_catalog import catalog
+from app.repositories.base import BaseRepository
+
+LIST_PARTITIONS = catalog.register("partitions.list", """
+    SELECT c.relname AS name,
+           pg_get_expr(c.relpartbound, c.oid) AS bound,
+           GREATEST(c.reltuples, 0)::bigint AS estimated_rows,
+           pg_total_relation_size(c.oid) AS total_bytes
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'transactions'::regclass
+    ORDER BY c.relname;
+""")
+
+ENSURE_PARTITIONS = catalog.register(
+    "partitions.ensure",
+    "SELECT name FROM ensure_transaction_partitions($1, $2) AS name;",
+)
+
+DETACH_PARTITIONS = catalog.register(
+    "partitions.detach",
+    "SELECT name FROM detach_transaction_partitions($1, $2) AS name;",
+)
+
+COUNT_DEFAULT = catalog.register("partitions.count_default", "SELECT COUNT(*) FROM transactions_default;")
+
+
+class PartitionRepository(BaseRepository):
+    """
+    Monthly partitions of ``transactions`` (transactions_YYYY_MM, UTC months)
+    plus ``transactions_default`` for rows outside every month. The DDL
+    lives in the ensure/detach_transaction_partitions database functions.
+    """
+
+    async def list_partitions(self) -> list[dict]:
+        return [dict(r) for r in await self._fetch(LIST_PARTITIONS)]
+
+    async def ensure_partitions(self, date_from: date, date_to: date) -> list[str]:
+        """Creates the missing partitions of every month that starts before ``date_to``; returns their names."""
+        return [r['name'] for r in await self._fetch(ENSURE_PARTITIONS, date_from, date_to)]
+
+    async def detach_partitions(self, before: date, drop: bool = False) -> list[str]:
+        """Detaches (or drops) the partitions of months that end on or before ``before``."""
+        return [r['name'] for r in await self._fetch(DETACH_PARTITIONS, before, drop)]
+
+    async def default_rows(self) -> int:
+        return int(await self._fetchval(COUNT_DEFAULT))
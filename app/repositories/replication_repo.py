@@ -0,0 +1,27 @@
+from typing import Optional
+
+from app.db.query_catalog import catalog
+from app.repositories.base import BaseRepository
+
+# موقعیت‌ها به بایت (numeric) برگردانده می‌شوند تا در پایتون مقایسه‌پذیر باشند
+WAL_POSITION = catalog.register(
+    "replication.wal_position",
+    "SELECT (pg_current_wal_lsn() - '0/0'::pg_lsn)::bigint;",
+)
+
+# روی سروری که standby نیست NULL است
+REPLAY_POSITION = catalog.register(
+    "replication.replay_position",
+    "SELECT (pg_last_wal_replay_lsn() - '0/0'::pg_lsn)::bigint;",
+)
+
+
+class ReplicationRepository(BaseRepository):
+
+    async def wal_position(self) -> int:
+        """Current WAL write position of the primary."""
+        return int(await self._fetchval(WAL_POSITION))
+
+    async def replay_position(self) -> Optional[int]:
+        """WAL position a standby has replayed up to; None when the server is not a standby."""
+        return await self._fetchval(REPLAY_POSITION)
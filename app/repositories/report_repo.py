@@ -0,0 +1,225 @@
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from app.db.query_catalog import catalog
+from app.repositories.base import BaseRepository
+
+TRANSACTIONS_WATERMARK = "transactions"
+
+# موقعیت شروع صفحه‌بندی keyset گزارش‌های ماهانه (جدیدتر از هر ماهی)
+MONTHLY_START = (datetime.max.replace(tzinfo=timezone.utc), 2 ** 31 - 1)
+
+GET_WATERMARK = catalog.register(
+    "reports.get_watermark",
+    "SELECT last_id FROM rollup_watermark WHERE name = $1;",
+)
+
+LOCK_WATERMARK = catalog.register(
+    "reports.lock_watermark",
+    "SELECT last_id FROM rollup_watermark WHERE name = $1 FOR UPDATE;",
+)
+
+SET_WATERMARK = catalog.register("reports.set_watermark", """
+    INSERT INTO rollup_watermark (name, last_id)
+    VALUES ($1, $2)
+    ON CONFLICT (name) DO UPDATE SET last_id = EXCLUDED.last_id;
+""")
+
+# فقط برای تراکنش جاری؛ LOCK TABLE بعد از این مدت انتظار با LockNotAvailableError شکست می‌خورد
+SET_LOCK_TIMEOUT = catalog.register("reports.set_lock_timeout", "SELECT set_config('lock_timeout', $1, true);")
+
+# SHARE منتظر می‌ماند تا همه‌ی INSERTهای در جریان commit شوند و تا پایان تراکنش INSERT جدید را
+# نگه می‌دارد؛ پس هیچ id کوچک‌تر از max(id) خوانده‌شده بعداً ظاهر نمی‌شود
+LOCK_TRANSACTIONS = catalog.register("reports.lock_transactions", "LOCK TABLE transactions IN SHARE MODE;")
+
+MAX_TRANSACTION_ID = catalog.register("reports.max_transaction_id", "SELECT COALESCE(MAX(id), 0) FROM transactions;")
+
+APPLY_HOURLY = catalog.register("reports.apply_hourly", """
+    INSERT INTO report_hourly_success (hour_utc, success_count)
+    SELECT date_trunc('hour', created_at, 'UTC'), COUNT(*)
+    FROM transactions
+    WHERE id > $1 AND id <= $2
+      AND status = 'SUCCESS'
+      AND created_at IS NOT NULL
+    GROUP BY 1
+    ON CONFLICT (hour_utc)
+    DO UPDATE SET success_count = report_hourly_success.success_count + EXCLUDED.success_count;
+""")
+
+APPLY_USER_MONTHLY = catalog.register("reports.apply_user_monthly", """
+    INSERT INTO report_user_monthly (user_id, month_utc, total_amount, tx_count)
+    SELECT c.user_id, date_trunc('month', t.created_at, 'UTC'), SUM(t.amount), COUNT(*)
+    FROM transactions t
+    JOIN cards c ON c.id = t.source_card_id
+    WHERE t.id > $1 AND t.id <= $2
+      AND t.status = 'SUCCESS'
+      AND t.created_at IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (user_id, month_utc)
+    DO UPDATE SET total_amount = report_user_monthly.total_amount + EXCLUDED.total_amount,
+                  tx_count = report_user_monthly.tx_count + EXCLUDED.tx_count;
+""")
+
+APPLY_CARD_MONTHLY = catalog.register("reports.apply_card_monthly", """
+    INSERT INTO report_card_monthly (card_id, month_utc, total_amount, tx_count)
+    SELECT t.source_card_id, date_trunc('month', t.created_at, 'UTC'), SUM(t.amount), COUNT(*)
+    FROM transactions t
+    WHERE t.id > $1 AND t.id <= $2
+      AND t.status = 'SUCCESS'
+      AND t.source_card_id IS NOT NULL
+      AND t.created_at IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (card_id, month_utc)
+    DO UPDATE SET total_amount = report_card_monthly.total_amount + EXCLUDED.total_amount,
+                  tx_count = report_card_monthly.tx_count + EXCLUDED.tx_count;
+""")
+
+CLEAR_FEE_PREFIX = catalog.register("reports.clear_fee_prefix", "DELETE FROM fee_daily_prefix;")
+
+REBUILD_FEE_PREFIX = catalog.register("reports.rebuild_fee_prefix", """
+    INSERT INTO fee_daily_prefix (day, total, cumulative)
+    SELECT day, SUM(total), SUM(SUM(total)) OVER (ORDER BY day)
+    FROM fee_daily_buckets
+    WHERE day < $1
+    GROUP BY day;
+""")
+
+CLEAR_ROLLUPS = catalog.register(
+    "reports.clear_rollups",
+    "TRUNCATE report_hourly_success, report_user_monthly, report_card_monthly;",
+)
+
+# گزارش‌ها = rollup + دم تراکنش‌هایی که هنوز rollup نشده‌اند (id > $1 = watermark).
+# watermark به صورت پارامتر داده می‌شود تا planner اندازه‌ی دم را از آمار id تخمین بزند
+SUCCESS_PER_HOUR = catalog.register("reports.success_per_hour_rollup", """
+    SELECT hour_utc, SUM(success_count)::bigint AS success_count
+    FROM (
+        SELECT hour_utc, success_count FROM report_hourly_success
+        UNION ALL
+        SELECT date_trunc('hour', t.created_at, 'UTC'), COUNT(*)
+        FROM transactions t
+        WHERE t.id > $1
+          AND t.status = 'SUCCESS'
+          AND t.created_at IS NOT NULL
+        GROUP BY 1
+    ) r
+    GROUP BY hour_utc
+    ORDER BY hour_utc;
+""")
+
+# گزارش‌های ماهانه فقط مال یک کاربر (و کارت‌هایش) اند و keyset روی (month_utc, id) نزولی صفحه‌بندی می‌شوند
+USER_MONTHLY = catalog.register("reports.user_monthly_rollup", """
+    SELECT r.user_id, u.full_name, r.month_utc,
+           SUM(r.total_amount) AS total_amount, SUM(r.tx_count)::bigint AS tx_count
+    FROM (
+        SELECT user_id, month_utc, total_amount, tx_count FROM report_user_monthly
+        WHERE user_id = $2
+          AND (month_utc, user_id) < ($3, $4)
+        UNION ALL
+        SELECT c.user_id, date_trunc('month', t.created_at, 'UTC'), SUM(t.amount), COUNT(*)
+        FROM cards c
+        JOIN transactions t ON t.source_card_id = c.id
+        WHERE c.user_id = $2
+          AND t.id > $1
+          AND t.status = 'SUCCESS'
+          AND t.created_at IS NOT NULL
+        GROUP BY 1, 2
+    ) r
+    JOIN users u ON u.id = r.user_id
+    WHERE (r.month_utc, r.user_id) < ($3, $4)
+    GROUP BY r.user_id, u.full_name, r.month_utc
+    ORDER BY r.month_utc DESC, r.user_id DESC
+    LIMIT $5;
+""")
+
+CARD_MONTHLY = catalog.register("reports.card_monthly_rollup", """
+    SELECT r.card_id, r.card_number, r.month_utc,
+           SUM(r.total_amount) AS total_amount, SUM(r.tx_count)::bigint AS tx_count
+    FROM (
+        SELECT m.card_id, c.card_number, m.month_utc, m.total_amount, m.tx_count
+        FROM cards c
+        JOIN report_card_monthly m ON m.card_id = c.id
+        WHERE c.user_id = $2
+          AND (m.month_utc, m.card_id) < ($3, $4)
+        UNION ALL
+        SELECT c.id, c.card_number, date_trunc('month', t.created_at, 'UTC'), SUM(t.amount), COUNT(*)
+        FROM cards c
+        JOIN transactions t ON t.source_card_id = c.id
+        WHERE c.user_id = $2
+          AND t.id > $1
+          AND t.status = 'SUCCESS'
+          AND t.created_at IS NOT NULL
+        GROUP BY 1, 2, 3
+    ) r
+    WHERE (r.month_utc, r.card_id) < ($3, $4)
+    GROUP BY r.card_id, r.card_number, r.month_utc
+    ORDER BY r.month_utc DESC, r.card_id DESC
+    LIMIT $5;
+""")
+
+
+class ReportRepository(BaseRepository):
+    """
+    Report rollups over SUCCESS transactions.
+
+    report_hourly_success, report_user_monthly and report_card_monthly hold
+    the aggregates of every transaction with id <= rollup_watermark.last_id.
+    They are only ever added to, which relies on transactions rows not
+    changing status or amount after they are inserted.
+
+    The report readers take the watermark as ``after_id`` and merge in the
+    transactions above it; read both in the same snapshot (see
+    ReportService).
+    """
+
+    async def watermark(self) -> int:
+        last_id = await self._fetchval(GET_WATERMARK, TRANSACTIONS_WATERMARK)
+        return int(last_id or 0)
+
+    async def lock_watermark(self) -> int:
+        """Serializes refreshers; must run inside a transaction."""
+        last_id = await self._fetchval(LOCK_WATERMARK, TRANSACTIONS_WATERMARK)
+        return int(last_id or 0)
+
+    async def stable_max_transaction_id(self, lock_timeout_ms: int) -> int:
+        """
+        Highest transactions.id below which no row can still appear. Must run
+        inside a transaction of its own. The SHARE lock waits for in-flight
+        inserts and new inserts queue behind it until the transaction ends;
+        after ``lock_timeout_ms`` of waiting it raises LockNotAvailableError.
+        """
+        await self._execute(SET_LOCK_TIMEOUT, f"{lock_timeout_ms}ms")
+        await self._execute(LOCK_TRANSACTIONS)
+        return int(await self._fetchval(MAX_TRANSACTION_ID))
+
+    async def apply_rollup(self, after_id: int, up_to_id: int):
+        """Adds transactions with after_id < id <= up_to_id to the rollups and moves the watermark."""
+        await self._execute(APPLY_HOURLY, after_id, up_to_id)
+        await self._execute(APPLY_USER_MONTHLY, after_id, up_to_id)
+        await self._execute(APPLY_CARD_MONTHLY, after_id, up_to_id)
+        await self._execute(SET_WATERMARK, TRANSACTIONS_WATERMARK, up_to_id)
+
+    async def reset_rollups(self):
+        await self._execute(CLEAR_ROLLUPS)
+        await self._execute(SET_WATERMARK, TRANSACTIONS_WATERMARK, 0)
+
+    async def rebuild_fee_prefix(self, before_day: date) -> int:
+        """Recomputes the cumulative fee sums of every bucket day before ``before_day``."""
+        await self._execute(CLEAR_FEE_PREFIX)
+        result = await self._execute(REBUILD_FEE_PREFIX, before_day)
+        return int(result.split()[-1])
+
+    async def success_per_hour(self, after_id: int) -> list[dict]:
+        return [dict(r) for r in await self._fetch(SUCCESS_PER_HOUR, after_id)]
+
+    async def user_monthly(self, after_id: int, user_id: int, limit: int,
+                           before: Optional[tuple[datetime, int]] = None) -> list[dict]:
+        """The user's months, newest first, strictly before the (month_utc, user_id) position ``before``."""
+        before_month, before_id = before or MONTHLY_START
+        return [dict(r) for r in await self._fetch(USER_MONTHLY, after_id, user_id, before_month, before_id, limit)]
+
+    async def card_monthly(self, after_id: int, user_id: int, limit: int,
+                           before: Optional[tuple[datetime, int]] = None) -> list[dict]:
+        """Months of the user's cards, newest first, strictly before the (month_utc, card_id) position ``before``."""
+        before_month, before_id = before or MONTHLY_START
+        return [dict(r) for r in await self._fetch(CARD_MONTHLY, after_id, user_id, before_month, before_id, limit)]
@@ -1,30 +1,318 @@
-from datetime import datetime
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
 from decimal import Decimal
-from typing import Optional, List
-import asyncpg
-from asyncpg import Connection
+from itertools import product
+from typing import AsyncIterator, Optional, List
 
+from asyncpg import Record
 
-class TransactionRepository:
-    def __init__(self, conn: Connection):
-        self.conn = conn
+from app.db.query_catalog import catalog
+from app.repositories.base import BaseRepository
+from app.repositories.ledger_repo import POSTINGS
 
-    async def get_card_by_number_for_update(self, card_number: str) -> Optional[dict]:
-        sql = "SELECT * FROM cards WHERE card_number = $1 FOR UPDATE;"
-        record = await self.conn.fetchrow(sql, card_number)
-        return dict(record) if record else None
+# بازه‌ی باز برای فیلترهای تاریخ (asyncpg آن‌ها را به -infinity/infinity تبدیل می‌کند)
+EARLIEST = datetime.min.replace(tzinfo=timezone.utc)
+LATEST = datetime.max.replace(tzinfo=timezone.utc)
+
+# موقعیت شروع صفحه‌بندی keyset (جدیدتر از هر تراکنشی)
+HISTORY_START = (LATEST, 2 ** 31 - 1)
+
+# کارمزد هر روز (UTC) در FEE_BUCKET_SLOTS ردیف پخش می‌شود تا انتقال‌های هم‌زمان روی یک ردیف صف نکشند؛
+# تابع bank_transfer هم همین عدد را استفاده می‌کند
+FEE_BUCKET_SLOTS = 16
+
+# سری ساعتی مستقیم از جدول تراکنش‌ها خوانده می‌شود؛ بازه‌اش محدود است
+MAX_HOURLY_SERIES_RANGE = timedelta(days=31)
+
+LOCK_CARD_BY_NUMBER = catalog.register(
+    "transactions.lock_card_by_number",
+    "SELECT * FROM cards WHERE card_number = $1 FOR UPDATE;",
+    hot=True,
+)
+
+# هر دو کارت در یک دستور و به ترتیب id قفل می‌شوند تا دو انتقال خلاف جهت روی یک جفت کارت deadlock نکنند
+LOCK_CARD_PAIR = catalog.register(
+    "transactions.lock_card_pair",
+    "SELECT * FROM cards WHERE card_number IN ($1, $2) ORDER BY id FOR UPDATE;",
+    hot=True,
+)
+
+# سطرهای دفتر کل در همان دستور نوشته می‌شوند؛ تراکنش SUCCESS بدون آن‌ها ثبت نمی‌شود
+CREATE_TRANSACTION = catalog.register("transactions.create", f"""
+    WITH tx AS (
+        INSERT INTO transactions
+        (source_card_id, dest_card_id, amount, fee, status, description, created_at)
+        VALUES ($1, $2, $3, $4, $5, $6, $7)
+        RETURNING *
+    ), posted AS (
+        INSERT INTO ledger_entries (transaction_id, card_id, entry_type, amount)
+        SELECT t.id, p.card_id, p.entry_type, p.amount
+        FROM tx t
+        {POSTINGS}
+        WHERE t.status = 'SUCCESS'
+    )
+    SELECT * FROM tx;
+""", hot=True)
+
+LOCK_CARDS_BY_NUMBERS = catalog.register(
+    "transactions.lock_cards_by_numbers",
+    "SELECT * FROM cards WHERE card_number = ANY($1::varchar[]) ORDER BY id FOR UPDATE;",
+)
+
+# ترتیب ORDER BY ord باعث می‌شود idها به همان ترتیب ورودی تخصیص داده شوند
+CREATE_TRANSACTIONS = catalog.register("transactions.create_many", f"""
+    WITH tx AS (
+        INSERT INTO transactions
+        (source_card_id, dest_card_id, amount, fee, status, description, created_at)
+        SELECT b.source_card_id, b.dest_card_id, b.amount, b.fee, 'SUCCESS', b.description, now()
+        FROM unnest($1::int[], $2::int[], $3::numeric[], $4::numeric[], $5::varchar[])
+            WITH ORDINALITY AS b(source_card_id, dest_card_id, amount, fee, description, ord)
+        ORDER BY b.ord
+        RETURNING *
+    ), posted AS (
+        INSERT INTO ledger_entries (transaction_id, card_id, entry_type, amount)
+        SELECT t.id, p.card_id, p.entry_type, p.amount
+        FROM (SELECT * FROM tx ORDER BY id) t
+        {POSTINGS}
+    )
+    SELECT * FROM tx ORDER BY id;
+""")
+
+BANK_TRANSFER = catalog.register(
+    "transactions.bank_transfer",
+    "SELECT * FROM bank_transfer($1, $2, $3, $4, $5, $6, $7, $8);",
+    hot=True,
+)
+
+GET_IDEMPOTENT_TRANSACTION = catalog.register("transactions.get_idempotent", """
+    SELECT k.request_hash, t.*
+    FROM idempotency_keys k
+    JOIN transactions t ON t.id = k.transaction_id AND t.created_at = k.transaction_created_at
+    WHERE k.user_id = $1 AND k.key = $2;
+""", hot=True)
+
+# در همان تراکنش create_transaction؛ درخواست تکراری هم‌زمان روی PK منتظر می‌ماند و بعد UniqueViolation می‌گیرد
+RECORD_IDEMPOTENCY_KEY = catalog.register("transactions.record_idempotency_key", """
+    INSERT INTO idempotency_keys (user_id, key, operation, request_hash, transaction_id, transaction_created_at)
+    VALUES ($1, $2, $3, $4, $5, $6);
+""", hot=True)
+
+HISTORY_FOR_USER = catalog.register("transactions.history_for_user", """
+    WITH user_cards AS MATERIALIZED (
+        SELECT id FROM cards WHERE user_id = $1
+    )
+    SELECT
+        t.*,
+        sc.card_number AS source_card_number,
+        dc.card_number AS dest_card_number
+    FROM (
+        SELECT * FROM (
+            SELECT o.*
+            FROM user_cards c
+            CROSS JOIN LATERAL (
+                SELECT * FROM transactions t
+                WHERE t.source_card_id = c.id
+                  AND (t.created_at, t.id) < ($2, $3)
+                ORDER BY t.created_at DESC, t.id DESC
+                LIMIT $4
+            ) o
+            UNION ALL
+            SELECT i.*
+            FROM user_cards c
+            CROSS JOIN LATERAL (
+                SELECT * FROM transactions t
+                WHERE t.dest_card_id = c.id
+                  AND (t.created_at, t.id) < ($2, $3)
+                  AND NOT EXISTS (SELECT 1 FROM user_cards u WHERE u.id = t.source_card_id)
+                ORDER BY t.created_at DESC, t.id DESC
+                LIMIT $4
+            ) i
+        ) merged
+        ORDER BY created_at DESC, id DESC
+        LIMIT $4
+    ) t
+    LEFT JOIN cards sc ON t.source_card_id = sc.id
+    LEFT JOIN cards dc ON t.dest_card_id = dc.id
+    ORDER BY t.created_at DESC, t.id DESC;
+""", hot=True)
+
+# صورت‌حساب کارت‌ها به ترتیب زمانی؛ انتقال بین دو کارت از همین مجموعه فقط یک بار می‌آید
+EXPORT_FOR_CARDS = catalog.register("transactions.export_for_cards", """
+    SELECT
+        t.id,
+        t.created_at,
+        (SELECT card_number FROM cards WHERE id = t.source_card_id) AS source_card_number,
+        (SELECT card_number FROM cards WHERE id = t.dest_card_id) AS dest_card_number,
+        t.amount,
+        t.fee,
+        t.status::text AS status,
+        t.description
+    FROM (
+        SELECT * FROM transactions
+        WHERE source_card_id = ANY($1::int[])
+          AND created_at >= $2 AND created_at <= $3
+        UNION ALL
+        SELECT * FROM transactions
+        WHERE dest_card_id = ANY($1::int[])
+          AND created_at >= $2 AND created_at <= $3
+          AND (source_card_id IS NULL OR NOT source_card_id = ANY($1::int[]))
+    ) t
+    ORDER BY t.created_at, t.id;
+""")
+
+ADD_FEE_BUCKET = catalog.register("transactions.add_fee_bucket", f"""
+    INSERT INTO fee_daily_buckets (day, slot, total, tx_count)
+    VALUES ($1, $2 % {FEE_BUCKET_SLOTS}, $3, 1)
+    ON CONFLICT (day, slot)
+    DO UPDATE SET total = fee_daily_buckets.total + EXCLUDED.total,
+                  tx_count = fee_daily_buckets.tx_count + EXCLUDED.tx_count;
+""", hot=True)
+
+# ORDER BY زیر FOR UPDATE است، پس ردیف‌ها به ترتیب slot قفل می‌شوند
+LOCK_FEE_BUCKETS = catalog.register("transactions.lock_fee_buckets", f"""
+    SELECT slot
+    FROM fee_daily_buckets
+    WHERE day = $1
+      AND slot = ANY(SELECT c % {FEE_BUCKET_SLOTS} FROM unnest($2::int[]) c)
+    ORDER BY slot
+    FOR UPDATE;
+""")
+
+# unnest ترتیب آرایه‌ها را نگه می‌دارد؛ فراخوان آن‌ها را بر اساس (day, slot) مرتب می‌فرستد
+ADD_FEE_BUCKETS = catalog.register("transactions.add_fee_buckets", """
+    INSERT INTO fee_daily_buckets (day, slot, total, tx_count)
+    SELECT * FROM unnest($1::date[], $2::smallint[], $3::numeric[], $4::bigint[])
+    ON CONFLICT (day, slot)
+    DO UPDATE SET total = fee_daily_buckets.total + EXCLUDED.total,
+                  tx_count = fee_daily_buckets.tx_count + EXCLUDED.tx_count;
+""")
+
+CLEAR_FEE_BUCKETS = catalog.register("transactions.clear_fee_buckets", "DELETE FROM fee_daily_buckets;")
+
+REBUILD_FEE_BUCKETS = catalog.register("transactions.rebuild_fee_buckets", f"""
+    INSERT INTO fee_daily_buckets (day, slot, total, tx_count)
+    SELECT (created_at AT TIME ZONE 'UTC')::date, COALESCE(source_card_id, 0) % {FEE_BUCKET_SLOTS}, SUM(fee), COUNT(*)
+    FROM transactions
+    WHERE status = 'SUCCESS'
+      AND created_at IS NOT NULL
+    GROUP BY 1, 2;
+""")
+
+# جمع روزهای کامل [$1, $2): تا آخرین روز prefix با دو lookup، روزهای بعد از آن از bucketها
+FEE_SUM_DAYS = catalog.register("transactions.fee_sum_days", """
+    SELECT
+        COALESCE((SELECT cumulative FROM fee_daily_prefix WHERE day < $2 ORDER BY day DESC LIMIT 1), 0)
+      - COALESCE((SELECT cumulative FROM fee_daily_prefix WHERE day < $1 ORDER BY day DESC LIMIT 1), 0)
+      + COALESCE((
+            SELECT SUM(total) FROM fee_daily_buckets
+            WHERE day >= $1 AND day < $2
+              AND day > COALESCE((SELECT MAX(day) FROM fee_daily_prefix), '0001-01-01'::date)
+        ), 0);
+""")
+
+FEE_SUM_BETWEEN = catalog.register("transactions.fee_sum_between", """
+    SELECT COALESCE(SUM(fee), 0) FROM transactions
+    WHERE status = 'SUCCESS' AND created_at >= $1 AND created_at < $2;
+""")
+
+# روزهای بسته‌شده یک ردیف در fee_daily_prefix دارند؛ فقط روزهای بعد از آن از bucketها خوانده می‌شوند
+FEE_SERIES_DAYS = catalog.register("transactions.fee_series_days", """
+    SELECT date_trunc($3, d.day::timestamp) AT TIME ZONE 'UTC' AS bucket_start, SUM(d.total) AS total_revenue
+    FROM (
+        SELECT day, total FROM fee_daily_prefix
+        WHERE day >= $1 AND day < $2
+        UNION ALL
+        SELECT day, total FROM fee_daily_buckets
+        WHERE day >= $1 AND day < $2
+          AND day > COALESCE((SELECT MAX(day) FROM fee_daily_prefix), '0001-01-01'::date)
+    ) d
+    GROUP BY 1
+    ORDER BY 1;
+""")
 
-    async def get_cards_by_id_for_update(self, id1: int, id2: int) -> tuple[dict, dict]:
-        ids = sorted([id1, id2])
-        sql = "SELECT * FROM cards WHERE id IN ($1, $2) ORDER BY id FOR UPDATE;"
-        locked_records = await self.conn.fetch(sql, ids[0], ids[1])
+FEE_SERIES_BETWEEN = catalog.register("transactions.fee_series_between", """
+    SELECT date_trunc($3, created_at, 'UTC') AS bucket_start, SUM(fee) AS total_revenue
+    FROM transactions
+    WHERE status = 'SUCCESS' AND created_at >= $1 AND created_at < $2
+    GROUP BY 1
+    ORDER BY 1;
+""")
 
-        if len(locked_records) != 2:
-            raise ValueError("Could not lock both cards during transfer.")
 
-        locked_cards = [dict(r) for r in locked_records]
-        card_map = {c['id']: c for c in locked_cards}
-        return card_map[id1], card_map[id2]
+def _fee_sum_sql(by_id: bool, has_from: bool, has_to: bool) -> str:
+    sql = "SELECT COALESCE(SUM(fee), 0) FROM transactions WHERE status = 'SUCCESS'"
+    i = 1
+    if by_id:
+        sql += f" AND id = ${i}"
+        i += 1
+    if has_from:
+        sql += f" AND created_at >= ${i}"
+        i += 1
+    if has_to:
+        sql += f" AND created_at <= ${i}"
+    return sql + ";"
+
+
+# فیلتر روی یک تراکنش: یک عبارت ثبت‌شده برای هر ترکیب از فیلترهای تاریخ
+FEE_SUM_BY_ID = {
+    flags: catalog.register("transactions.fee_sum[{}]".format(",".join(
+        name for name, on in zip(("id", "from", "to"), (True,) + flags) if on)), _fee_sum_sql(True, *flags))
+    for flags in product((False, True), repeat=2)
+}
+
+# مرزهای بازه‌ی کارمزد یک روز با datetime.min/max فاصله دارند تا +1µs و «روز بعد» سرریز نکنند؛
+# هیچ تراکنشی در این یک روز نیست
+FEE_RANGE_MIN = EARLIEST + timedelta(days=1)
+FEE_RANGE_MAX = LATEST - timedelta(days=1)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # asyncpg برای timestamptz مقدار بدون tz را با astimezone به وقت محلی سرور تفسیر می‌کند؛
+    # همین‌جا هم همان تفسیر را به کار می‌بریم تا مرز روزها با کوئری یکی باشد
+    try:
+        value = value.astimezone(timezone.utc)
+    except (OverflowError, ValueError):
+        # فقط مقدارهای چند ساعت مانده به datetime.min/max با تبدیل منطقه‌ی زمانی از بازه بیرون می‌زنند
+        return FEE_RANGE_MIN if value.year == datetime.min.year else FEE_RANGE_MAX
+    return min(max(value, FEE_RANGE_MIN), FEE_RANGE_MAX)
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def _split_range(date_from: Optional[datetime], date_to: Optional[datetime]):
+    """
+    Splits the inclusive [date_from, date_to] range into whole UTC days
+    [first_day, end_day) and the half-open timestamp edges before and after
+    them. Either edge may be None.
+    """
+    lo = _as_utc(date_from) if date_from else None
+    # انتهای بازه inclusive است؛ با یک میکروثانیه half-open می‌شود
+    hi = _as_utc(date_to) + timedelta(microseconds=1) if date_to else None
+
+    first_day = date.min
+    if lo is not None:
+        first_day = lo.date() if lo == _midnight(lo.date()) else lo.date() + timedelta(days=1)
+    end_day = hi.date() if hi is not None else date.max
+
+    if first_day >= end_day:
+        return None, (lo, hi), None
+    head = (lo, _midnight(first_day)) if lo is not None and lo < _midnight(first_day) else None
+    tail = (_midnight(end_day), hi) if hi is not None and _midnight(end_day) < hi else None
+    return (first_day, end_day), head, tail
+
+
+class TransactionRepository(BaseRepository):
+
+    async def get_card_by_number_for_update(self, card_number: str) -> Optional[dict]:
+        record = await self._fetchrow(LOCK_CARD_BY_NUMBER, card_number)
+        return dict(record) if record else None
+
+    async def lock_card_pair(self, source_number: str, dest_number: str) -> tuple[Optional[dict], Optional[dict]]:
+        """Locks both cards in id order; a card that does not exist comes back as None."""
+        card_map = {r['card_number']: dict(r) for r in await self._fetch(LOCK_CARD_PAIR, source_number, dest_number)}
+        return card_map.get(source_number), card_map.get(dest_number)
 
     async def create_transaction(
             self,
@@ -35,15 +323,9 @@ class TransactionRepository:
             status: str,
             description: Optional[str] = None,
     ) -> dict:
-        sql = """
-            INSERT INTO transactions 
-            (source_card_id, dest_card_id, amount, fee, status, description, created_at)
-            VALUES ($1, $2, $3, $4, $5, $6, $7)
-            RETURNING *;
-        """
         now = datetime.now()
-        record = await self.conn.fetchrow(
-            sql,
+        record = await self._fetchrow(
+            CREATE_TRANSACTION,
             source_id,
             dest_id,
             amount,
@@ -58,63 +340,191 @@ class TransactionRepository:
 
         return dict(record)
 
-    async def recent_for_user(self, user_id: int, limit: int = 10) -> List[dict]:
-        sql = """
-            SELECT 
-                t.*,
-                sc.card_number as source_card_number,
-                dc.card_number as dest_card_number
-            FROM transactions t
-            JOIN cards sc ON t.source_card_id = sc.id 
-            LEFT JOIN cards dc ON t.dest_card_id = dc.id 
-            WHERE sc.user_id = $1 
-            OR dc.user_id = $1 
-            ORDER BY t.created_at DESC
-            LIMIT $2;
+    async def lock_cards_by_numbers(self, card_numbers: list[str]) -> dict[str, dict]:
+        """Locks every existing card in ``card_numbers`` in id order; returns them keyed by number."""
+        records = await self._fetch(LOCK_CARDS_BY_NUMBERS, sorted(set(card_numbers)))
+        return {r['card_number']: dict(r) for r in records}
+
+    async def create_transactions(
+            self,
+            rows: list[tuple[int, Optional[int], Decimal, Decimal, Optional[str]]],
+    ) -> List[dict]:
+        """
+        Inserts SUCCESS transactions given as (source_id, dest_id, amount, fee,
+        description) tuples in a single statement; results keep input order.
         """
-        records = await self.conn.fetch(sql, user_id, limit)
-        return [dict(record) for record in records]
+        if not rows:
+            return []
+        columns = [list(column) for column in zip(*rows)]
+        records = await self._fetch(CREATE_TRANSACTIONS, *columns)
+        return sorted((dict(r) for r in records), key=lambda r: r['id'])
 
-    async def fee_sum(
+    async def bank_transfer(
             self,
-            date_from: Optional[datetime] = None,
-            date_to: Optional[datetime] = None,
-            tx_id: Optional[int] = None,
-    ) -> Decimal:
-        base_sql = "SELECT COALESCE(SUM(fee), 0) FROM transactions WHERE status = 'SUCCESS'"
-        args = []
-        i = 1
+            source_number: str,
+            dest_number: str,
+            amount: Decimal,
+            user_id: int,
+            description: Optional[str],
+            fee_rate: Decimal,
+            fee_cap: Decimal,
+            daily_cap: Decimal,
+    ) -> dict:
+        """
+        Runs the whole transfer inside the bank_transfer() database function.
+        The returned dict has the transaction columns plus ``error_code``,
+        which is NULL on success.
+        """
+        record = await self._fetchrow(
+            BANK_TRANSFER,
+            source_number,
+            dest_number,
+            amount,
+            user_id,
+            description,
+            fee_rate,
+            fee_cap,
+            daily_cap
+        )
+        if record is None:
+            raise Exception("bank_transfer() returned no row.")
+        return dict(record)
 
-        if tx_id is not None:
-            base_sql += f" AND id = ${i}"
-            args.append(tx_id)
-            i += 1
+    async def get_idempotent_transaction(self, user_id: int, key: str) -> Optional[dict]:
+        """The transaction recorded under ``key`` for this user, plus the ``request_hash`` it was made with."""
+        record = await self._fetchrow(GET_IDEMPOTENT_TRANSACTION, user_id, key)
+        return dict(record) if record else None
 
-        if date_from:
-            base_sql += f" AND created_at >= ${i}"
-            args.append(date_from)
-            i += 1
+    async def record_idempotency_key(self, user_id: int, key: str, operation: str, request_hash: str,
+                                     transaction: dict):
+        await self._execute(RECORD_IDEMPOTENCY_KEY, user_id, key, operation, request_hash,
+                            transaction['id'], transaction['created_at'])
 
-        if date_to:
-            base_sql += f" AND created_at <= ${i}"
-            args.append(date_to)
-            i += 1
+    async def recent_for_user(self, user_id: int, limit: int = 10) -> List[dict]:
+        return await self.history_for_user(user_id, limit)
 
-        total = await self.conn.fetchval(base_sql, *args)
-        return Decimal(total or 0)
+    async def history_for_user(
+            self,
+            user_id: int,
+            limit: int,
+            before: Optional[tuple[datetime, int]] = None,
+    ) -> List[dict]:
+        """
+        Newest-first page of the user's transactions strictly older than the
+        (created_at, id) position in ``before``.
+
+        Every card of the user contributes two index range scans (outgoing on
+        source_card_id, incoming on dest_card_id) capped at ``limit`` rows, so
+        the cost of a page does not depend on how deep into history it is.
+        Transfers between two cards of the same user only come from the
+        outgoing side.
+        """
+        return [dict(record) for record in await self.history_records_for_user(user_id, limit, before)]
+
+    async def history_records_for_user(
+            self,
+            user_id: int,
+            limit: int,
+            before: Optional[tuple[datetime, int]] = None,
+    ) -> List[Record]:
+        """history_for_user without the dict copies, for handlers that encode the rows directly."""
+        before_created_at, before_id = before or HISTORY_START
+        return await self._fetch(HISTORY_FOR_USER, user_id, before_created_at, before_id, limit)
 
+    async def add_fee_bucket(self, day: date, source_card_id: int, fee: Decimal):
+        await self._execute(ADD_FEE_BUCKET, day, source_card_id, fee)
 
+    async def lock_fee_buckets(self, day: date, source_card_ids: list[int]):
+        """Locks the existing fee buckets of these cards for ``day`` in slot order."""
+        await self._execute(LOCK_FEE_BUCKETS, day, source_card_ids)
 
-    #------------------------------------------------------
+    async def add_fee_buckets(self, fees: list[tuple[date, int, Decimal]]):
+        """Adds (day, source_card_id, fee) entries with one row per bucket."""
+        buckets = defaultdict(lambda: [Decimal(0), 0])
+        for day, source_card_id, fee in fees:
+            bucket = buckets[(day, source_card_id % FEE_BUCKET_SLOTS)]
+            bucket[0] += fee
+            bucket[1] += 1
+        if buckets:
+            # ردیف‌ها به ترتیب (day, slot) درج و قفل می‌شوند، همان ترتیب _lock گروه، تا بن‌بست رخ ندهد
+            keys = sorted(buckets)
+            await self._execute(ADD_FEE_BUCKETS, [k[0] for k in keys], [k[1] for k in keys],
+                                [buckets[k][0] for k in keys], [buckets[k][1] for k in keys])
 
-    async def success_per_hour(self):
-        sql = open("app/db/queries/query_1_success_transactions_per_hour.sql").read()
-        return await self.conn.fetch(sql)
+    async def rebuild_fee_buckets(self) -> int:
+        """Recompute every fee_daily_buckets row from SUCCESS transactions."""
+        await self._execute(CLEAR_FEE_BUCKETS)
+        result = await self._execute(REBUILD_FEE_BUCKETS)
+        return int(result.split()[-1])
 
-    async def user_monthly(self):
-        sql = open("app/db/queries/query_2_user_monthly_transactions.sql").read()
-        return await self.conn.fetch(sql)
+    def export_for_cards(
+            self,
+            card_ids: list[int],
+            date_from: Optional[datetime] = None,
+            date_to: Optional[datetime] = None,
+            prefetch: int = 1000,
+    ) -> AsyncIterator:
+        """
+        Oldest-first statement rows touching any of ``card_ids`` with
+        date_from <= created_at <= date_to, read through a server-side
+        cursor ``prefetch`` rows at a time. Iterate inside a transaction.
+        """
+        return self._cursor(EXPORT_FOR_CARDS, card_ids, date_from or EARLIEST, date_to or LATEST,
+                            prefetch=prefetch)
+
+    async def fee_sum(
+            self,
+            date_from: Optional[datetime] = None,
+            date_to: Optional[datetime] = None,
+            tx_id: Optional[int] = None,
+    ) -> Decimal:
+        """
+        Sum of SUCCESS fees with date_from <= created_at <= date_to. Whole
+        UTC days come from fee_daily_prefix/fee_daily_buckets; only the
+        partial days at the two edges are summed from transactions.
+        """
+        if tx_id is not None:
+            flags = (bool(date_from), bool(date_to))
+            args = [v for v, on in zip((date_from, date_to), flags) if on]
+            total = await self._fetchval(FEE_SUM_BY_ID[flags], tx_id, *args)
+            return Decimal(total or 0)
+
+        days, head, tail = _split_range(date_from, date_to)
+        total = Decimal(0)
+        if days is not None:
+            total += Decimal(await self._fetchval(FEE_SUM_DAYS, *days))
+        for edge in (head, tail):
+            if edge is not None:
+                total += Decimal(await self._fetchval(FEE_SUM_BETWEEN, *edge))
+        return total
+
+    async def fee_series(
+            self,
+            granularity: str,
+            date_from: Optional[datetime] = None,
+            date_to: Optional[datetime] = None,
+    ) -> List[dict]:
+        """
+        SUCCESS fees per UTC hour, day or month as {bucket_start, total_revenue}.
+        Hourly series read transactions directly and need both bounds; day
+        and month series use the buckets plus the two partial edge days.
+        """
+        if granularity == "hour":
+            if date_from is None or date_to is None:
+                raise ValueError("Hourly series need both start_date and end_date.")
+            lo, hi = _as_utc(date_from), _as_utc(date_to) + timedelta(microseconds=1)
+            if hi - lo > MAX_HOURLY_SERIES_RANGE:
+                raise ValueError(f"Hourly series cover at most {MAX_HOURLY_SERIES_RANGE.days} days.")
+            records = await self._fetch(FEE_SERIES_BETWEEN, lo, hi, granularity)
+            return [dict(r) for r in records]
 
-    async def card_monthly(self):
-        sql = open("app/db/queries/query_3_card_monthly_transactions.sql").read()
-        return await self.conn.fetch(sql)
\ No newline at end of file
+        days, head, tail = _split_range(date_from, date_to)
+        series = defaultdict(Decimal)
+        if days is not None:
+            for r in await self._fetch(FEE_SERIES_DAYS, *days, granularity):
+                series[r['bucket_start']] += r['total_revenue']
+        for edge in (head, tail):
+            if edge is not None:
+                for r in await self._fetch(FEE_SERIES_BETWEEN, *edge, granularity):
+                    series[r['bucket_start']] += r['total_revenue']
+        return [{"bucket_start": k, "total_revenue": series[k]} for k in sorted(series)]
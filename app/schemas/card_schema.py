@@ -2,6 +2,7 @@
 
 from decimal import Decimal
 from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel
 
 
@@ -17,3 +18,12 @@ class CardOut(BaseModel):
     model_config = {
         "from_attributes": True
     }
+
+
+class CardBalanceOut(BaseModel):
+    """موجودی کارت در یک لحظه، از روی دفتر کل."""
+    card_number: str
+    at: datetime
+    balance: Decimal
+    # آخرین checkpoint استفاده‌شده؛ None یعنی همه‌ی سطرهای کارت جمع زده شده‌اند
+    checkpoint_at: Optional[datetime] = None
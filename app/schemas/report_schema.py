@@ -0,0 +1,42 @@
+# app/schemas/report_schema.py
+
+from decimal import Decimal
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel
+
+
+class HourlySuccessOut(BaseModel):
+    """تعداد تراکنش‌های موفق در هر ساعت (UTC)."""
+    hour_utc: datetime
+    success_count: int
+
+
+class UserMonthlyOut(BaseModel):
+    """جمع برداشت‌های موفق کاربر در هر ماه (UTC)."""
+    user_id: int
+    full_name: str
+    month_utc: datetime
+    total_amount: Decimal
+    tx_count: int
+
+
+class CardMonthlyOut(BaseModel):
+    """جمع برداشت‌های موفق هر کارت کاربر در هر ماه (UTC)."""
+    card_id: int
+    card_number: str
+    month_utc: datetime
+    total_amount: Decimal
+    tx_count: int
+
+
+class UserMonthlyPage(BaseModel):
+    """یک صفحه از ماه‌های کاربر، جدیدترین اول."""
+    items: list[UserMonthlyOut]
+    next_cursor: Optional[str] = None
+
+
+class CardMonthlyPage(BaseModel):
+    """یک صفحه از ماه‌های کارت‌های کاربر، جدیدترین اول."""
+    items: list[CardMonthlyOut]
+    next_cursor: Optional[str] = None
@@ -1,7 +1,9 @@
 from pydantic import BaseModel, constr, Field, condecimal
 from decimal import Decimal
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
+
+from app.core.config import settings
 
 PositiveDecimal = condecimal(gt=0, decimal_places=2)
 
@@ -29,16 +31,51 @@ class TransactionOut(BaseModel):
     class Config:
         from_attributes = True
 
+class TransferBatchIn(BaseModel):
+    items: list[TransferIn] = Field(..., min_length=1, max_length=settings.BATCH_TRANSFER_MAX_ITEMS)
+    # atomic: همه یا هیچ؛ per_item: هر آیتم نتیجه‌ی جداگانه دارد
+    mode: Literal["atomic", "per_item"] = "atomic"
+
+class TransferBatchItemOut(BaseModel):
+    index: int
+    status: str
+    transaction: Optional[TransactionOut] = None
+    error_code: Optional[str] = None
+    error: Optional[str] = None
+
+class TransferBatchOut(BaseModel):
+    mode: str
+    succeeded: int
+    failed: int
+    results: list[TransferBatchItemOut]
+
+class TransactionPage(BaseModel):
+    items: list[TransactionOut]
+    next_cursor: Optional[str] = None
+
 class RevenueFilters(BaseModel):
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
     transaction_id: Optional[int] = None
+    # با مقداردهی، سری زمانی کارمزد (UTC) هم برگردانده می‌شود
+    granularity: Optional[Literal["hour", "day", "month"]] = None
 
     class Config:
         from_attributes = True
 
+class RevenuePoint(BaseModel):
+    bucket_start: datetime
+    total_revenue: Decimal
+
+    class Config:
+        json_encoders = {
+            Decimal: lambda v: float(v)
+        }
+
 class TotalRevenueResponse(BaseModel):
     total_revenue: Decimal
+    granularity: Optional[str] = None
+    series: Optional[list[RevenuePoint]] = None
 
     class Config:
         from_attributes = True
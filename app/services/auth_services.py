@@ -2,13 +2,14 @@ from datetime import timedelta
 from typing import Optional
 from app.repositories.user_repo import UserRepository
 from app.schemas.auth_schema import UserCreate
-from app.core.security import hash_password, verify_password, create_access_token
+from app.core.security import PasswordHasher, password_hasher, create_access_token
 from app.core.config import settings
 from app.core.exceptions import UserAlreadyExistsException
 
 class AuthService:
-    def __init__(self, user_repo: UserRepository):
+    def __init__(self, user_repo: UserRepository, hasher: PasswordHasher = password_hasher):
         self.user_repo = user_repo
+        self.hasher = hasher
 
     async def register_user(self, user_in: UserCreate) -> dict:
         existing_phone = await self.user_repo.get_by_phone(user_in.phone_number)
@@ -18,7 +19,7 @@ class AuthService:
         if existing_national:
             raise UserAlreadyExistsException("national code")
 
-        hashed_password = hash_password(user_in.password)
+        hashed_password = await self.hasher.hash(user_in.password)
         user_data = {
             "national_code": user_in.national_code,
             "full_name": user_in.full_name,
@@ -32,7 +33,7 @@ class AuthService:
         user = await self.user_repo.get_by_phone(phone_number)
         if not user:
             return None
-        if not verify_password(password, user.get('hashed_password', '')):
+        if not await self.hasher.verify(password, user.get('hashed_password', '')):
             return None
         return user
 
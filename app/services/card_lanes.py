@@ -0,0 +1,148 @@
+# app/services/card_lanes.py
+
+import asyncio
+import contextvars
+import logging
+import time
+import zlib
+from collections import deque
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterable
+
+from asyncpg import Connection
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.exceptions import CardLaneBusyException
+from app.db.session import acquire_connection
+
+Operation = Callable[[Connection], Awaitable[Any]]
+
+
+@dataclass
+class _Job:
+    shards: list[int]
+    operation: Operation
+    future: asyncio.Future
+    queued_at: float = field(default_factory=time.perf_counter)
+
+
+class CardLanes:
+    """
+    Serializes money movements per card inside this process.
+
+    Card numbers are hashed onto ``shards`` lanes, each drained by one
+    worker task. A job is queued on the lowest lane among its cards and,
+    when its turn comes, also takes the locks of its other lanes in
+    ascending order, so two jobs touching the same card never run at once
+    and lanes cannot deadlock each other. A worker takes up to
+    ``batch_size`` queued jobs and runs them back-to-back on one pool
+    connection; callers only wait on a future, so requests queued behind a
+    hot card hold no connection and at most ``shards`` connections are used
+    by the lanes. More than ``max_pending`` queued or running jobs get a
+    CardLaneBusyException (503).
+    """
+
+    def __init__(self, shards: int = 8, batch_size: int = 32, max_pending: int = 5000):
+        if shards < 1 or batch_size < 1:
+            raise ValueError("shards and batch_size must be positive")
+        self.shards = shards
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.pending = 0
+        self._queues: list[asyncio.Queue] = []
+        self._locks: list[asyncio.Lock] = []
+        self._workers: list[asyncio.Task] = []
+
+    def shard_of(self, card_number: str) -> int:
+        # crc32 بر خلاف hash() در همه‌ی پردازه‌ها ثابت است
+        return zlib.crc32(card_number.encode()) % self.shards
+
+    def _start(self):
+        if self._workers:
+            return
+        self._queues = [asyncio.Queue() for _ in range(self.shards)]
+        self._locks = [asyncio.Lock() for _ in range(self.shards)]
+        # context خالی: worker ها نباید contextvar های درخواستی را که راهشان انداخته به ارث ببرند (مثل acquire_waits)
+        self._workers = [asyncio.create_task(self._work(shard), name=f"card-lane-{shard}",
+                                             context=contextvars.Context())
+                         for shard in range(self.shards)]
+
+    async def run(self, card_numbers: Iterable[str], operation: Operation):
+        """Runs ``operation(conn)`` once no other job on these cards is running and returns its result."""
+        self._start()
+        if self.pending >= self.max_pending:
+            metrics.CARD_LANE_REJECTED.inc()
+            raise CardLaneBusyException()
+        shards = sorted({self.shard_of(number) for number in card_numbers})
+        job = _Job(shards, operation, asyncio.get_running_loop().create_future())
+        self.pending += 1
+        self._queues[shards[0]].put_nowait(job)
+        # اگر درخواست لغو شود کاری که شروع شده تا آخر اجرا می‌شود؛ فقط منتظرش نمی‌مانیم
+        return await job.future
+
+    async def _work(self, shard: int):
+        queue = self._queues[shard]
+        while True:
+            job = await queue.get()
+            if job is None:
+                return
+            batch = deque([job])
+            while len(batch) < self.batch_size and not queue.empty():
+                job = queue.get_nowait()
+                if job is None:
+                    queue.put_nowait(None)
+                    break
+                batch.append(job)
+            await self._run_batch(batch)
+
+    async def _run_batch(self, batch: deque):
+        try:
+            while batch:
+                async with acquire_connection() as conn:
+                    # اتصالی که وسط دسته قطع شود کنار گذاشته می‌شود و بقیه روی اتصال تازه اجرا می‌شوند
+                    while batch and not conn.is_closed():
+                        await self._run_job(batch.popleft(), conn)
+        except Exception as e:
+            logging.error(f"Card lane could not get a connection: {e}")
+            while batch:
+                job = batch.popleft()
+                if not job.future.done():
+                    job.future.set_exception(e)
+                self.pending -= 1
+
+    async def _run_job(self, job: _Job, conn: Connection):
+        try:
+            if job.future.cancelled():
+                return
+            async with AsyncExitStack() as stack:
+                for shard in job.shards:
+                    await stack.enter_async_context(self._locks[shard])
+                metrics.CARD_LANE_WAIT_SECONDS.observe(time.perf_counter() - job.queued_at)
+                result = await job.operation(conn)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self.pending -= 1
+
+    async def close(self):
+        """Lets every queued job finish, then stops the workers."""
+        if not self._workers:
+            return
+        for queue in self._queues:
+            queue.put_nowait(None)
+        await asyncio.gather(*self._workers)
+        self._workers = []
+
+
+card_lanes = CardLanes(
+    shards=settings.CARD_LANE_SHARDS,
+    batch_size=settings.CARD_LANE_BATCH_SIZE,
+    max_pending=settings.CARD_LANE_MAX_PENDING,
+)
+metrics.CARD_LANE_PENDING.set_function(lambda: card_lanes.pending)
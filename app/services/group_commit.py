@@ -0,0 +1,274 @@
+# app/services/group_commit.py
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncContextManager, Awaitable, Callable, Iterable
+
+from asyncpg import Connection
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.exceptions import CardLaneBusyException, TransferContentionException
+from app.db.session import acquire_connection
+from app.repositories.transaction_repo import TransactionRepository
+from app.services.transaction_service import RETRYABLE_ERRORS
+
+# operation(conn, grouped): grouped یعنی در savepoint تراکنش مشترک گروه اجرا می‌شود و نباید خودش دوباره تلاش کند
+Operation = Callable[[Connection, bool], Awaitable[Any]]
+
+
+@dataclass
+class _Job:
+    cards: frozenset[str]
+    operation: Operation
+    future: asyncio.Future
+    queued_at: float = field(default_factory=time.perf_counter)
+
+
+class GroupCommit:
+    """
+    Commits concurrent money movements on disjoint cards together.
+
+    Jobs wait in one in-process queue. When more than one job is queued the
+    worker keeps collecting, counted from the oldest, for up to ``window``
+    seconds or ``max_items`` jobs (like PostgreSQL's commit_delay, a lone
+    job is not delayed); a job sharing a card with an earlier queued job
+    waits, in order, for a later group, and so does a job on a card of a
+    group still committing. Up to ``concurrency`` groups commit at once, each
+    on its own connection. A group of one job runs exactly like the direct
+    path. A larger group is one database transaction: its cards are locked
+    in id order and then today's fee buckets in slot order, so other groups
+    and direct transfers (cards first, then one bucket) cannot deadlock
+    with it. Each job then runs in a savepoint of its own,
+    so a rejected job is rolled back alone, and callers get their result or
+    error, and outcome metrics are counted, only once the shared COMMIT has
+    returned. A group that fails before COMMIT (deadlock, statement timeout,
+    lost connection) has written nothing, so its jobs are run again one by
+    one like the direct path, with its retries; a failed COMMIT may or may
+    not have applied, so its jobs get a TransferContentionException (503)
+    instead, and so does every job still unanswered when a commit is
+    cancelled (e.g. at shutdown). More than ``max_pending`` queued or
+    running jobs get a CardLaneBusyException (503).
+    """
+
+    def __init__(self, window: float = 0.002, max_items: int = 64, concurrency: int = 2, max_pending: int = 5000,
+                 acquire: Callable[[], AsyncContextManager[Connection]] = acquire_connection):
+        if window < 0 or max_items < 1 or concurrency < 1:
+            raise ValueError("window must not be negative and max_items and concurrency must be positive")
+        self.window = window
+        self.max_items = max_items
+        self.max_pending = max_pending
+        self.pending = 0
+        self._acquire = acquire
+        self._queue: deque[_Job] = deque()
+        # کارت‌های گروه‌هایی که هنوز commit نشده‌اند
+        self._busy: set[str] = set()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._committing: set[asyncio.Task] = set()
+        self._arrived = asyncio.Event()
+        self._full = asyncio.Event()
+        self._closing = False
+        self._worker: asyncio.Task | None = None
+
+    def _start(self):
+        if self._worker is not None:
+            return
+        # context خالی: worker نباید contextvar های درخواستی را که راهش انداخته به ارث ببرد (مثل acquire_waits)
+        self._worker = asyncio.create_task(self._work(), name="group-commit", context=contextvars.Context())
+
+    async def run(self, card_numbers: Iterable[str], operation: Operation):
+        """
+        Runs ``operation(conn, grouped)`` in the next group that can take
+        these cards and returns its result. ``grouped`` is true inside a
+        shared transaction: the operation must not retry there, a deadlock
+        or serialization failure fails the group instead.
+        """
+        self._start()
+        if self.pending >= self.max_pending:
+            metrics.GROUP_COMMIT_REJECTED.inc()
+            raise CardLaneBusyException()
+        job = _Job(frozenset(card_numbers), operation, asyncio.get_running_loop().create_future())
+        self.pending += 1
+        self._queue.append(job)
+        self._arrived.set()
+        if len(self._queue) >= self.max_items:
+            self._full.set()
+        # اگر درخواست لغو شود کاری که در گروه رفته تا آخر اجرا می‌شود؛ فقط منتظرش نمی‌مانیم
+        return await job.future
+
+    async def _work(self):
+        while self._queue or not self._closing:
+            if not self._queue:
+                self._arrived.clear()
+                await self._arrived.wait()
+                continue
+            delay = self._queue[0].queued_at + self.window - time.perf_counter()
+            if delay > 0 and 1 < len(self._queue) < self.max_items and not self._closing:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            await self._slots.acquire()
+            group = self._take()
+            if not group:
+                self._slots.release()
+                if self._queue:
+                    # همه‌ی کارهای صف روی کارت گروه‌های در حال commit اند؛ پایان یکی از آن‌ها دوباره بیدارمان می‌کند
+                    self._arrived.clear()
+                    await self._arrived.wait()
+                continue
+            task = asyncio.create_task(self._commit(group))
+            self._committing.add(task)
+            task.add_done_callback(self._committing.discard)
+        if self._committing:
+            await asyncio.wait(self._committing)
+
+    def _take(self) -> list[_Job]:
+        group, claimed, waiting = [], set(self._busy), deque()
+        while self._queue:
+            job = self._queue.popleft()
+            if job.future.cancelled():
+                self.pending -= 1
+                continue
+            if len(group) < self.max_items and claimed.isdisjoint(job.cards):
+                group.append(job)
+            else:
+                waiting.append(job)
+            # کارت‌های کار جامانده هم گرفته حساب می‌شوند تا کارهای بعدی همان کارت از آن جلو نزنند
+            claimed.update(job.cards)
+        self._queue = waiting
+        for job in group:
+            self._busy.update(job.cards)
+        return group
+
+    async def _commit(self, group: list[_Job]):
+        started = time.perf_counter()
+        for job in group:
+            metrics.GROUP_COMMIT_WAIT_SECONDS.observe(started - job.queued_at)
+        metrics.GROUP_COMMIT_SIZE.observe(len(group))
+        outcomes = []
+        try:
+            if len(group) == 1:
+                outcomes = await self._run_alone(group)
+            else:
+                outcomes = await self._run_together(group)
+        except BaseException as e:
+            # لغو (مثلاً هنگام خاموش شدن) یا خطای پیش‌بینی‌نشده؛ فراخوانی که جوابی نگرفته نباید تا ابد منتظر بماند
+            outcomes = [self._unavailable(e) for _ in group]
+            raise
+        finally:
+            self.pending -= len(group)
+            for job in group:
+                self._busy.difference_update(job.cards)
+            self._slots.release()
+            self._arrived.set()
+            self._resolve(group, outcomes)
+
+    async def _run_alone(self, group: list[_Job]) -> list:
+        """Runs every job in a transaction of its own, exactly like the direct path (retries included)."""
+        outcomes = []
+        try:
+            async with self._acquire() as conn:
+                for job in group:
+                    outcomes.append(await self._run_job(job, conn, grouped=False))
+                    # commit شده؛ اگر اجرای کارهای بعدی لغو شود این نتیجه نباید با خطا جایگزین شود
+                    self._resolve([job], outcomes[-1:])
+        except Exception as e:
+            # اتصالی گرفته نشد؛ کارهای اجرانشده مثل مسیر مستقیم 503 می‌گیرند
+            logging.error(f"Could not run {len(group) - len(outcomes)} money movements: {e}")
+            outcomes += [self._unavailable(e) for _ in group[len(outcomes):]]
+        return outcomes
+
+    async def _run_together(self, group: list[_Job]) -> list:
+        outcomes, counters = [], []
+        try:
+            async with self._acquire() as conn:
+                transaction = conn.transaction()
+                await transaction.start()
+                try:
+                    await self._lock(conn, group)
+                    for job in group:
+                        with metrics.deferred_counts() as job_counters:
+                            outcomes.append(await self._run_job(job, conn))
+                        counters += job_counters
+                except BaseException:
+                    await transaction.rollback()
+                    raise
+                try:
+                    await transaction.commit()
+                except Exception as e:
+                    # معلوم نیست COMMIT انجام شد یا نه؛ اجرای دوباره ممکن است پولی را دو بار جابه‌جا کند
+                    logging.error(f"COMMIT of a group of {len(group)} money movements failed: {e}")
+                    return [self._unavailable(e) for _ in group]
+        except Exception as e:
+            # گروه پیش از COMMIT rollback شد (deadlock، statement timeout، قفل‌ها، اتصال)؛ چیزی ثبت نشده و
+            # هر کار جدا با تلاش‌های دوباره‌ی مسیر مستقیم اجرا می‌شود
+            logging.warning(f"Group of {len(group)} money movements rolled back, running them one by one: {e}")
+            metrics.GROUP_COMMIT_FALLBACKS.inc()
+            return await self._run_alone(group)
+        # نتیجه‌ها فقط حالا که COMMIT برگشته شمرده می‌شوند
+        for counter in counters:
+            counter.inc()
+        return outcomes
+
+    @staticmethod
+    def _unavailable(cause: Exception) -> Exception:
+        error = TransferContentionException()
+        error.__cause__ = cause
+        return error
+
+    @staticmethod
+    def _resolve(group: list[_Job], outcomes: list):
+        """Hands each job its outcome; futures already resolved (or cancelled by their caller) are skipped."""
+        for job, outcome in zip(group, outcomes):
+            if job.future.done():
+                continue
+            if isinstance(outcome, Exception):
+                job.future.set_exception(outcome)
+            else:
+                job.future.set_result(outcome[0])
+
+    async def _lock(self, conn: Connection, group: list[_Job]):
+        tx_repo = TransactionRepository(conn)
+        cards = await tx_repo.lock_cards_by_numbers([number for job in group for number in job.cards])
+        await tx_repo.lock_fee_buckets(datetime.now(timezone.utc).date(), [card['id'] for card in cards.values()])
+
+    @staticmethod
+    async def _run_job(job: _Job, conn: Connection, grouped: bool = True):
+        # نتیجه در tuple تا نتیجه‌ای که خودش Exception است با خطا اشتباه نشود
+        try:
+            async with (conn.transaction() if grouped else nullcontext()):
+                return (await job.operation(conn, grouped),)
+        except Exception as e:
+            # خواب backoff داخل گروه قفل همه‌ی کارت‌های گروه را نگه می‌داشت؛ گروه rollback و کارها جدا
+            # (با تلاش‌های دوباره‌ی مسیر مستقیم) اجرا می‌شوند
+            if grouped and isinstance(e, RETRYABLE_ERRORS):
+                raise
+            return e
+
+    async def close(self):
+        """Lets every queued job finish, then stops the worker."""
+        if self._worker is None:
+            return
+        self._closing = True
+        self._arrived.set()
+        self._full.set()
+        await self._worker
+        self._worker = None
+        self._closing = False
+
+
+group_commit = GroupCommit(
+    window=settings.GROUP_COMMIT_WINDOW_SECONDS,
+    max_items=settings.GROUP_COMMIT_MAX_ITEMS,
+    concurrency=settings.GROUP_COMMIT_CONCURRENCY,
+    max_pending=settings.GROUP_COMMIT_MAX_PENDING,
+)
+metrics.GROUP_COMMIT_PENDING.set_function(lambda: group_commit.pending)
@@ -0,0 +1,87 @@
+# app/services/idempotency.py
+
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Awaitable, Callable
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+
+class IdempotencyConflict(Exception): pass
+
+
+@dataclass(frozen=True)
+class IdempotentRequest:
+    user_id: int
+    key: str
+    operation: str
+    fingerprint: str
+
+
+def _normalized(value):
+    if isinstance(value, (Decimal, int, float, str)):
+        try:
+            # 1000 و 1000.00 یک درخواست‌اند
+            return str(Decimal(str(value)).normalize())
+        except Exception:
+            return str(value)
+    return value
+
+
+def idempotent_request(user_id: int, key: str, operation: str, **fields) -> IdempotentRequest:
+    """Binds ``key`` to a hash of the operation and its fields; the same key with other fields is a conflict."""
+    payload = json.dumps([operation, {name: _normalized(value) for name, value in sorted(fields.items())}])
+    return IdempotentRequest(user_id, key, operation, hashlib.sha256(payload.encode()).hexdigest())
+
+
+class IdempotencyGate:
+    """
+    In-process front of the idempotency_keys table.
+
+    Completed requests are kept in a bounded LRU, so a retry usually never
+    reaches the database. A duplicate that arrives while the first attempt
+    is still running waits for it instead of queueing for the same card
+    locks; if that attempt fails or is cancelled nothing was recorded, and
+    one of the waiters runs the request itself. Each worker process has its
+    own gate; the table stays the source of truth.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._completed = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._in_flight: dict[tuple[int, str], asyncio.Event] = {}
+
+    def _replay(self, request: IdempotentRequest, completed: tuple[str, dict]) -> dict:
+        fingerprint, tx_record = completed
+        if fingerprint != request.fingerprint:
+            raise IdempotencyConflict("Idempotency-Key was already used for a different request.")
+        return tx_record
+
+    async def run(self, request: IdempotentRequest, execute: Callable[[], Awaitable[dict]]) -> dict:
+        cache_key = (request.user_id, request.key)
+        while True:
+            completed = self._completed.get(cache_key)
+            if completed is not None:
+                return self._replay(request, completed)
+            running = self._in_flight.get(cache_key)
+            if running is None:
+                break
+            await running.wait()
+
+        done = self._in_flight[cache_key] = asyncio.Event()
+        try:
+            tx_record = await execute()
+            self._completed.set(cache_key, (request.fingerprint, tx_record))
+            return tx_record
+        finally:
+            del self._in_flight[cache_key]
+            done.set()
+
+
+idempotency_gate = IdempotencyGate(
+    maxsize=settings.IDEMPOTENCY_CACHE_SIZE,
+    ttl=settings.IDEMPOTENCY_CACHE_TTL_SECONDS,
+)
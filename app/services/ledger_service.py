@@ -0,0 +1,75 @@
+# app/services/ledger_service.py
+
+import asyncio
+from asyncpg import Connection, LockNotAvailableError
+from app.repositories.ledger_repo import LedgerRepository
+from app.services.report_service import STABLE_ID_LOCK_ATTEMPTS, STABLE_ID_LOCK_RETRY_SECONDS, STABLE_ID_LOCK_TIMEOUT_MS
+
+
+LEDGER_CHUNK_SIZE = 1_000_000
+# بیشترین سطری که پرس‌وجوی موجودی در یک نقطه‌ی زمانی بعد از checkpoint می‌خواند (به‌علاوه‌ی سطرهای بعد از آخرین اجرا)
+CHECKPOINT_EVERY_ENTRIES = 1000
+
+
+class LedgerService:
+    def __init__(self, conn: Connection, ledger_repo: LedgerRepository):
+        self.conn = conn
+        self.ledger_repo = ledger_repo
+
+    async def refresh_checkpoints(self, chunk_size: int = LEDGER_CHUNK_SIZE,
+                                  every: int = CHECKPOINT_EVERY_ENTRIES) -> tuple[int, int, int]:
+        """
+        Checkpoints every committed ledger entry up to the current max(id):
+        each card with new entries gets a checkpoint on its last one and on
+        every ``every``-th one, ``chunk_size`` entry ids per database
+        transaction. Returns (old watermark, new watermark, checkpoints).
+
+        As with ReportService.refresh_rollups, finding max(id) holds up
+        transfers for up to STABLE_ID_LOCK_TIMEOUT_MS per attempt; if every
+        attempt times out nothing is checkpointed and balance reads walk the
+        extra entries until a later run.
+        """
+        up_to_id = await self._stable_max_entry_id()
+
+        started_at, created = None, 0
+        while True:
+            async with self.conn.transaction():
+                # قفل ردیف watermark دو اجرای هم‌زمان را پشت سر هم می‌اندازد
+                last_id = await self.ledger_repo.lock_watermark()
+                if started_at is None:
+                    started_at = last_id
+                if last_id >= up_to_id:
+                    return started_at, max(last_id, up_to_id), created
+                chunk_end = min(last_id + chunk_size, up_to_id)
+                created += await self.ledger_repo.apply_checkpoints(last_id, chunk_end, every)
+
+    async def _stable_max_entry_id(self) -> int:
+        for attempt in range(STABLE_ID_LOCK_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(STABLE_ID_LOCK_RETRY_SECONDS)
+            try:
+                async with self.conn.transaction():
+                    return await self.ledger_repo.stable_max_entry_id(STABLE_ID_LOCK_TIMEOUT_MS)
+            except LockNotAvailableError:
+                pass
+        # 0 از هر watermark کوچک‌تر است، پس refresh بدون تغییر برمی‌گردد
+        return 0
+
+    async def rebuild_checkpoints(self, chunk_size: int = LEDGER_CHUNK_SIZE,
+                                  every: int = CHECKPOINT_EVERY_ENTRIES) -> tuple[int, int, int]:
+        async with self.conn.transaction():
+            await self.ledger_repo.lock_watermark()
+            await self.ledger_repo.reset_checkpoints()
+        return await self.refresh_checkpoints(chunk_size, every)
+
+    async def rebuild_ledger(self, chunk_size: int = LEDGER_CHUNK_SIZE,
+                             every: int = CHECKPOINT_EVERY_ENTRIES) -> int:
+        """Rewrites the ledger from the transactions (seeded databases only) and checkpoints it."""
+        async with self.conn.transaction():
+            await self.ledger_repo.lock_watermark()
+            entries = await self.ledger_repo.rebuild_entries()
+        await self.refresh_checkpoints(chunk_size, every)
+        return entries
+
+    async def reconcile(self) -> list[dict]:
+        return await self.ledger_repo.mismatches()
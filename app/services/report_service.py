@@ -0,0 +1,92 @@
+# app/services/report_service.py
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from asyncpg import Connection, LockNotAvailableError
+from app.repositories.report_repo import ReportRepository
+
+
+ROLLUP_CHUNK_SIZE = 1_000_000
+# قفل SHARE برای max(id) پایدار انتقال‌های هم‌زمان را نگه می‌دارد؛ هر تلاش حداکثر این‌قدر منتظر می‌ماند و
+# بعد از آخرین تلاش ناموفق این اجرا چیزی roll up نمی‌کند
+STABLE_ID_LOCK_TIMEOUT_MS = 100
+STABLE_ID_LOCK_ATTEMPTS = 5
+STABLE_ID_LOCK_RETRY_SECONDS = 1.0
+# روزهای جوان‌تر از این هنوز ممکن است از تراکنش‌های طولانی کارمزد بگیرند و وارد prefix نمی‌شوند
+FEE_PREFIX_LAG_DAYS = 2
+
+
+class ReportService:
+    def __init__(self, conn: Connection, report_repo: ReportRepository):
+        self.conn = conn
+        self.report_repo = report_repo
+
+    async def refresh_rollups(self, chunk_size: int = ROLLUP_CHUNK_SIZE) -> tuple[int, int]:
+        """
+        Rolls every committed transaction up to the current max(id) into the
+        report tables, ``chunk_size`` ids per database transaction so a large
+        backlog neither holds locks nor builds one huge transaction.
+        Returns the (old, new) watermark.
+
+        Finding the current max(id) locks out transfers for up to
+        STABLE_ID_LOCK_TIMEOUT_MS per attempt. If every attempt times out,
+        the watermark stays put and the readers keep reading the newer rows
+        from transactions, which is correct but slower, until a later run.
+        """
+        up_to_id = await self._stable_max_transaction_id()
+
+        started_at = None
+        while True:
+            async with self.conn.transaction():
+                # قفل ردیف watermark اجرای هم‌زمان دو refresh را پشت سر هم می‌اندازد
+                last_id = await self.report_repo.lock_watermark()
+                if started_at is None:
+                    started_at = last_id
+                if last_id >= up_to_id:
+                    return started_at, max(last_id, up_to_id)
+                chunk_end = min(last_id + chunk_size, up_to_id)
+                await self.report_repo.apply_rollup(last_id, chunk_end)
+
+    async def _stable_max_transaction_id(self) -> int:
+        for attempt in range(STABLE_ID_LOCK_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(STABLE_ID_LOCK_RETRY_SECONDS)
+            try:
+                async with self.conn.transaction():
+                    return await self.report_repo.stable_max_transaction_id(STABLE_ID_LOCK_TIMEOUT_MS)
+            except LockNotAvailableError:
+                pass
+        # 0 از هر watermark کوچک‌تر است، پس refresh بدون تغییر برمی‌گردد
+        return 0
+
+    async def refresh_fee_prefix(self) -> int:
+        before_day = datetime.now(timezone.utc).date() - timedelta(days=FEE_PREFIX_LAG_DAYS - 1)
+        # DELETE + INSERT در یک تراکنش؛ خواننده‌ها تا commit نسخه‌ی قبلی را می‌بینند
+        async with self.conn.transaction():
+            return await self.report_repo.rebuild_fee_prefix(before_day)
+
+    async def _read_report(self, reader) -> list[dict]:
+        # watermark و rollupها باید از یک snapshot خوانده شوند
+        async with self.conn.transaction(isolation="repeatable_read", readonly=True):
+            after_id = await self.report_repo.watermark()
+            return await reader(after_id)
+
+    async def success_per_hour(self) -> list[dict]:
+        return await self._read_report(self.report_repo.success_per_hour)
+
+    async def user_monthly(self, user_id: int, limit: int,
+                           before: Optional[tuple[datetime, int]] = None) -> list[dict]:
+        return await self._read_report(
+            lambda after_id: self.report_repo.user_monthly(after_id, user_id, limit, before))
+
+    async def card_monthly(self, user_id: int, limit: int,
+                           before: Optional[tuple[datetime, int]] = None) -> list[dict]:
+        return await self._read_report(
+            lambda after_id: self.report_repo.card_monthly(after_id, user_id, limit, before))
+
+    async def rebuild_rollups(self, chunk_size: int = ROLLUP_CHUNK_SIZE) -> tuple[int, int]:
+        async with self.conn.transaction():
+            await self.report_repo.lock_watermark()
+            await self.report_repo.reset_rollups()
+        return await self.refresh_rollups(chunk_size)
@@ -1,11 +1,23 @@
 # app/services/transaction_service.py
 
+import asyncio
+import random
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
 from decimal import Decimal, ROUND_DOWN
-from datetime import datetime, timedelta, timezone
-from typing import Optional
-from asyncpg import Connection
+from datetime import date, datetime, timezone
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional, TypeVar
+from asyncpg import Connection, DeadlockDetectedError, SerializationError, UniqueViolationError
 from app.repositories.transaction_repo import TransactionRepository
 from app.repositories.card_repo import CardRepository
+from app.core import metrics
+from app.core.config import settings
+from app.core.exceptions import TransferContentionException
+from app.services.idempotency import IdempotencyConflict, IdempotentRequest, idempotency_gate, idempotent_request
+
+if TYPE_CHECKING:
+    from app.services.card_lanes import CardLanes
+    from app.services.group_commit import GroupCommit
 
 
 MIN_TX = Decimal("1000")
@@ -14,127 +26,437 @@ FEE_RATE = Decimal("0.10")
 FEE_CAP = Decimal("100000")
 CARD_DAILY_CAP = Decimal("50000000")
 
+# این خطاها فقط یعنی تراکنش هم‌زمان دیگری برنده شده؛ کل تراکنش دیتابیسی از نو اجرا می‌شود
+RETRYABLE_ERRORS = (DeadlockDetectedError, SerializationError)
+
+T = TypeVar("T")
+
 
 class InsufficientFunds(Exception): pass
 class BusinessRuleViolation(Exception): pass
 class ForbiddenOperation(Exception): pass
 
 
+# error_code های تابع bank_transfer و معادل آن‌ها در مسیر پایتونی
+PROCEDURE_ERRORS = {
+    "INVALID_AMOUNT": (BusinessRuleViolation, "Invalid amount format"),
+    "SAME_CARD": (BusinessRuleViolation, "Cannot transfer money to the same card."),
+    "CARD_NOT_FOUND": (BusinessRuleViolation, "Source or destination card not found."),
+    "FORBIDDEN": (ForbiddenOperation, "Source card does not belong to the current user."),
+    "CARD_INACTIVE": (BusinessRuleViolation, "One of cards is not active."),
+    "DAILY_LIMIT": (BusinessRuleViolation, "Card daily limit exceeded."),
+    "INSUFFICIENT_FUNDS": (InsufficientFunds, "Not enough balance to cover amount and fee."),
+}
+
+
+def reject(code: str, message: Optional[str] = None) -> Exception:
+    """Counts a rejection under its PROCEDURE_ERRORS code and returns the exception to raise."""
+    metrics.count(metrics.REJECTIONS.labels(code))
+    exc_class, default_message = PROCEDURE_ERRORS.get(code, (BusinessRuleViolation, code))
+    return exc_class(message or default_message)
+
+
+@contextmanager
+def counted(operation: str):
+    try:
+        yield
+    except (BusinessRuleViolation, InsufficientFunds, ForbiddenOperation):
+        metrics.count(metrics.TRANSFERS.labels(operation, "rejected"))
+        raise
+    except RETRYABLE_ERRORS:
+        # تلاش دوباره یا شکست نهایی را with_retries می‌شمارد
+        raise
+    except Exception:
+        metrics.count(metrics.TRANSFERS.labels(operation, "error"))
+        raise
+    metrics.count(metrics.TRANSFERS.labels(operation, "success"))
+
+
+async def with_retries(operation: str, attempt: Callable[[], Awaitable[T]]) -> T:
+    """
+    Runs ``attempt`` (one whole database transaction) again after a deadlock
+    or serialization failure, sleeping a random time below an exponentially
+    growing cap first. Once TRANSFER_RETRY_ATTEMPTS retries are used up the
+    caller gets a TransferContentionException (503).
+    """
+    for retry in range(settings.TRANSFER_RETRY_ATTEMPTS + 1):
+        try:
+            return await attempt()
+        except RETRYABLE_ERRORS as e:
+            if retry == settings.TRANSFER_RETRY_ATTEMPTS:
+                metrics.count(metrics.TRANSFERS.labels(operation, "contention"))
+                raise TransferContentionException() from e
+            metrics.TRANSFER_RETRIES.labels(operation, type(e).__name__).inc()
+            cap = min(settings.TRANSFER_RETRY_MAX_DELAY_SECONDS,
+                      settings.TRANSFER_RETRY_BASE_DELAY_SECONDS * 2 ** retry)
+            await asyncio.sleep(random.uniform(0, cap))
+
+
 class TransactionService:
-    def __init__(self, conn: Connection, tx_repo: TransactionRepository, card_repo: CardRepository):
+    def __init__(self, conn: Connection, tx_repo: TransactionRepository, card_repo: CardRepository,
+                 mode: str | None = None):
         self.conn = conn
         self.tx_repo = tx_repo
         self.card_repo = card_repo
+        self.mode = mode or settings.TRANSFER_MODE
+        self.lanes: Optional["CardLanes"] = None
+        self.group: Optional["GroupCommit"] = None
+
+    @classmethod
+    def on_lanes(cls, lanes: "CardLanes", mode: str | None = None) -> "TransactionService":
+        """
+        A service without a connection of its own: withdrawals and transfers
+        wait in the card lanes and run on a lane connection.
+        """
+        service = cls(None, None, None, mode=mode)
+        service.lanes = lanes
+        return service
+
+    @classmethod
+    def on_group_commit(cls, group: "GroupCommit", mode: str | None = None) -> "TransactionService":
+        """
+        A service without a connection of its own: withdrawals and transfers
+        run in a savepoint of the next group transaction.
+        """
+        service = cls(None, None, None, mode=mode)
+        service.group = group
+        return service
+
+    def _on(self, conn: Connection) -> "TransactionService":
+        return TransactionService(conn, TransactionRepository(conn), CardRepository(conn), mode=self.mode)
 
     def calc_fee(self, amount: Decimal) -> Decimal:
         fee = (amount * FEE_RATE).quantize(Decimal("1."), rounding=ROUND_DOWN)
         return min(fee, FEE_CAP)
 
-    async def withdraw_from_card(self, card_number: str, amount, description: str | None = None,
-                                 user_id: int | None = None):
+    async def _book_transaction(self, source_id: int, dest_id: Optional[int], amount: Decimal, fee: Decimal,
+                                description: Optional[str], day: date,
+                                request: Optional[IdempotentRequest] = None) -> dict:
+        # باید داخل همان تراکنش دیتابیسی و پس از قفل شدن کارت مبدا صدا زده شود
+        tx_record = await self.tx_repo.create_transaction(
+            source_id=source_id,
+            dest_id=dest_id,
+            amount=amount,
+            fee=fee,
+            status="SUCCESS",
+            description=description
+        )
+        if request is not None:
+            await self.tx_repo.record_idempotency_key(request.user_id, request.key, request.operation,
+                                                      request.fingerprint, tx_record)
+        await self.card_repo.add_daily_spend(source_id, day, amount)
+        # روز bucket از created_at خود ردیف گرفته می‌شود تا با لبه‌های fee_sum یکی باشد
+        await self.tx_repo.add_fee_bucket(tx_record['created_at'].astimezone(timezone.utc).date(), source_id, fee)
+        return tx_record
+
+    async def _book_transactions(self, rows: list[tuple[int, Optional[int], Decimal, Decimal, Optional[str]]],
+                                 day: date) -> list[dict]:
+        # معادل دسته‌ای _book_transaction؛ هر سطر (source_id, dest_id, amount, fee, description)
+        tx_records = await self.tx_repo.create_transactions(rows)
+        spent = defaultdict(Decimal)
+        for source_id, _, amount, _, _ in rows:
+            spent[source_id] += amount
+        await self.card_repo.add_daily_spends(day, spent)
+        await self.tx_repo.add_fee_buckets([
+            (tx['created_at'].astimezone(timezone.utc).date(), tx['source_card_id'], tx['fee']) for tx in tx_records
+        ])
+        return tx_records
+
+    async def _replayed(self, request: IdempotentRequest) -> Optional[dict]:
+        stored = await self.tx_repo.get_idempotent_transaction(request.user_id, request.key)
+        if stored is None:
+            return None
+        if stored.pop('request_hash') != request.fingerprint:
+            raise IdempotencyConflict("Idempotency-Key was already used for a different request.")
+        return stored
+
+    async def _at_most_once(self, operation: str, request: Optional[IdempotentRequest],
+                            execute: Callable[[], Awaitable[dict]], retries: bool = True) -> dict:
+        # تکرار درخواستی که قبلاً ثبت شده بدون قفل کردن کارت‌ها همان تراکنش را برمی‌گرداند
+        attempt = (lambda: with_retries(operation, execute)) if retries else execute
+        if request is None:
+            return await attempt()
+        replayed = await self._replayed(request)
+        if replayed is not None:
+            return replayed
         try:
-            amount = Decimal(str(amount))
-        except Exception:
-            raise BusinessRuleViolation("Invalid amount format")
-
-        if amount < MIN_TX or amount > MAX_TX:
-            raise BusinessRuleViolation(f"Amount must be between {MIN_TX} and {MAX_TX} Tomans.")
-
-        async with self.conn.transaction():
-            card = await self.tx_repo.get_card_by_number_for_update(card_number)
-
-            if card is None:
-                raise BusinessRuleViolation("Card not found")
-
-            if card['user_id'] != user_id:
-                raise ForbiddenOperation("Card does not belong to the current user.")
-
-            if not card['is_active']:
-                raise BusinessRuleViolation("Card not active")
-
-            now = datetime.now(timezone.utc)
-            start = datetime.combine(now.date(), datetime.min.time()).replace(tzinfo=timezone.utc)
-            end = start + timedelta(days=1)
-
-            daily_total = await self.card_repo.daily_total_for_card(card['id'], start, end)
-
-            if (daily_total + amount) > CARD_DAILY_CAP:
-                raise BusinessRuleViolation("Card daily limit exceeded.")
-
-            fee = self.calc_fee(amount)
-            total_debit = amount + fee
-
-            if Decimal(card['balance'] or 0) < total_debit:
-                raise InsufficientFunds("Not enough balance to cover amount and fee.")
-
-            tx_record = await self.tx_repo.create_transaction(
-                source_id=card['id'],
-                dest_id=None,
-                amount=amount,
-                fee=fee,
-                status="SUCCESS",
-                description=description
-            )
+            return await attempt()
+        except UniqueViolationError:
+            # نسخه‌ی هم‌زمان همین درخواست (مثلاً در worker دیگر) زودتر commit شد و این تراکنش rollback شده است
+            replayed = await self._replayed(request)
+            if replayed is None:
+                raise
+            return replayed
 
-            await self.card_repo.change_balance(card['id'], -total_debit)
-            return tx_record
+    async def withdraw_from_card(self, card_number: str, amount, description: str | None = None,
+                                 user_id: int | None = None, idempotency_key: str | None = None):
+        if idempotency_key is None:
+            return await self._withdraw(card_number, amount, description, user_id, None)
+        request = idempotent_request(user_id, idempotency_key, "withdraw",
+                                     card_number=card_number, amount=amount, description=description)
+        return await idempotency_gate.run(
+            request, lambda: self._withdraw(card_number, amount, description, user_id, request))
+
+    async def _withdraw(self, card_number: str, amount, description: str | None, user_id: int | None,
+                        request: Optional[IdempotentRequest], retries: bool = True):
+        if self.lanes is not None:
+            return await self.lanes.run(
+                (card_number,),
+                lambda conn: self._on(conn)._withdraw(card_number, amount, description, user_id, request))
+        if self.group is not None:
+            # داخل گروه _lock ترتیب قفل‌ها را تضمین کرده؛ خطای قابل تکرار کل گروه را به مسیر تکی برمی‌گرداند
+            return await self.group.run(
+                (card_number,),
+                lambda conn, grouped: self._on(conn)._withdraw(card_number, amount, description, user_id, request,
+                                                               retries=not grouped))
+        return await self._at_most_once(
+            "withdraw", request, lambda: self._withdraw_once(card_number, amount, description, user_id, request),
+            retries)
+
+    async def _withdraw_once(self, card_number: str, amount, description: str | None, user_id: int | None,
+                             request: Optional[IdempotentRequest]):
+        with counted("withdraw"):
+            try:
+                amount = Decimal(str(amount))
+            except Exception:
+                raise reject("INVALID_AMOUNT")
+
+            if amount < MIN_TX or amount > MAX_TX:
+                raise reject("INVALID_AMOUNT", f"Amount must be between {MIN_TX} and {MAX_TX} Tomans.")
+
+            async with self.conn.transaction():
+                card = await self.tx_repo.get_card_by_number_for_update(card_number)
+
+                if card is None:
+                    raise reject("CARD_NOT_FOUND", "Card not found")
+
+                if card['user_id'] != user_id:
+                    raise reject("FORBIDDEN", "Card does not belong to the current user.")
+
+                if not card['is_active']:
+                    raise reject("CARD_INACTIVE", "Card not active")
+
+                today = datetime.now(timezone.utc).date()
+                daily_total = await self.card_repo.daily_spend_for_card(card['id'], today)
+
+                if (daily_total + amount) > CARD_DAILY_CAP:
+                    raise reject("DAILY_LIMIT")
+
+                fee = self.calc_fee(amount)
+                total_debit = amount + fee
+
+                if Decimal(card['balance'] or 0) < total_debit:
+                    raise reject("INSUFFICIENT_FUNDS")
+
+                tx_record = await self._book_transaction(
+                    source_id=card['id'],
+                    dest_id=None,
+                    amount=amount,
+                    fee=fee,
+                    description=description,
+                    day=today,
+                    request=request
+                )
+
+                await self.card_repo.change_balance(card['id'], -total_debit)
+                return tx_record
 
     async def transfer(self, source_card_number: str, dest_card_number: str, amount, description: str | None = None,
-                       user_id: int | None = None):
-        try:
-            amount = Decimal(str(amount))
-        except Exception:
-            raise BusinessRuleViolation("Invalid amount format")
-
-        if amount < MIN_TX or amount > MAX_TX:
-            raise BusinessRuleViolation(f"Amount must be between {MIN_TX} and {MAX_TX} Tomans.")
-
-        if source_card_number == dest_card_number:
-            raise BusinessRuleViolation("Cannot transfer money to the same card.")
-
-        async with self.conn.transaction():
-            src_temp = await self.tx_repo.get_card_by_number_for_update(source_card_number)
-            dst_temp = await self.tx_repo.get_card_by_number_for_update(dest_card_number)
-
-            if not src_temp or not dst_temp:
-                raise BusinessRuleViolation("Source or destination card not found.")
-
-            locked_src, locked_dst = await self.tx_repo.get_cards_by_id_for_update(src_temp['id'], dst_temp['id'])
-
-            if locked_src['user_id'] != user_id:
-                raise ForbiddenOperation("Source card does not belong to the current user.")
-
-            if not locked_src['is_active'] or not locked_dst['is_active']:
-                raise BusinessRuleViolation("One of cards is not active.")
-
-            now = datetime.now(timezone.utc)
-            start = datetime.combine(now.date(), datetime.min.time()).replace(tzinfo=timezone.utc)
-            end = start + timedelta(days=1)
-
-            daily_total = await self.card_repo.daily_total_for_card(locked_src['id'], start, end)
-
-            if (daily_total + amount) > CARD_DAILY_CAP:
-                raise BusinessRuleViolation("Card daily limit exceeded.")
-
-            fee = self.calc_fee(amount)
-            total_debit = amount + fee
-
-            if Decimal(locked_src['balance'] or 0) < total_debit:
-                raise InsufficientFunds("Not enough balance to cover amount and fee.")
-
-            tx_record = await self.tx_repo.create_transaction(
-                source_id=locked_src['id'],
-                dest_id=locked_dst['id'],
-                amount=amount,
-                fee=fee,
-                status="SUCCESS",
-                description=description
+                       user_id: int | None = None, idempotency_key: str | None = None):
+        if idempotency_key is None:
+            return await self._transfer(source_card_number, dest_card_number, amount, description, user_id, None)
+        request = idempotent_request(user_id, idempotency_key, "transfer", source_card=source_card_number,
+                                     dest_card=dest_card_number, amount=amount, description=description)
+        return await idempotency_gate.run(
+            request,
+            lambda: self._transfer(source_card_number, dest_card_number, amount, description, user_id, request))
+
+    async def _transfer(self, source_card_number: str, dest_card_number: str, amount, description: str | None,
+                        user_id: int | None, request: Optional[IdempotentRequest], retries: bool = True):
+        if self.lanes is not None:
+            return await self.lanes.run(
+                (source_card_number, dest_card_number),
+                lambda conn: self._on(conn)._transfer(source_card_number, dest_card_number, amount, description,
+                                                      user_id, request))
+        if self.group is not None:
+            return await self.group.run(
+                (source_card_number, dest_card_number),
+                lambda conn, grouped: self._on(conn)._transfer(source_card_number, dest_card_number, amount,
+                                                               description, user_id, request, retries=not grouped))
+        return await self._at_most_once(
+            "transfer", request,
+            lambda: self._transfer_once(source_card_number, dest_card_number, amount, description, user_id, request),
+            retries)
+
+    async def _transfer_once(self, source_card_number: str, dest_card_number: str, amount, description: str | None,
+                             user_id: int | None, request: Optional[IdempotentRequest]):
+        with counted("transfer"):
+            try:
+                amount = Decimal(str(amount))
+            except Exception:
+                raise reject("INVALID_AMOUNT")
+
+            if amount < MIN_TX or amount > MAX_TX:
+                raise reject("INVALID_AMOUNT", f"Amount must be between {MIN_TX} and {MAX_TX} Tomans.")
+
+            if source_card_number == dest_card_number:
+                raise reject("SAME_CARD")
+
+            if self.mode == "procedure":
+                return await self._transfer_via_procedure(source_card_number, dest_card_number, amount,
+                                                          description, user_id, request)
+
+            async with self.conn.transaction():
+                locked_src, locked_dst = await self.tx_repo.lock_card_pair(source_card_number, dest_card_number)
+
+                if not locked_src or not locked_dst:
+                    raise reject("CARD_NOT_FOUND")
+
+                if locked_src['user_id'] != user_id:
+                    raise reject("FORBIDDEN")
+
+                if not locked_src['is_active'] or not locked_dst['is_active']:
+                    raise reject("CARD_INACTIVE")
+
+                today = datetime.now(timezone.utc).date()
+                daily_total = await self.card_repo.daily_spend_for_card(locked_src['id'], today)
+
+                if (daily_total + amount) > CARD_DAILY_CAP:
+                    raise reject("DAILY_LIMIT")
+
+                fee = self.calc_fee(amount)
+                total_debit = amount + fee
+
+                if Decimal(locked_src['balance'] or 0) < total_debit:
+                    raise reject("INSUFFICIENT_FUNDS")
+
+                tx_record = await self._book_transaction(
+                    source_id=locked_src['id'],
+                    dest_id=locked_dst['id'],
+                    amount=amount,
+                    fee=fee,
+                    description=description,
+                    day=today,
+                    request=request
+                )
+
+                await self.card_repo.change_balance(locked_src['id'], -total_debit)
+                await self.card_repo.change_balance(locked_dst['id'], amount)
+
+                return tx_record
+
+    async def transfer_batch(self, items: list[dict], user_id: int | None = None,
+                             atomic: bool = True) -> list[dict]:
+        """
+        Runs many transfers (dicts with source_card, dest_card, amount and
+        description) in one database transaction.
+
+        All involved cards are locked once in id order and the usual rules
+        are applied item by item against in-memory balances and daily
+        totals, so a later item sees the effect of earlier ones. With
+        ``atomic`` the first failing item aborts the whole batch; otherwise
+        failing items are reported and the rest are committed. Returns one
+        result per item in input order.
+        """
+        return await with_retries("batch", lambda: self._transfer_batch_once(items, user_id, atomic))
+
+    async def _transfer_batch_once(self, items: list[dict], user_id: int | None, atomic: bool) -> list[dict]:
+        with counted("batch"):
+            results: list[Optional[dict]] = [None] * len(items)
+
+            def fail(index: int, code: str, message: Optional[str] = None):
+                error = reject(code, message)
+                if atomic:
+                    raise type(error)(f"Item {index}: {error}")
+                results[index] = {"index": index, "status": "FAILED", "transaction": None,
+                                  "error_code": code, "error": str(error)}
+
+            pending = []
+            for index, item in enumerate(items):
+                try:
+                    amount = Decimal(str(item["amount"]))
+                except Exception:
+                    fail(index, "INVALID_AMOUNT")
+                    continue
+                if amount < MIN_TX or amount > MAX_TX:
+                    fail(index, "INVALID_AMOUNT", f"Amount must be between {MIN_TX} and {MAX_TX} Tomans.")
+                    continue
+                if item["source_card"] == item["dest_card"]:
+                    fail(index, "SAME_CARD")
+                    continue
+                pending.append((index, item["source_card"], item["dest_card"], amount, item.get("description")))
+
+            if not pending:
+                return results
+
+            async with self.conn.transaction():
+                cards = await self.tx_repo.lock_cards_by_numbers(
+                    [number for _, src, dst, _, _ in pending for number in (src, dst)])
+
+                today = datetime.now(timezone.utc).date()
+                spent = await self.card_repo.daily_spend_for_cards(
+                    sorted({c['id'] for c in cards.values() if c['user_id'] == user_id}), today)
+                balances = {c['id']: Decimal(c['balance'] or 0) for c in cards.values()}
+                deltas = defaultdict(Decimal)
+                booked_indexes, rows = [], []
+
+                for index, src_number, dst_number, amount, description in pending:
+                    src, dst = cards.get(src_number), cards.get(dst_number)
+                    if not src or not dst:
+                        fail(index, "CARD_NOT_FOUND")
+                        continue
+                    if src['user_id'] != user_id:
+                        fail(index, "FORBIDDEN")
+                        continue
+                    if not src['is_active'] or not dst['is_active']:
+                        fail(index, "CARD_INACTIVE")
+                        continue
+                    if spent[src['id']] + amount > CARD_DAILY_CAP:
+                        fail(index, "DAILY_LIMIT")
+                        continue
+                    fee = self.calc_fee(amount)
+                    if balances[src['id']] < amount + fee:
+                        fail(index, "INSUFFICIENT_FUNDS")
+                        continue
+
+                    spent[src['id']] += amount
+                    balances[src['id']] -= amount + fee
+                    balances[dst['id']] += amount
+                    deltas[src['id']] -= amount + fee
+                    deltas[dst['id']] += amount
+                    booked_indexes.append(index)
+                    rows.append((src['id'], dst['id'], amount, fee, description))
+
+                tx_records = await self._book_transactions(rows, today)
+                await self.card_repo.change_balances(deltas)
+
+            for index, tx_record in zip(booked_indexes, tx_records):
+                results[index] = {"index": index, "status": "SUCCESS", "transaction": tx_record,
+                                  "error_code": None, "error": None}
+            return results
+
+    async def _transfer_via_procedure(self, source_card_number: str, dest_card_number: str, amount: Decimal,
+                                      description: str | None, user_id: int | None,
+                                      request: Optional[IdempotentRequest] = None) -> dict:
+        # بدون کلید، خود فراخوانی تابع یک تراکنش است و رفت‌وبرگشت BEGIN/COMMIT لازم نیست
+        async with (self.conn.transaction() if request is not None else nullcontext()):
+            result = await self.tx_repo.bank_transfer(
+                source_card_number,
+                dest_card_number,
+                amount,
+                user_id,
+                description,
+                fee_rate=FEE_RATE,
+                fee_cap=FEE_CAP,
+                daily_cap=CARD_DAILY_CAP
             )
-
-            await self.card_repo.change_balance(locked_src['id'], -total_debit)
-            await self.card_repo.change_balance(locked_dst['id'], amount)
-
-            return tx_record
+            error_code = result.pop("error_code")
+            if error_code is not None:
+                raise reject(error_code)
+            if request is not None:
+                await self.tx_repo.record_idempotency_key(request.user_id, request.key, request.operation,
+                                                          request.fingerprint, result)
+        return result
 
     async def get_fee_income(
             self,
@@ -0,0 +1,85 @@
+# benchmarks/_common.py
+"""Helpers shared by the benchmark scripts."""
+import json
+import random
+import uuid
+from collections import Counter
+from typing import Iterable, Optional
+
+import asyncpg
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies: Iterable[float], elapsed: float, errors: Optional[Counter] = None) -> dict:
+    """Latencies are in seconds; the summary reports milliseconds."""
+    values = sorted(latencies)
+    errors = errors or Counter()
+    return {
+        "ops": len(values),
+        "errors": sum(errors.values()),
+        "errors_by_type": dict(errors),
+        "throughput_per_s": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round((values[-1] if values else 0.0) * 1000, 3),
+    }
+
+
+async def create_bench_user(conn: asyncpg.Connection, n_cards: int, balance: int = 10 ** 15,
+                            hashed_password: str = "x") -> tuple[int, list[dict]]:
+    """Creates a throwaway user owning ``n_cards`` well-funded cards."""
+    token = uuid.uuid4().hex
+    user_id = await conn.fetchval(
+        """
+        INSERT INTO users (national_code, full_name, phone_number, email, hashed_password, is_active)
+        VALUES ($1, $2, $3, $4, $5, TRUE)
+        RETURNING id;
+        """,
+        f"{random.randint(0, 10 ** 10 - 1):010d}",
+        f"Bench {token[:8]}",
+        f"07{random.randint(0, 10 ** 9 - 1):09d}",
+        f"bench-{token}@example.com",
+        hashed_password,
+    )
+    prefix = f"77{random.randint(0, 99):02d}{random.randint(0, 10 ** 6 - 1):06d}"
+    records = await conn.fetch(
+        """
+        INSERT INTO cards (user_id, card_number, cvv2, expire_date, balance, is_active)
+        SELECT $1, $2 || lpad(g::text, 16 - length($2), '0'), '123', '12/30', $3, TRUE
+        FROM generate_series(1, $4) g
+        RETURNING *;
+        """,
+        user_id,
+        prefix,
+        balance,
+        n_cards,
+    )
+    # موجودی اولیه در دفتر کل هم ثبت می‌شود تا reconcile کارت‌های bench را مغایر نبیند
+    await conn.execute(
+        """
+        INSERT INTO ledger_entries (transaction_id, card_id, entry_type, amount)
+        SELECT NULL, v.card_id, 'OPENING', v.amount
+        FROM unnest($1::int[]) c(id)
+        CROSS JOIN LATERAL (VALUES (c.id, $2::numeric), (NULL::integer, -$2::numeric)) v(card_id, amount);
+        """,
+        [r["id"] for r in records],
+        balance,
+    )
+    return user_id, [dict(r) for r in records]
+
+
+def dump(report: dict, output: Optional[str]):
+    text = json.dumps(report, indent=2, default=str)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,438 @@
+# benchmarks/explain_plans.py
+"""
+EXPLAIN regression harness for the SQL issued by app/repositories/*.
+
+Seeds a synthetic dataset, calls every public repository method through a
+recording connection, and runs EXPLAIN (ANALYZE, BUFFERS) for each captured
+statement. Exits non-zero when a plan falls back to a sequential scan of a
+relation that is not explicitly allow-listed below for that method.
+
+Everything (seed included) runs inside a single transaction that is rolled
+back at the end, so the target database is left as it was. Run it against
+a migrated scratch database:
+
+    python -m benchmarks.explain_plans --users 2000 --transactions 200000
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from fnmatch import fnmatchcase
+from typing import Any, Awaitable, Callable
+
+import asyncpg
+
+from app.core.config import settings
+from app.repositories.card_repo import CardRepository
+from app.repositories.ledger_repo import LedgerRepository
+from app.repositories.partition_repo import PartitionRepository
+from app.repositories.replication_repo import ReplicationRepository
+from app.repositories.report_repo import ReportRepository
+from app.repositories.transaction_repo import TransactionRepository
+from app.repositories.user_repo import UserRepository
+
+REPOSITORIES = (UserRepository, CardRepository, TransactionRepository, ReportRepository, PartitionRepository,
+                ReplicationRepository, LedgerRepository)
+
+# (method, relation) pairs where a sequential scan is the correct plan because
+# the method reads every row of that relation. A ``*`` matches the monthly
+# partitions of a table. A scan of any relation not listed for the method
+# still fails.
+ALLOW_SEQ_SCAN = {
+    ("CardRepository.rebuild_daily_spend", "transactions_*"): "full rebuild of card_daily_spend",
+    ("CardRepository.rebuild_daily_spend", "card_daily_spend"): "full rebuild of card_daily_spend",
+    ("TransactionRepository.rebuild_fee_buckets", "transactions_*"): "full rebuild of fee_daily_buckets",
+    ("TransactionRepository.rebuild_fee_buckets", "fee_daily_buckets"): "full rebuild of fee_daily_buckets",
+    ("TransactionRepository.fee_sum", "fee_daily_buckets"): "bucket rows of the days after the prefix",
+    ("TransactionRepository.fee_series", "fee_daily_buckets"): "one row per day of the requested range",
+    ("TransactionRepository.fee_series", "fee_daily_prefix"): "one row per day of the requested range",
+    ("ReportRepository.rebuild_fee_prefix", "fee_daily_buckets"): "full rebuild of fee_daily_prefix from the buckets",
+    ("ReportRepository.rebuild_fee_prefix", "fee_daily_prefix"): "full rebuild of fee_daily_prefix from the buckets",
+    ("ReportRepository.watermark", "rollup_watermark"): "single-row table",
+    ("ReportRepository.lock_watermark", "rollup_watermark"): "single-row table",
+    ("ReportRepository.apply_rollup", "transactions_*"): "aggregates a whole id range of transactions",
+    ("ReportRepository.apply_rollup", "cards"): "aggregates a whole id range of transactions",
+    ("ReportRepository.success_per_hour", "report_hourly_success"): "reads the whole rollup table",
+    ("PartitionRepository.list_partitions", "pg_*"): "small system catalogs",
+    ("PartitionRepository.default_rows", "transactions_default"): "counts the rows left outside every monthly partition",
+    ("LedgerRepository.watermark", "rollup_watermark"): "single-row table",
+    ("LedgerRepository.lock_watermark", "rollup_watermark"): "single-row table",
+    ("LedgerRepository.rebuild_entries", "transactions_*"): "full rebuild of ledger_entries from the transactions",
+    ("LedgerRepository.rebuild_entries", "cards"): "full rebuild of ledger_entries from the transactions",
+    ("LedgerRepository.mismatches", "cards"): "reconciles every card",
+}
+
+
+def allowed_seq_scan(name: str, relation: str):
+    """The allow-list reason for a seq scan of ``relation`` by ``name``, or None."""
+    for (method, pattern), reason in ALLOW_SEQ_SCAN.items():
+        if method == name and fnmatchcase(relation, pattern):
+            return reason
+    return None
+
+
+# utility statements (LOCK, TRUNCATE, ...) have no plan
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+EXPLAIN_PREFIX = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+
+
+@dataclass
+class Sample:
+    user_id: int
+    card_id: int
+    card_number: str
+    other_card_id: int
+    other_card_number: str
+    phone_number: str
+    national_code: str
+    rollup_watermark: int
+    ledger_watermark: int
+    today: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class RecordingConnection:
+    """Forwards to a real connection and remembers every statement it runs."""
+
+    def __init__(self, conn: asyncpg.Connection):
+        self._conn = conn
+        self.statements: list[tuple[str, tuple]] = []
+
+    def _record(self, sql: str, args: tuple):
+        self.statements.append((sql, args))
+
+    async def fetch(self, sql, *args, **kwargs):
+        self._record(sql, args)
+        return await self._conn.fetch(sql, *args, **kwargs)
+
+    async def fetchrow(self, sql, *args, **kwargs):
+        self._record(sql, args)
+        return await self._conn.fetchrow(sql, *args, **kwargs)
+
+    async def fetchval(self, sql, *args, **kwargs):
+        self._record(sql, args)
+        return await self._conn.fetchval(sql, *args, **kwargs)
+
+    async def execute(self, sql, *args, **kwargs):
+        self._record(sql, args)
+        return await self._conn.execute(sql, *args, **kwargs)
+
+    async def executemany(self, sql, args, **kwargs):
+        args = list(args)
+        if args:
+            self._record(sql, tuple(args[0]))
+        return await self._conn.executemany(sql, args, **kwargs)
+
+    def cursor(self, sql, *args, **kwargs):
+        self._record(sql, args)
+        return self._conn.cursor(sql, *args, **kwargs)
+
+    def transaction(self, **kwargs):
+        return self._conn.transaction(**kwargs)
+
+
+async def seed_dataset(conn: asyncpg.Connection, n_users: int, n_transactions: int) -> Sample:
+    user_ids = await conn.fetch(
+        """
+        INSERT INTO users (national_code, full_name, phone_number, email, hashed_password, is_active)
+        SELECT lpad((9000000000 + g)::text, 10, '0'),
+               'Explain User ' || g,
+               '08' || lpad(g::text, 9, '0'),
+               'explain' || g || '@example.com',
+               'x',
+               TRUE
+        FROM generate_series(1, $1) g
+        ON CONFLICT DO NOTHING
+        RETURNING id;
+        """,
+        n_users,
+    )
+    user_ids = [r["id"] for r in user_ids]
+    if not user_ids:
+        raise RuntimeError("Could not seed users (dataset already present?)")
+
+    card_ids = await conn.fetch(
+        """
+        INSERT INTO cards (user_id, card_number, cvv2, expire_date, balance, is_active)
+        SELECT u.id,
+               '9999' || lpad((u.id * 2 + k)::text, 12, '0'),
+               '123',
+               '12/30',
+               100000000,
+               TRUE
+        FROM unnest($1::int[]) AS u(id), generate_series(0, 1) k
+        ON CONFLICT DO NOTHING
+        RETURNING id;
+        """,
+        user_ids,
+    )
+    card_ids = [r["id"] for r in card_ids]
+
+    today = datetime.now(timezone.utc).date()
+    await PartitionRepository(conn).ensure_partitions(today - timedelta(days=181), today + timedelta(days=1))
+    await conn.execute(
+        """
+        INSERT INTO transactions (source_card_id, dest_card_id, amount, fee, status, description, created_at)
+        SELECT src, CASE WHEN random() < 0.1 THEN NULL ELSE dst END,
+               amount, LEAST(floor(amount * 0.10), 100000), status::transactionstatus,
+               'explain seed', now() - random() * interval '180 days'
+        FROM (
+            SELECT c[1 + floor(random() * n)::int] AS src,
+                   c[1 + floor(random() * n)::int] AS dst,
+                   (10000 + floor(random() * 490000))::numeric AS amount,
+                   CASE WHEN random() < 0.85 THEN 'SUCCESS'
+                        WHEN random() < 0.66 THEN 'FAILED'
+                        ELSE 'PENDING' END AS status
+            FROM generate_series(1, $2),
+                 (SELECT $1::int[] AS c, array_length($1::int[], 1) AS n) s
+        ) g;
+        """,
+        card_ids,
+        n_transactions,
+    )
+    await CardRepository(conn).rebuild_daily_spend()
+    await TransactionRepository(conn).rebuild_fee_buckets()
+    # همه به جز چند صد تراکنش آخر rollup می‌شوند تا دم گزارش‌ها اندازه‌ی واقعی داشته باشد
+    max_id = await conn.fetchval("SELECT MAX(id) FROM transactions;")
+    reports = ReportRepository(conn)
+    rollup_watermark = max_id - 500
+    await reports.apply_rollup(await reports.watermark(), rollup_watermark)
+    await reports.rebuild_fee_prefix((datetime.now(timezone.utc) - timedelta(days=1)).date())
+    # دفتر کل هم مثل rollupها دمی بدون checkpoint دارد
+    ledger = LedgerRepository(conn)
+    await ledger.rebuild_entries()
+    ledger_watermark = await conn.fetchval("SELECT MAX(id) FROM ledger_entries;") - 2000
+    await ledger.apply_checkpoints(0, ledger_watermark, 50)
+    for table in ("users", "cards", "transactions", "card_daily_spend", "report_hourly_success",
+                  "report_user_monthly", "report_card_monthly", "rollup_watermark", "fee_daily_buckets", "fee_daily_prefix",
+                  "ledger_entries", "ledger_checkpoints"):
+        await conn.execute(f"ANALYZE {table};")
+
+    user = await conn.fetchrow("SELECT * FROM users WHERE id = $1;", user_ids[len(user_ids) // 2])
+    cards = await conn.fetch("SELECT * FROM cards WHERE user_id = $1 ORDER BY id;", user["id"])
+    return Sample(
+        user_id=user["id"],
+        card_id=cards[0]["id"],
+        card_number=cards[0]["card_number"],
+        other_card_id=cards[1]["id"],
+        other_card_number=cards[1]["card_number"],
+        phone_number=user["phone_number"],
+        national_code=user["national_code"],
+        rollup_watermark=rollup_watermark,
+        ledger_watermark=ledger_watermark,
+    )
+
+
+Case = Callable[[Any, Sample], Awaitable[Any]]
+
+
+async def consume(cursor) -> int:
+    return sum([1 async for _ in cursor])
+
+
+def build_cases() -> dict[str, Case]:
+    day = timedelta(days=1)
+    return {
+        "UserRepository.get_by_phone": lambda r, s: r.users.get_by_phone(s.phone_number),
+        "UserRepository.get_by_id": lambda r, s: r.users.get_by_id(s.user_id),
+        "UserRepository.get_by_national_code": lambda r, s: r.users.get_by_national_code(s.national_code),
+        "UserRepository.create": lambda r, s: r.users.create({
+            "national_code": "8999999999",
+            "full_name": "Explain Probe",
+            "phone_number": "08999999999",
+            "email": "explain-probe@example.com",
+            "hashed_password": "x",
+        }),
+        "CardRepository.get_by_id": lambda r, s: r.cards.get_by_id(s.card_id),
+        "CardRepository.get_by_number": lambda r, s: r.cards.get_by_number(s.card_number),
+        "CardRepository.list_by_user": lambda r, s: r.cards.list_by_user(s.user_id),
+        "CardRepository.list_records_by_user": lambda r, s: r.cards.list_records_by_user(s.user_id),
+        "CardRepository.version_for_user": lambda r, s: r.cards.version_for_user(s.user_id),
+        "CardRepository.create_card": lambda r, s: r.cards.create_card(s.user_id, "9998000000000001", "123", "12/30"),
+        "CardRepository.lock_by_id": lambda r, s: r.cards.lock_by_id(s.card_id),
+        "CardRepository.change_balance": lambda r, s: r.cards.change_balance(s.card_id, Decimal("-1000")),
+        "CardRepository.change_balances": lambda r, s: r.cards.change_balances(
+            {s.card_id: Decimal("-1100"), s.other_card_id: Decimal("1000")}),
+        "CardRepository.daily_spend_for_cards": lambda r, s: r.cards.daily_spend_for_cards(
+            [s.card_id, s.other_card_id], s.today.date()),
+        "CardRepository.add_daily_spends": lambda r, s: r.cards.add_daily_spends(
+            s.today.date(), {s.card_id: Decimal("1000"), s.other_card_id: Decimal("1000")}),
+        "CardRepository.daily_spend_for_card": lambda r, s: r.cards.daily_spend_for_card(s.card_id, s.today.date()),
+        "CardRepository.add_daily_spend": lambda r, s: r.cards.add_daily_spend(s.card_id, s.today.date(), Decimal("1000")),
+        "CardRepository.rebuild_daily_spend": lambda r, s: r.cards.rebuild_daily_spend(),
+        "TransactionRepository.get_card_by_number_for_update": lambda r, s: r.txs.get_card_by_number_for_update(s.card_number),
+        "TransactionRepository.lock_card_pair": lambda r, s: r.txs.lock_card_pair(s.card_number, s.other_card_number),
+        "TransactionRepository.create_transaction": lambda r, s: r.txs.create_transaction(
+            s.card_id, s.other_card_id, Decimal("1000"), Decimal("100"), "SUCCESS", "explain probe"),
+        "TransactionRepository.lock_cards_by_numbers": lambda r, s: r.txs.lock_cards_by_numbers(
+            [s.card_number, s.other_card_number]),
+        "TransactionRepository.create_transactions": lambda r, s: r.txs.create_transactions([
+            (s.card_id, s.other_card_id, Decimal("1000"), Decimal("100"), "explain probe"),
+            (s.other_card_id, s.card_id, Decimal("2000"), Decimal("200"), None),
+        ]),
+        "TransactionRepository.bank_transfer": lambda r, s: r.txs.bank_transfer(
+            s.card_number, s.other_card_number, Decimal("1000"), s.user_id, "explain probe",
+            Decimal("0.10"), Decimal("100000"), Decimal("50000000")),
+        "TransactionRepository.get_idempotent_transaction": lambda r, s: r.txs.get_idempotent_transaction(
+            s.user_id, "explain-probe"),
+        "TransactionRepository.record_idempotency_key": lambda r, s: r.txs.record_idempotency_key(
+            s.user_id, "explain-probe", "transfer", "0" * 64, {"id": 1, "created_at": s.today}),
+        "TransactionRepository.recent_for_user": lambda r, s: r.txs.recent_for_user(s.user_id, limit=10),
+        "TransactionRepository.history_for_user": lambda r, s: r.txs.history_for_user(
+            s.user_id, limit=21, before=(s.today - 30 * day, 2 ** 31 - 1)),
+        "TransactionRepository.history_records_for_user": lambda r, s: r.txs.history_records_for_user(
+            s.user_id, limit=11),
+        "TransactionRepository.export_for_cards": lambda r, s: consume(r.txs.export_for_cards(
+            [s.card_id, s.other_card_id], s.today - 30 * day, s.today)),
+        "TransactionRepository.lock_fee_buckets": lambda r, s: r.txs.lock_fee_buckets(
+            s.today.date(), [s.card_id, s.other_card_id]),
+        "TransactionRepository.fee_sum": lambda r, s: r.txs.fee_sum(date_from=s.today - 90 * day, date_to=s.today),
+        "TransactionRepository.fee_series": lambda r, s: r.txs.fee_series("day", s.today - 90 * day, s.today),
+        "TransactionRepository.add_fee_bucket": lambda r, s: r.txs.add_fee_bucket(s.today.date(), s.card_id, Decimal("100")),
+        "TransactionRepository.add_fee_buckets": lambda r, s: r.txs.add_fee_buckets([
+            (s.today.date(), s.card_id, Decimal("100")), (s.today.date(), s.other_card_id, Decimal("200"))]),
+        "TransactionRepository.rebuild_fee_buckets": lambda r, s: r.txs.rebuild_fee_buckets(),
+        "ReportRepository.watermark": lambda r, s: r.reports.watermark(),
+        "ReportRepository.lock_watermark": lambda r, s: r.reports.lock_watermark(),
+        "ReportRepository.stable_max_transaction_id": lambda r, s: r.reports.stable_max_transaction_id(100),
+        "ReportRepository.apply_rollup": lambda r, s: r.reports.apply_rollup(0, 2 ** 31 - 1),
+        "ReportRepository.reset_rollups": lambda r, s: r.reports.reset_rollups(),
+        "ReportRepository.rebuild_fee_prefix": lambda r, s: r.reports.rebuild_fee_prefix(s.today.date()),
+        "ReportRepository.success_per_hour": lambda r, s: r.reports.success_per_hour(s.rollup_watermark),
+        "ReportRepository.user_monthly": lambda r, s: r.reports.user_monthly(s.rollup_watermark, s.user_id, 13),
+        "ReportRepository.card_monthly": lambda r, s: r.reports.card_monthly(s.rollup_watermark, s.user_id, 13),
+        "PartitionRepository.list_partitions": lambda r, s: r.partitions.list_partitions(),
+        "PartitionRepository.ensure_partitions": lambda r, s: r.partitions.ensure_partitions(
+            s.today.date(), (s.today + 120 * day).date()),
+        "PartitionRepository.detach_partitions": lambda r, s: r.partitions.detach_partitions(
+            (s.today - 3650 * day).date()),
+        "PartitionRepository.default_rows": lambda r, s: r.partitions.default_rows(),
+        "ReplicationRepository.wal_position": lambda r, s: r.replication.wal_position(),
+        "ReplicationRepository.replay_position": lambda r, s: r.replication.replay_position(),
+        "LedgerRepository.balance_as_of": lambda r, s: r.ledger.balance_as_of(s.card_id, s.today - 30 * day),
+        "LedgerRepository.watermark": lambda r, s: r.ledger.watermark(),
+        "LedgerRepository.lock_watermark": lambda r, s: r.ledger.lock_watermark(),
+        "LedgerRepository.stable_max_entry_id": lambda r, s: r.ledger.stable_max_entry_id(100),
+        "LedgerRepository.apply_checkpoints": lambda r, s: r.ledger.apply_checkpoints(
+            s.ledger_watermark, s.ledger_watermark + 2000, 50),
+        "LedgerRepository.reset_checkpoints": lambda r, s: r.ledger.reset_checkpoints(),
+        "LedgerRepository.rebuild_entries": lambda r, s: r.ledger.rebuild_entries(),
+        "LedgerRepository.mismatches": lambda r, s: r.ledger.mismatches(),
+    }
+
+
+def repository_methods() -> set[str]:
+    names = set()
+    for repo in REPOSITORIES:
+        for name, member in inspect.getmembers(repo, inspect.iscoroutinefunction):
+            if not name.startswith("_"):
+                names.add(f"{repo.__name__}.{name}")
+    return names
+
+
+def seq_scans(plan: dict) -> list[str]:
+    found = []
+    # scans that never ran (runtime partition pruning), read no page or met no live row
+    # (empty partitions, or ones holding only dead tuples) cost nothing
+    touched = plan.get("Actual Loops", 1) and plan.get("Shared Hit Blocks", 1) + plan.get("Shared Read Blocks", 0)
+    touched = touched and plan.get("Actual Rows", 1) + plan.get("Rows Removed by Filter", 0)
+    if plan.get("Node Type") == "Seq Scan" and touched:
+        found.append(plan.get("Relation Name", "?"))
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+async def explain(conn: asyncpg.Connection, sql: str, args: tuple,
+                  preceding: list[tuple[str, tuple]]) -> dict:
+    tr = conn.transaction()
+    await tr.start()
+    try:
+        # statements earlier in the same method run first so later ones see their effects
+        for prev_sql, prev_args in preceding:
+            await conn.execute(prev_sql, *prev_args)
+        raw = await conn.fetchval(EXPLAIN_PREFIX + sql, *args)
+    finally:
+        await tr.rollback()
+    return json.loads(raw)[0]
+
+
+async def run(n_users: int, n_transactions: int, verbose: bool) -> int:
+    conn = await asyncpg.connect(dsn=settings.asyncpg_url)
+    outer = conn.transaction()
+    await outer.start()
+    failures = []
+    try:
+        print(f"🌱 seeding {n_users} users / {n_transactions} transactions (rolled back at the end)...")
+        sample = await seed_dataset(conn, n_users, n_transactions)
+
+        cases = build_cases()
+        missing = repository_methods() - cases.keys()
+        for name in sorted(missing):
+            failures.append((name, "no EXPLAIN case for this repository method"))
+
+        for name, case in cases.items():
+            recorder = RecordingConnection(conn)
+            repos = argparse.Namespace(
+                users=UserRepository(recorder),
+                cards=CardRepository(recorder),
+                txs=TransactionRepository(recorder),
+                reports=ReportRepository(recorder),
+                partitions=PartitionRepository(recorder),
+                replication=ReplicationRepository(recorder),
+                ledger=LedgerRepository(recorder),
+            )
+            tr = conn.transaction()
+            await tr.start()
+            try:
+                await case(repos, sample)
+            finally:
+                await tr.rollback()
+
+            for i, (sql, args) in enumerate(recorder.statements):
+                if not sql.lstrip().upper().startswith(EXPLAINABLE):
+                    print(f"➖ {name:<55} {'':>9}     no plan ({sql.split()[0].upper()})")
+                    continue
+                result = await explain(conn, sql, args, recorder.statements[:i])
+                plan = result["Plan"]
+                scans = seq_scans(plan)
+                status = "ok"
+                reasons = {relation: allowed_seq_scan(name, relation) for relation in scans}
+                unlisted = sorted(relation for relation, reason in reasons.items() if reason is None)
+                if unlisted:
+                    status = f"SEQ SCAN on {', '.join(unlisted)}"
+                    failures.append((name, status))
+                elif reasons:
+                    status = f"seq scan allowed ({'; '.join(sorted(set(reasons.values())))})"
+                print(f"{'❌' if status.startswith('SEQ') else '✅'} {name:<55} "
+                      f"{result.get('Execution Time', 0):>9.3f} ms  {status}")
+                if verbose:
+                    print(json.dumps(plan, indent=2))
+    finally:
+        await outer.rollback()
+        await conn.close()
+
+    if failures:
+        print(f"\n{len(failures)} problem(s):")
+        for name, reason in failures:
+            print(f"  - {name}: {reason}")
+        return 1
+    print("\nAll repository statements use index access paths.")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--transactions", type=int, default=200_000)
+    parser.add_argument("--verbose", action="store_true", help="print every JSON plan")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.users, args.transactions, args.verbose)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""HTTP-level load test of the API; see ``python -m benchmarks.http_load --help``."""
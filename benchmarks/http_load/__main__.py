@@ -0,0 +1,263 @@
+# benchmarks/http_load/__main__.py
+"""
+Drives a weighted mix of transfer / withdraw / recent / login / cards
+requests against the API from concurrent HTTP clients. ``cards_poll`` lists
+cards like a polling dashboard: with the last ETag seen for that user in
+If-None-Match.
+
+    python -m benchmarks.http_load --mix transfer=70 withdraw=10 recent=15 login=5 \\
+        --profile zipf --clients 64 --duration 30 --output run.json
+    python -m benchmarks.http_load --profile hot --hot-share 0.8 --env TRANSFER_MODE=procedure
+    python -m benchmarks.http_load --mix cards_poll=95 transfer=5
+
+Boots uvicorn against the configured database (or targets ``--url``),
+creates fixture users/cards, optionally adds background volume with
+app.db.seed, and reports per-operation throughput, p50/p95/p99 latency,
+errors by status, deadlocks (pg_stat_database) and the time requests
+waited for a pool connection (from the Server-Timing header) as JSON.
+Writes to the database; use a scratch database.
+"""
+import argparse
+import asyncio
+import random
+import re
+import tempfile
+import time
+from pathlib import Path
+from collections import Counter
+from decimal import Decimal
+from typing import Callable, Optional
+
+import asyncpg
+import httpx
+
+from app.core.config import settings
+from benchmarks._common import dump, percentile, summarize
+from benchmarks.http_load.fixtures import Fixture, create_fixture, seed_background
+from benchmarks.http_load.profiles import PROFILES, CardPicker, make_picker, pick_pair
+from benchmarks.http_load.server import AppServer
+
+OPERATIONS = ("transfer", "withdraw", "recent", "login", "cards", "cards_poll")
+API = "/api/v1"
+PASSWORD = "load-password"
+
+_ACQUIRE_TIMING = re.compile(r"db-acquire;dur=([0-9.]+)")
+
+DEADLOCKS = "SELECT deadlocks FROM pg_stat_database WHERE datname = current_database();"
+
+
+def parse_mix(items: list[str]) -> dict[str, float]:
+    mix = {}
+    for item in items:
+        op, _, weight = item.partition("=")
+        if op not in OPERATIONS or not weight:
+            raise SystemExit(f"bad --mix entry {item!r}; use op=weight with op in {OPERATIONS}")
+        mix[op] = float(weight)
+    if not any(mix.values()):
+        raise SystemExit("--mix needs at least one positive weight")
+    return mix
+
+
+def parse_env(items: list[str]) -> dict[str, str]:
+    return dict(item.split("=", 1) for item in items)
+
+
+def acquire_wait(response: httpx.Response) -> Optional[float]:
+    match = _ACQUIRE_TIMING.search(response.headers.get("server-timing", ""))
+    return float(match.group(1)) / 1000 if match else None
+
+
+def summarize_waits(waits: list[float]) -> dict:
+    values = sorted(waits)
+    return {
+        "samples": len(values),
+        "total_s": round(sum(values), 3),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round((values[-1] if values else 0.0) * 1000, 3),
+    }
+
+
+async def deadlock_count(conn: asyncpg.Connection) -> int:
+    # آمار هر backend حداکثر هر یک ثانیه flush می‌شود؛ snapshot قبلی هم باید دور ریخته شود
+    await conn.execute("SELECT pg_stat_clear_snapshot();")
+    return int(await conn.fetchval(DEADLOCKS))
+
+
+async def login(client: httpx.AsyncClient, phone_number: str, password: str) -> httpx.Response:
+    return await client.post(f"{API}/auth/token", data={"username": phone_number, "password": password})
+
+
+async def run_load(client: httpx.AsyncClient, fixture: Fixture, tokens: list[str], mix: dict[str, float],
+                   pick: CardPicker, clients: int, duration: float, amount: Decimal) -> dict:
+    ops = list(mix)
+    weights = [mix[op] for op in ops]
+    n_cards = len(fixture.cards)
+    latencies = {op: [] for op in ops}
+    waits = {op: [] for op in ops}
+    errors = {op: Counter() for op in ops}
+    not_modified = Counter()
+    # آخرین ETag لیست کارت‌های هر کاربر، مشترک بین clientها
+    etags: dict[int, str] = {}
+    deadline = time.monotonic() + duration
+
+    def headers_for(card: int) -> dict:
+        return {"Authorization": f"Bearer {tokens[fixture.cards[card][1]]}"}
+
+    async def send(op: str, rng: random.Random) -> httpx.Response:
+        if op == "transfer":
+            src, dst = pick_pair(pick, rng, n_cards)
+            body = {"source_card": fixture.cards[src][0], "dest_card": fixture.cards[dst][0],
+                    "amount": str(amount), "description": "load"}
+            return await client.post(f"{API}/transactions/transfer", json=body, headers=headers_for(src))
+        if op == "withdraw":
+            card = pick(rng)
+            body = {"card_number": fixture.cards[card][0], "amount": str(amount), "description": "load"}
+            return await client.post(f"{API}/transactions/withdraw", json=body, headers=headers_for(card))
+        if op == "recent":
+            return await client.get(f"{API}/transactions/recent", params={"limit": 10},
+                                    headers=headers_for(pick(rng)))
+        if op in ("cards", "cards_poll"):
+            owner = fixture.cards[pick(rng)][1]
+            headers = {"Authorization": f"Bearer {tokens[owner]}"}
+            if op == "cards_poll" and owner in etags:
+                headers["If-None-Match"] = etags[owner]
+            response = await client.get(f"{API}/cards/", headers=headers)
+            if "etag" in response.headers:
+                etags[owner] = response.headers["etag"]
+            return response
+        owner = fixture.cards[pick(rng)][1]
+        return await login(client, fixture.phone_numbers[owner], fixture.password)
+
+    async def client_loop(i: int):
+        rng = random.Random(i)
+        while time.monotonic() < deadline:
+            op = rng.choices(ops, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await send(op, rng)
+            except httpx.HTTPError as e:
+                errors[op][type(e).__name__] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            wait = acquire_wait(response)
+            if wait is not None:
+                waits[op].append(wait)
+            if response.status_code >= 400:
+                errors[op][str(response.status_code)] += 1
+                continue
+            if response.status_code == 304:
+                not_modified[op] += 1
+            latencies[op].append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    all_errors = sum(errors.values(), Counter())
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "total": summarize([v for op in ops for v in latencies[op]], elapsed, all_errors),
+        "pool_wait": summarize_waits([v for op in ops for v in waits[op]]),
+        "operations": {
+            op: {**summarize(latencies[op], elapsed, errors[op]), "not_modified": not_modified[op],
+                 "pool_wait": summarize_waits(waits[op])}
+            for op in ops
+        },
+    }
+
+
+async def drive(base_url: str, fixture: Fixture, args, mix: dict[str, float],
+                cpu_seconds: Optional[Callable[[], Optional[float]]] = None) -> dict:
+    pick = make_picker(args.profile, len(fixture.cards), skew=args.skew, hot_share=args.hot_share)
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        tokens = []
+        for phone_number in fixture.phone_numbers:
+            response = await login(client, phone_number, fixture.password)
+            response.raise_for_status()
+            tokens.append(response.json()["access_token"])
+
+        if args.warmup > 0:
+            print(f"🔥 warmup {args.warmup}s...")
+            await run_load(client, fixture, tokens, mix, pick, args.clients, args.warmup, args.amount)
+        print(f"🚀 {args.clients} clients for {args.duration}s, profile={args.profile}, mix={mix}")
+        cpu_before = cpu_seconds() if cpu_seconds else None
+        result = await run_load(client, fixture, tokens, mix, pick, args.clients, args.duration, args.amount)
+        cpu_after = cpu_seconds() if cpu_seconds else None
+
+    # CPU سرور به ازای هر درخواست (موفق و ناموفق)؛ روی ماشین‌های کوچک پایدارتر از throughput است
+    requests = result["total"]["ops"] + result["total"]["errors"]
+    if cpu_before is not None and cpu_after is not None and requests:
+        result["server_cpu_ms_per_request"] = round((cpu_after - cpu_before) / requests * 1000, 3)
+    return result
+
+
+async def main(args):
+    mix = parse_mix(args.mix)
+    if args.seed_transactions:
+        print(f"🌱 seeding {args.seed_transactions:,} background transactions...")
+        await seed_background(args.seed_users, args.seed_transactions, args.seed_jobs)
+
+    conn = await asyncpg.connect(settings.asyncpg_url)
+    try:
+        fixture = await create_fixture(conn, args.users, args.cards_per_user, PASSWORD)
+        deadlocks_before = await deadlock_count(conn)
+
+        if args.url:
+            result = await drive(args.url, fixture, args, mix)
+            await asyncio.sleep(2)
+        else:
+            server = AppServer(port=args.port, workers=args.workers, env=parse_env(args.env), log_path=args.server_log)
+            async with server as base_url:
+                result = await drive(base_url, fixture, args, mix, cpu_seconds=server.cpu_seconds)
+            # با بسته شدن اتصال‌های سرور، آمار backendها flush شده است
+
+        result["deadlocks"] = await deadlock_count(conn) - deadlocks_before
+    finally:
+        await conn.close()
+
+    report = {
+        "config": {
+            "url": args.url, "workers": args.workers, "env": parse_env(args.env), "clients": args.clients,
+            "duration_s": args.duration, "warmup_s": args.warmup, "profile": args.profile, "skew": args.skew,
+            "hot_share": args.hot_share, "mix": mix, "users": args.users, "cards_per_user": args.cards_per_user,
+            "amount": args.amount,
+        },
+        **result,
+    }
+    for op, summary in result["operations"].items():
+        print(f"{op:<9} {summary['throughput_per_s']:>9}/s  p50={summary['p50_ms']}ms p95={summary['p95_ms']}ms "
+              f"p99={summary['p99_ms']}ms errors={summary['errors']} pool-wait p99={summary['pool_wait']['p99_ms']}ms")
+    print(f"deadlocks={result['deadlocks']} server-cpu/request={result.get('server_cpu_ms_per_request')}ms")
+    dump(report, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", nargs="+", default=["transfer=70", "withdraw=10", "recent=15", "login=5"],
+                        help="op=weight pairs, ops: " + ", ".join(OPERATIONS))
+    parser.add_argument("--profile", choices=PROFILES, default="uniform")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for --profile zipf")
+    parser.add_argument("--hot-share", type=float, default=0.5,
+                        help="probability of picking the hot card for --profile hot")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent HTTP clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds of unmeasured load first")
+    parser.add_argument("--users", type=int, default=8, help="fixture users the clients act as")
+    parser.add_argument("--cards-per-user", type=int, default=8)
+    parser.add_argument("--amount", type=Decimal, default=Decimal("1000"),
+                        help="per-request amount; the API minimum, so a hot card takes long to hit its daily cap")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--url", help="target an already running server instead of booting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--env", nargs="*", default=[], help="KEY=VALUE settings for the booted server")
+    parser.add_argument("--server-log", default=str(Path(tempfile.gettempdir()) / "http_load_server.log"))
+    parser.add_argument("--seed-transactions", type=int, default=0,
+                        help="background transactions to add with app.db.seed first")
+    parser.add_argument("--seed-users", type=int, default=1000)
+    parser.add_argument("--seed-jobs", type=int, default=4)
+    parser.add_argument("--output", help="write the JSON report here as well")
+    asyncio.run(main(parser.parse_args()))
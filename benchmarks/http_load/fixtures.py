@@ -0,0 +1,38 @@
+# benchmarks/http_load/fixtures.py
+"""Users and cards the load test acts as, plus optional background volume."""
+import asyncio
+import sys
+from dataclasses import dataclass
+
+import asyncpg
+
+from app.core.security import hash_password
+from benchmarks._common import create_bench_user
+
+
+@dataclass
+class Fixture:
+    password: str
+    phone_numbers: list[str]
+    # (card_number, index of the owning user); the profile picks indexes into this list
+    cards: list[tuple[str, int]]
+
+
+async def create_fixture(conn: asyncpg.Connection, n_users: int, cards_per_user: int, password: str) -> Fixture:
+    hashed_password = hash_password(password)
+    phone_numbers, cards = [], []
+    for owner in range(n_users):
+        user_id, user_cards = await create_bench_user(conn, n_cards=cards_per_user, hashed_password=hashed_password)
+        phone_numbers.append(await conn.fetchval("SELECT phone_number FROM users WHERE id = $1;", user_id))
+        cards.extend((card["card_number"], owner) for card in user_cards)
+    return Fixture(password=password, phone_numbers=phone_numbers, cards=cards)
+
+
+async def seed_background(users: int, transactions: int, jobs: int):
+    """Adds unrelated users and transactions with app.db.seed so queries run against a realistic table size."""
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "app.db.seed",
+        "--users", str(users), "--transactions", str(transactions), "--jobs", str(jobs),
+    )
+    if await process.wait() != 0:
+        raise RuntimeError(f"app.db.seed exited with code {process.returncode}")
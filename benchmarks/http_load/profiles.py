@@ -0,0 +1,36 @@
+# benchmarks/http_load/profiles.py
+"""
+Contention profiles: how requests choose which fixture card to touch.
+
+- uniform: every card equally likely.
+- zipf:    card k has weight 1/(k+1)^skew, so a few cards take most requests.
+- hot:     card 0 with probability ``hot_share``, otherwise uniform; models
+           many clients serializing on one card's row lock.
+"""
+import random
+from itertools import accumulate
+from typing import Callable
+
+PROFILES = ("uniform", "zipf", "hot")
+
+CardPicker = Callable[[random.Random], int]
+
+
+def make_picker(profile: str, n_cards: int, skew: float = 1.1, hot_share: float = 0.5) -> CardPicker:
+    if profile == "uniform":
+        return lambda rng: rng.randrange(n_cards)
+    if profile == "zipf":
+        population = range(n_cards)
+        weights = list(accumulate(1.0 / (k + 1) ** skew for k in population))
+        return lambda rng: rng.choices(population, cum_weights=weights)[0]
+    if profile == "hot":
+        return lambda rng: 0 if rng.random() < hot_share else rng.randrange(n_cards)
+    raise ValueError(f"Unknown profile {profile!r}")
+
+
+def pick_pair(pick: CardPicker, rng: random.Random, n_cards: int) -> tuple[int, int]:
+    """Source and destination of a transfer; both follow the profile, but never the same card."""
+    src, dst = pick(rng), pick(rng)
+    if dst == src:
+        dst = (src + rng.randrange(1, n_cards)) % n_cards
+    return src, dst
@@ -0,0 +1,98 @@
+# benchmarks/http_load/server.py
+"""Boots the API with uvicorn in a subprocess for the duration of a run."""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+READY_TIMEOUT_SECONDS = 30.0
+
+
+class AppServer:
+    """
+    ``async with AppServer(...) as base_url`` starts ``uvicorn app.main:app``
+    with Server-Timing enabled and stops it on exit. Extra settings (e.g.
+    TRANSFER_MODE) are passed through ``env``; server output goes to
+    ``log_path``.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, workers: int = 1,
+                 env: Optional[dict[str, str]] = None, log_path: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.env = env or {}
+        self.log_path = Path(log_path) if log_path else Path(tempfile.gettempdir()) / "http_load_server.log"
+        self.process: Optional[asyncio.subprocess.Process] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def __aenter__(self) -> str:
+        env = {**os.environ, "SERVER_TIMING_ENABLED": "true", **self.env}
+        with self.log_path.open("wb") as log:
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", self.host, "--port", str(self.port), "--workers", str(self.workers),
+                "--log-level", "warning", "--no-access-log",
+                env=env, stdout=log, stderr=asyncio.subprocess.STDOUT,
+            )
+        try:
+            await self._wait_ready()
+        except BaseException:
+            await self.stop()
+            raise
+        return self.base_url
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _wait_ready(self):
+        deadline = time.monotonic() + READY_TIMEOUT_SECONDS
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=1.0) as client:
+            while time.monotonic() < deadline:
+                if self.process.returncode is not None:
+                    raise RuntimeError(f"uvicorn exited with code {self.process.returncode}; see {self.log_path}")
+                try:
+                    if (await client.get("/")).status_code == 200:
+                        return
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.2)
+        raise RuntimeError(f"uvicorn did not become ready in {READY_TIMEOUT_SECONDS}s; see {self.log_path}")
+
+    def cpu_seconds(self) -> Optional[float]:
+        """User+system CPU of uvicorn and its worker processes so far; None where /proc is unavailable."""
+        if self.process is None:
+            return None
+        ticks = os.sysconf("SC_CLK_TCK")
+        total = 0.0
+        try:
+            for stat_path in Path("/proc").glob("[0-9]*/stat"):
+                try:
+                    # فیلد دوم (comm) ممکن است فاصله داشته باشد؛ بعد از آخرین ')' جدا می‌شود
+                    fields = stat_path.read_text().rsplit(")", 1)[1].split()
+                except OSError:
+                    continue
+                pid, ppid = int(stat_path.parent.name), int(fields[1])
+                if self.process.pid in (pid, ppid):
+                    total += (int(fields[11]) + int(fields[12])) / ticks
+        except OSError:
+            return None
+        return total
+
+    async def stop(self):
+        if self.process is None or self.process.returncode is not None:
+            return
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
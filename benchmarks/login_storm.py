@@ -0,0 +1,127 @@
+# benchmarks/login_storm.py
+"""
+Measures transfer latency while a burst of logins runs on the same event
+loop, once per password-hash executor ("inline" is the old behaviour of
+calling bcrypt directly inside the handler).
+
+    python -m benchmarks.login_storm --executors inline thread process --logins 32 --duration 10
+
+Each executor gets a quiet run (transfers only) and a storm run (transfers
+plus ``--logins`` clients calling AuthService.authenticate in a loop).
+Creates a throwaway user and cards in the configured database; use a
+scratch database.
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from decimal import Decimal
+
+import asyncpg
+
+from app.core.config import settings
+from app.core.security import PasswordHasher, hash_password
+from app.repositories.card_repo import CardRepository
+from app.repositories.transaction_repo import TransactionRepository
+from app.repositories.user_repo import UserRepository
+from app.services.auth_services import AuthService
+from app.services.transaction_service import TransactionService
+from benchmarks._common import create_bench_user, dump, summarize
+
+AMOUNT = Decimal("1000")
+PASSWORD = "storm-password"
+
+
+async def run_phase(pool: asyncpg.Pool, hasher: PasswordHasher, transfer_clients: int, login_clients: int,
+                    duration: float, user: dict, cards: list[dict]) -> dict:
+    transfer_latencies: list[float] = []
+    login_latencies: list[float] = []
+    transfer_errors: Counter = Counter()
+    login_errors: Counter = Counter()
+    deadline = time.monotonic() + duration
+
+    async def transfer_client(i: int):
+        src = cards[i % len(cards)]["card_number"]
+        while time.monotonic() < deadline:
+            dst = random.choice(cards)["card_number"]
+            if dst == src:
+                continue
+            started = time.perf_counter()
+            try:
+                async with pool.acquire() as conn:
+                    svc = TransactionService(conn, TransactionRepository(conn), CardRepository(conn))
+                    await svc.transfer(src, dst, AMOUNT, "bench", user_id=user["id"])
+            except Exception as e:
+                transfer_errors[type(e).__name__] += 1
+                continue
+            transfer_latencies.append(time.perf_counter() - started)
+
+    async def login_client():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                async with pool.acquire() as conn:
+                    auth_svc = AuthService(UserRepository(conn), hasher=hasher)
+                    if not await auth_svc.authenticate(user["phone_number"], PASSWORD):
+                        raise RuntimeError("login rejected")
+            except Exception as e:
+                login_errors[type(e).__name__] += 1
+                continue
+            login_latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(transfer_client(i) for i in range(transfer_clients)),
+        *(login_client() for _ in range(login_clients)),
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "transfers": summarize(transfer_latencies, elapsed, transfer_errors),
+        "logins": summarize(login_latencies, elapsed, login_errors),
+        "logins_rejected_busy": hasher.rejected,
+    }
+
+
+async def main(args):
+    pool = await asyncpg.create_pool(dsn=settings.asyncpg_url, min_size=1, max_size=args.pool_size)
+    async with pool.acquire() as conn:
+        user_id, cards = await create_bench_user(conn, n_cards=args.transfers * 2,
+                                                 hashed_password=hash_password(PASSWORD))
+        user = dict(await conn.fetchrow("SELECT id, phone_number FROM users WHERE id = $1;", user_id))
+
+    report = {"pool_size": args.pool_size, "duration_s": args.duration, "transfer_clients": args.transfers,
+              "login_clients": args.logins, "workers": args.workers, "max_pending": args.max_pending,
+              "results": []}
+    for executor in args.executors:
+        for login_clients in (0, args.logins):
+            hasher = PasswordHasher(executor=executor, workers=args.workers, max_pending=args.max_pending,
+                                    queue_timeout=args.queue_timeout)
+            try:
+                result = await run_phase(pool, hasher, args.transfers, login_clients, args.duration, user, cards)
+            finally:
+                hasher.shutdown()
+            result.update({"executor": executor, "login_clients": login_clients})
+            report["results"].append(result)
+            tx, logins = result["transfers"], result["logins"]
+            print(f"{executor:<8} logins={login_clients:<4} transfer p50={tx['p50_ms']}ms p99={tx['p99_ms']}ms "
+                  f"({tx['throughput_per_s']} tx/s)  logins {logins['throughput_per_s']}/s "
+                  f"busy={result['logins_rejected_busy']}")
+    await pool.close()
+    dump(report, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--executors", nargs="+", default=["inline", "thread", "process"],
+                        choices=["inline", "thread", "process"])
+    parser.add_argument("--transfers", type=int, default=8, help="concurrent transfer clients")
+    parser.add_argument("--logins", type=int, default=32, help="concurrent login clients during the storm")
+    parser.add_argument("--workers", type=int, default=settings.PASSWORD_HASH_WORKERS)
+    parser.add_argument("--max-pending", type=int, default=settings.PASSWORD_HASH_MAX_PENDING)
+    parser.add_argument("--queue-timeout", type=float, default=settings.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    parser.add_argument("--pool-size", type=int, default=64,
+                        help="connections shared by all clients (keep below max_connections)")
+    parser.add_argument("--output", help="write the JSON report here as well")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,127 @@
+# benchmarks/response_encoding.py
+"""
+Micro-benchmark of the response encoding of /transactions/recent and
+/cards: the previous path (dict copy of every Record, CardOut instances for
+/cards, FastAPI's response_model validation and serialization, then
+JSONResponse's json.dumps) against RecordEncoder writing the Records
+straight to JSON bytes.
+
+Seeds one user with ``--rows`` cards and ``--rows`` transactions inside a
+transaction that is rolled back at the end, reads them through the same
+repository methods the handlers use and times only the encoding, in
+process. Both paths must produce identical bytes or the run fails.
+
+    python -m benchmarks.response_encoding --rows 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import asyncpg
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from app.api.v1.endpoints import cards as cards_endpoints
+from app.api.v1.endpoints import transactions as transactions_endpoints
+from app.core.config import settings
+from app.repositories.card_repo import CardRepository
+from app.repositories.transaction_repo import TransactionRepository
+from app.schemas.card_schema import CardOut
+from benchmarks._common import create_bench_user, dump
+
+
+def response_field(router, path: str):
+    route = next(r for r in router.routes if r.path == path)
+    return route.secure_cloned_response_field
+
+
+async def seed(conn: asyncpg.Connection, rows: int) -> int:
+    user_id, cards = await create_bench_user(conn, n_cards=rows)
+    now = datetime.now(timezone.utc)
+    await conn.executemany(
+        """
+        INSERT INTO transactions (source_card_id, dest_card_id, amount, fee, status, description, created_at)
+        VALUES ($1, $2, $3, $4, 'SUCCESS', $5, $6);
+        """,
+        [(cards[0]["id"], cards[i % len(cards)]["id"], Decimal(1000 + 37 * i) + Decimal("0.25"),
+          Decimal("150.00"), f"انتقال شماره‌ی {i}" if i % 2 else None, now - timedelta(minutes=i))
+         for i in range(rows)],
+    )
+    return user_id
+
+
+async def timed(encode, iterations: int, rounds: int) -> float:
+    """Median microseconds per response over ``rounds`` runs of ``iterations`` encodings."""
+    per_round = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await encode()
+        per_round.append((time.perf_counter() - started) / iterations * 1e6)
+    return statistics.median(per_round)
+
+
+async def main(args):
+    recent_field = response_field(transactions_endpoints.router, "/api/v1/transactions/recent")
+    cards_field = response_field(cards_endpoints.router, "/api/v1/cards/")
+
+    conn = await asyncpg.connect(dsn=settings.asyncpg_url)
+    try:
+        tx = conn.transaction()
+        await tx.start()
+        try:
+            user_id = await seed(conn, args.rows)
+            tx_records = await TransactionRepository(conn).history_records_for_user(user_id, args.rows)
+            card_records = await CardRepository(conn).list_records_by_user(user_id)
+        finally:
+            await tx.rollback()
+    finally:
+        await conn.close()
+
+    async def recent_before():
+        txs = [dict(record) for record in tx_records]
+        content = await serialize_response(field=recent_field, response_content=txs)
+        return JSONResponse(content).body
+
+    async def recent_after():
+        return transactions_endpoints.TRANSACTION_JSON.response(tx_records).body
+
+    async def cards_before():
+        cards = [CardOut(**dict(record)) for record in card_records]
+        content = await serialize_response(field=cards_field, response_content=cards)
+        return JSONResponse(content).body
+
+    async def cards_after():
+        return cards_endpoints.CARD_JSON.response(card_records).body
+
+    report = {"rows": args.rows, "iterations": args.iterations, "rounds": args.rounds}
+    for name, records, before, after in (("recent", tx_records, recent_before, recent_after),
+                                         ("cards", card_records, cards_before, cards_after)):
+        if len(records) != args.rows:
+            raise SystemExit(f"{name}: expected {args.rows} rows, read {len(records)}")
+        body = await after()
+        if body != await before():
+            raise SystemExit(f"{name}: the encoded bodies differ")
+        before_us = await timed(before, args.iterations, args.rounds)
+        after_us = await timed(after, args.iterations, args.rounds)
+        report[name] = {
+            "body_bytes": len(body),
+            "before_us_per_response": round(before_us, 1),
+            "after_us_per_response": round(after_us, 1),
+            "speedup": round(before_us / after_us, 2),
+        }
+        print(f"{name:<7} {args.rows} rows, {len(body):,} bytes: {before_us:8.1f}us -> {after_us:7.1f}us "
+              f"({before_us / after_us:.1f}x)")
+    dump(report, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50, help="cards and transactions in each response")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--output", help="write the JSON report here as well")
+    asyncio.run(main(parser.parse_args()))
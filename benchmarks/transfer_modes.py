@@ -0,0 +1,104 @@
+# benchmarks/transfer_modes.py
+"""
+Compares TransactionService.transfer in "client" mode (locks and checks from
+Python, ~7 round trips) against "procedure" mode (one bank_transfer() call)
+at several concurrency levels, and optionally the direct path (one pooled
+connection and transaction per transfer) against group commit (transfers on
+disjoint cards share one transaction, a savepoint each).
+
+    python -m benchmarks.transfer_modes --clients 1 16 128 --duration 10
+    python -m benchmarks.transfer_modes --modes procedure --executions direct group
+
+Creates a throwaway user and cards in the configured database; use a
+scratch database.
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from decimal import Decimal
+
+import asyncpg
+
+from app.core.config import settings
+from app.repositories.card_repo import CardRepository
+from app.repositories.transaction_repo import TransactionRepository
+from app.services.group_commit import GroupCommit
+from app.services.transaction_service import TransactionService
+from benchmarks._common import create_bench_user, dump, summarize
+
+AMOUNT = Decimal("1000")
+
+
+async def run_level(pool: asyncpg.Pool, mode: str, clients: int, duration: float,
+                    user_id: int, cards: list[dict], group: GroupCommit | None = None) -> dict:
+    latencies: list[float] = []
+    errors: Counter = Counter()
+    deadline = time.monotonic() + duration
+
+    async def client(i: int):
+        src = cards[i % len(cards)]["card_number"]
+        while time.monotonic() < deadline:
+            dst = random.choice(cards)["card_number"]
+            if dst == src:
+                continue
+            started = time.perf_counter()
+            try:
+                if group is not None:
+                    await TransactionService.on_group_commit(group, mode=mode).transfer(
+                        src, dst, AMOUNT, "bench", user_id=user_id)
+                else:
+                    async with pool.acquire() as conn:
+                        svc = TransactionService(conn, TransactionRepository(conn), CardRepository(conn), mode=mode)
+                        await svc.transfer(src, dst, AMOUNT, "bench", user_id=user_id)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def main(args):
+    pool = await asyncpg.create_pool(dsn=settings.asyncpg_url, min_size=1, max_size=args.pool_size)
+    async with pool.acquire() as conn:
+        user_id, cards = await create_bench_user(conn, n_cards=max(args.clients) * 2)
+
+    report = {"pool_size": args.pool_size, "duration_s": args.duration, "results": []}
+    for clients in args.clients:
+        for mode in args.modes:
+            for execution in args.executions:
+                group = None
+                if execution == "group":
+                    group = GroupCommit(window=args.window, max_items=args.max_items,
+                                        concurrency=args.concurrency, acquire=pool.acquire)
+                result = await run_level(pool, mode, clients, args.duration, user_id, cards, group)
+                if group is not None:
+                    await group.close()
+                result.update({"mode": mode, "execution": execution, "clients": clients})
+                report["results"].append(result)
+                print(f"{mode:<10} {execution:<7} clients={clients:<4} {result['throughput_per_s']:>9} tx/s  "
+                      f"p50={result['p50_ms']}ms p99={result['p99_ms']}ms errors={result['errors']}")
+    await pool.close()
+    dump(report, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 128])
+    parser.add_argument("--modes", nargs="+", default=["client", "procedure"], choices=["client", "procedure"])
+    parser.add_argument("--executions", nargs="+", default=["direct"], choices=["direct", "group"])
+    parser.add_argument("--window", type=float, default=settings.GROUP_COMMIT_WINDOW_SECONDS,
+                        help="group commit collection window in seconds")
+    parser.add_argument("--max-items", type=int, default=settings.GROUP_COMMIT_MAX_ITEMS,
+                        help="most transfers in one group commit")
+    parser.add_argument("--concurrency", type=int, default=settings.GROUP_COMMIT_CONCURRENCY,
+                        help="group commits in flight at once")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per (mode, execution, clients) run")
+    parser.add_argument("--pool-size", type=int, default=64,
+                        help="connections shared by all clients (keep below max_connections)")
+    parser.add_argument("--output", help="write the JSON report here as well")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,12 @@
+import os
+
+# app.core.config این‌ها را هنگام import لازم دارد؛ تست‌های واحد به دیتابیس وصل نمی‌شوند
+for name, value in {
+    "SECRET_KEY": "test-secret",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "bank_test",
+    "DB_USER": "postgres",
+    "DB_PASS": "postgres",
+}.items():
+    os.environ.setdefault(name, value)
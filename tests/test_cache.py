@@ -0,0 +1,63 @@
+import pytest
+
+from app.core.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+    clock.now = 4.999
+    assert cache.get("a") == 1
+    clock.now = 5
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_per_entry_ttl_overrides_default_and_zero_ttl_removes(clock):
+    cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("short", 1, ttl=1)
+    cache.set("gone", 2)
+    cache.set("gone", 3, ttl=0)
+    clock.now = 2
+    assert cache.get("short") is None
+    assert cache.get("gone", "default") == "default"
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(maxsize=2, ttl=60, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # خواندن a آن را تازه می‌کند، پس b بیرون می‌رود
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_invalidate_and_stats(clock):
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    cache.get("a")
+    assert cache.stats() == {"size": 0, "maxsize": 10, "hits": 1, "misses": 1, "evictions": 0, "hit_rate": 0.5}
+
+
+def test_maxsize_must_be_positive():
+    with pytest.raises(ValueError):
+        TTLCache(maxsize=0, ttl=1)
@@ -0,0 +1,94 @@
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from app.repositories.transaction_repo import _split_range
+
+UTC = timezone.utc
+
+
+def at(*args) -> datetime:
+    return datetime(*args, tzinfo=UTC)
+
+
+def test_open_range_is_all_days():
+    assert _split_range(None, None) == ((date.min, date.max), None, None)
+
+
+def test_whole_days_have_no_edges():
+    days, head, tail = _split_range(at(2026, 1, 1), at(2026, 1, 3, 23, 59, 59, 999999))
+    assert days == (date(2026, 1, 1), date(2026, 1, 4))
+    assert head is None and tail is None
+
+
+def test_partial_days_become_edges():
+    days, head, tail = _split_range(at(2026, 1, 1, 5), at(2026, 1, 3, 2))
+    assert days == (date(2026, 1, 2), date(2026, 1, 3))
+    assert head == (at(2026, 1, 1, 5), at(2026, 1, 2))
+    # انتهای inclusive با یک میکروثانیه half-open می‌شود
+    assert tail == (at(2026, 1, 3), at(2026, 1, 3, 2, 0, 0, 1))
+
+
+def test_range_inside_one_day_is_a_single_edge():
+    assert _split_range(at(2026, 1, 1, 5), at(2026, 1, 1, 6)) == (
+        None, (at(2026, 1, 1, 5), at(2026, 1, 1, 6, 0, 0, 1)), None)
+
+
+def test_offsets_are_normalised_to_utc():
+    tehran = timezone(timedelta(hours=3, minutes=30))
+    days, head, tail = _split_range(datetime(2026, 1, 1, 3, 30, tzinfo=tehran), None)
+    assert days == (date(2026, 1, 1), date.max)
+    assert head is None and tail is None
+
+
+@pytest.fixture
+def tehran_local_time(monkeypatch):
+    monkeypatch.setenv("TZ", "Asia/Tehran")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_naive_bounds_are_local_time_like_asyncpg(tehran_local_time):
+    days, head, tail = _split_range(datetime(2026, 1, 1, 3, 30), datetime(2026, 1, 2, 3, 29, 59, 999999))
+    assert days == (date(2026, 1, 1), date(2026, 1, 2))
+    assert head is None and tail is None
+
+
+def test_pieces_cover_the_range_exactly_once():
+    rng = random.Random(7)
+    base = at(2026, 1, 1)
+    for _ in range(500):
+        lo = base + timedelta(seconds=rng.randrange(10 * 86400))
+        hi = lo + timedelta(seconds=rng.randrange(5 * 86400))
+        days, head, tail = _split_range(lo, hi)
+        pieces = [piece for piece in (head, tail) if piece is not None]
+        if days is not None:
+            pieces.append((datetime.combine(days[0], datetime.min.time(), UTC),
+                           datetime.combine(days[1], datetime.min.time(), UTC)))
+        pieces.sort()
+        assert pieces[0][0] == lo
+        assert pieces[-1][1] == hi + timedelta(microseconds=1)
+        for (_, end), (start, _) in zip(pieces, pieces[1:]):
+            assert end == start
+
+
+@pytest.mark.parametrize("date_from, date_to", [
+    (None, datetime.max),
+    (None, datetime.max.replace(tzinfo=UTC)),
+    (None, datetime.max.replace(tzinfo=timezone(timedelta(hours=-5)))),
+    (datetime.min, None),
+    (datetime.min.replace(tzinfo=timezone(timedelta(hours=5))), datetime.max),
+    (datetime.max.replace(tzinfo=UTC), datetime.max.replace(tzinfo=UTC)),
+])
+def test_bounds_near_datetime_limits_do_not_overflow(date_from, date_to, tehran_local_time):
+    days, head, tail = _split_range(date_from, date_to)
+    assert days is not None or head is not None
+
+
+def test_far_future_end_keeps_every_real_day():
+    days, head, tail = _split_range(at(2026, 1, 1), datetime.max.replace(tzinfo=UTC))
+    assert days[0] == date(2026, 1, 1) and days[1] > date(9999, 1, 1)
@@ -0,0 +1,221 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from asyncpg import DeadlockDetectedError
+
+from app.core.exceptions import TransferContentionException
+from app.services.group_commit import GroupCommit, _Job
+
+
+async def _noop(conn, grouped):
+    return None
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def enqueue(loop):
+    def enqueue(gc: GroupCommit, name: str, *cards: str) -> _Job:
+        job = _Job(frozenset(cards), _noop, loop.create_future())
+        job.name = name
+        gc._queue.append(job)
+        gc.pending += 1
+        return job
+    return enqueue
+
+
+def names(jobs) -> list[str]:
+    return [job.name for job in jobs]
+
+
+def test_disjoint_jobs_form_one_group_in_arrival_order(enqueue):
+    gc = GroupCommit(max_items=8)
+    for i in range(4):
+        enqueue(gc, f"j{i}", f"src{i}", f"dst{i}")
+    assert names(gc._take()) == ["j0", "j1", "j2", "j3"]
+    assert not gc._queue
+    assert gc._busy == {"src0", "dst0", "src1", "dst1", "src2", "dst2", "src3", "dst3"}
+
+
+def test_job_on_a_taken_card_waits_and_keeps_its_place(enqueue):
+    gc = GroupCommit(max_items=8)
+    enqueue(gc, "a", "1", "2")
+    enqueue(gc, "b", "2", "3")
+    # c فقط با b (که جا مانده) کارت مشترک دارد؛ نباید از b جلو بزند
+    enqueue(gc, "c", "3", "4")
+    enqueue(gc, "d", "5", "6")
+    assert names(gc._take()) == ["a", "d"]
+    assert names(gc._queue) == ["b", "c"]
+
+    gc._busy.clear()
+    assert names(gc._take()) == ["b"]
+    gc._busy.clear()
+    assert names(gc._take()) == ["c"]
+
+
+def test_group_size_is_capped_and_the_rest_stays_queued_in_order(enqueue):
+    gc = GroupCommit(max_items=2)
+    for i in range(5):
+        enqueue(gc, f"j{i}", f"card{i}")
+    assert names(gc._take()) == ["j0", "j1"]
+    assert names(gc._queue) == ["j2", "j3", "j4"]
+
+
+def test_cards_of_committing_groups_are_skipped(enqueue):
+    gc = GroupCommit(max_items=8)
+    gc._busy = {"1"}
+    enqueue(gc, "a", "1", "2")
+    enqueue(gc, "b", "3", "4")
+    assert names(gc._take()) == ["b"]
+    assert names(gc._queue) == ["a"]
+    # هنوز در حال commit است؛ گروه خالی یعنی worker منتظر می‌ماند
+    assert gc._take() == []
+
+
+def test_cancelled_jobs_are_dropped(enqueue):
+    gc = GroupCommit(max_items=8)
+    cancelled = enqueue(gc, "a", "1")
+    enqueue(gc, "b", "1")
+    cancelled.future.cancel()
+    assert names(gc._take()) == ["b"]
+    assert gc.pending == 1
+
+
+def test_resolve_sets_results_and_errors_and_skips_done_futures(enqueue):
+    gc = GroupCommit()
+    ok, failed, cancelled = enqueue(gc, "ok", "1"), enqueue(gc, "failed", "2"), enqueue(gc, "cancelled", "3")
+    cancelled.future.cancel()
+    error = ValueError("rejected")
+    # نتیجه‌ای که خودش Exception است در tuple می‌آید و خطا حساب نمی‌شود
+    gc._resolve([ok, failed, cancelled], [(KeyError("value"),), error, ("late",)])
+    assert isinstance(ok.future.result(), KeyError)
+    assert failed.future.exception() is error
+    assert cancelled.future.cancelled()
+
+
+@pytest.mark.parametrize("kwargs", [{"window": -1}, {"max_items": 0}, {"concurrency": 0}])
+def test_invalid_settings_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        GroupCommit(**kwargs)
+
+
+def test_cancelled_commit_answers_every_caller():
+    async def scenario():
+        acquiring = asyncio.Event()
+
+        @asynccontextmanager
+        async def stuck_acquire():
+            acquiring.set()
+            await asyncio.Event().wait()
+            yield None
+
+        gc = GroupCommit(window=1, max_items=3, acquire=stuck_acquire)
+        callers = [asyncio.create_task(gc.run((f"card{i}",), _noop)) for i in range(3)]
+        await acquiring.wait()
+        for task in list(gc._committing):
+            task.cancel()
+        results = await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), 1)
+        gc._worker.cancel()
+        return results, gc.pending
+
+    results, pending = asyncio.run(scenario())
+    assert pending == 0
+    for result in results:
+        assert isinstance(result, TransferContentionException)
+        assert isinstance(result.__cause__, asyncio.CancelledError)
+
+
+def test_jobs_run_alone_are_answered_as_soon_as_they_commit():
+    async def scenario():
+        started = asyncio.Event()
+
+        @asynccontextmanager
+        async def acquire():
+            yield None
+
+        async def done(conn, grouped):
+            return "tx-1"
+
+        async def stuck(conn, grouped):
+            started.set()
+            await asyncio.Event().wait()
+
+        loop = asyncio.get_running_loop()
+        first = _Job(frozenset({"1"}), done, loop.create_future())
+        second = _Job(frozenset({"2"}), stuck, loop.create_future())
+        run = asyncio.create_task(GroupCommit(acquire=acquire)._run_alone([first, second]))
+        await started.wait()
+        run.cancel()
+        await asyncio.gather(run, return_exceptions=True)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    # کار اول commit شده و نتیجه‌اش با لغو بعدی عوض نمی‌شود
+    assert first.future.result() == "tx-1"
+    assert not second.future.done()
+
+
+class SavepointConnection:
+    """Just enough of a Connection for _run_job: savepoints that record how they ended."""
+
+    def __init__(self):
+        self.savepoints = []
+
+    @asynccontextmanager
+    async def _savepoint(self):
+        try:
+            yield
+        except BaseException:
+            self.savepoints.append("rolled back")
+            raise
+        self.savepoints.append("released")
+
+    def transaction(self):
+        return self._savepoint()
+
+
+def _failing(error: Exception):
+    async def operation(conn, grouped):
+        raise error
+    return operation
+
+
+def test_grouped_job_fails_the_group_on_deadlock_instead_of_retrying(loop):
+    conn, seen = SavepointConnection(), []
+
+    async def operation(conn, grouped):
+        seen.append(grouped)
+        raise DeadlockDetectedError("deadlock detected")
+
+    job = _Job(frozenset({"1"}), operation, loop.create_future())
+    with pytest.raises(DeadlockDetectedError):
+        loop.run_until_complete(GroupCommit._run_job(job, conn))
+    # عملیات می‌داند در گروه است (پس با with_retries نمی‌خوابد)
+    assert seen == [True]
+    assert conn.savepoints == ["rolled back"]
+
+
+def test_grouped_job_rejection_stays_inside_its_savepoint(loop):
+    conn, error = SavepointConnection(), ValueError("rejected")
+    job = _Job(frozenset({"1"}), _failing(error), loop.create_future())
+    assert loop.run_until_complete(GroupCommit._run_job(job, conn)) is error
+    assert conn.savepoints == ["rolled back"]
+
+
+def test_job_run_alone_is_told_it_may_retry(loop):
+    seen = []
+
+    async def operation(conn, grouped):
+        seen.append(grouped)
+        return "tx"
+
+    job = _Job(frozenset({"1"}), operation, loop.create_future())
+    assert loop.run_until_complete(GroupCommit._run_job(job, None, grouped=False)) == ("tx",)
+    assert seen == [False]
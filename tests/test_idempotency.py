@@ -0,0 +1,97 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+from app.services.idempotency import IdempotencyConflict, IdempotencyGate, idempotent_request
+
+
+def transfer(key: str = "k1", amount="1000", user_id: int = 1):
+    return idempotent_request(user_id, key, "transfer", source_card="1" * 16, dest_card="2" * 16, amount=amount)
+
+
+def test_equal_amounts_share_a_fingerprint():
+    assert transfer(amount="1000").fingerprint == transfer(amount=Decimal("1000.00")).fingerprint
+    assert transfer(amount="1000").fingerprint != transfer(amount="1001").fingerprint
+
+
+def test_completed_request_is_replayed_without_running_again():
+    async def scenario():
+        gate, calls = IdempotencyGate(maxsize=10, ttl=60), []
+
+        async def execute():
+            calls.append(1)
+            return {"id": 7}
+
+        first = await gate.run(transfer(), execute)
+        second = await gate.run(transfer(amount="1000.00"), execute)
+        return first, second, len(calls)
+
+    assert asyncio.run(scenario()) == ({"id": 7}, {"id": 7}, 1)
+
+
+def test_same_key_for_other_fields_is_a_conflict():
+    async def scenario():
+        gate = IdempotencyGate(maxsize=10, ttl=60)
+
+        async def execute():
+            return {"id": 7}
+
+        await gate.run(transfer(), execute)
+        await gate.run(transfer(amount="5"), execute)
+
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(scenario())
+
+
+def test_keys_are_per_user():
+    async def scenario():
+        gate, calls = IdempotencyGate(maxsize=10, ttl=60), []
+
+        async def execute():
+            calls.append(1)
+            return {"id": len(calls)}
+
+        return await gate.run(transfer(user_id=1), execute), await gate.run(transfer(user_id=2), execute)
+
+    assert asyncio.run(scenario()) == ({"id": 1}, {"id": 2})
+
+
+def test_concurrent_duplicate_waits_for_the_first_attempt():
+    async def scenario():
+        gate, calls, release = IdempotencyGate(maxsize=10, ttl=60), [], asyncio.Event()
+
+        async def execute():
+            calls.append(1)
+            await release.wait()
+            return {"id": 7}
+
+        first = asyncio.create_task(gate.run(transfer(), execute))
+        second = asyncio.create_task(gate.run(transfer(), execute))
+        await asyncio.sleep(0)
+        release.set()
+        return await first, await second, len(calls)
+
+    assert asyncio.run(scenario()) == ({"id": 7}, {"id": 7}, 1)
+
+
+def test_waiter_runs_the_request_when_the_first_attempt_fails():
+    async def scenario():
+        gate, calls, release = IdempotencyGate(maxsize=10, ttl=60), [], asyncio.Event()
+
+        async def execute():
+            calls.append(1)
+            if len(calls) == 1:
+                await release.wait()
+                raise RuntimeError("rolled back")
+            return {"id": 8}
+
+        first = asyncio.create_task(gate.run(transfer(), execute))
+        second = asyncio.create_task(gate.run(transfer(), execute))
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(RuntimeError):
+            await first
+        return await second, len(calls)
+
+    assert asyncio.run(scenario()) == ({"id": 8}, 2)
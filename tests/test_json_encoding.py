@@ -0,0 +1,75 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Optional
+
+import pytest
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from pydantic import BaseModel, Field
+
+from app.api.v1.endpoints import cards as cards_endpoints
+from app.api.v1.endpoints import transactions as transactions_endpoints
+from app.core.json_encoding import RecordEncoder
+
+UTC = timezone.utc
+
+
+def pydantic_body(router, path: str, rows: list[dict]) -> bytes:
+    """The bytes FastAPI writes for ``rows`` through the route's response_model."""
+    route = next(r for r in router.routes if r.path == path)
+    content = asyncio.run(serialize_response(field=route.secure_cloned_response_field, response_content=rows))
+    return JSONResponse(content).body
+
+
+TRANSACTIONS = [
+    {"id": 1, "source_card_id": 10, "dest_card_id": 20, "amount": Decimal("1000.00"), "fee": Decimal("0.50"),
+     "status": "SUCCESS", "description": "اجاره \"مهر\"\n\ttab \\  ", "created_at": datetime(2026, 1, 1, tzinfo=UTC)},
+    {"id": 2 ** 62, "source_card_id": 10, "dest_card_id": None, "amount": Decimal("1E+3"), "fee": Decimal("0"),
+     "status": "FAILED", "description": None,
+     "created_at": datetime(2026, 1, 1, 12, 30, 15, 123456, tzinfo=timezone(timedelta(hours=3, minutes=30)))},
+    {"id": 3, "source_card_id": None, "dest_card_id": 20, "amount": Decimal("12345678901234.99"), "fee": Decimal("-0.01"),
+     "status": "PENDING", "description": "", "created_at": datetime(2026, 1, 1, 0, 0, 0, 1, tzinfo=UTC),
+     # ستون‌هایی که مدل ندارد نوشته نمی‌شوند
+     "idempotency_key": "k1"},
+]
+
+CARDS = [
+    {"id": 5, "card_number": "5912000000000001", "balance": Decimal("250000.00"), "is_active": True, "user_id": 9,
+     "created_at": datetime(2025, 12, 31, 23, 59, 59, tzinfo=UTC), "cvv2": "123", "expire_date": "2030-01"},
+    {"id": 6, "card_number": "5912000000000002", "balance": Decimal("0.00"), "is_active": False, "user_id": 9,
+     "created_at": datetime(2026, 6, 1, 8, tzinfo=timezone(timedelta(hours=-5)))},
+]
+
+
+def test_transactions_match_pydantic_bytes():
+    expected = pydantic_body(transactions_endpoints.router, "/api/v1/transactions/recent", TRANSACTIONS)
+    assert transactions_endpoints.TRANSACTION_JSON.response(TRANSACTIONS).body == expected
+
+
+def test_cards_match_pydantic_bytes_without_sensitive_columns():
+    body = cards_endpoints.CARD_JSON.response(CARDS).body
+    assert body == pydantic_body(cards_endpoints.router, "/api/v1/cards/", CARDS)
+    assert b"cvv2" not in body and b"expire_date" not in body
+
+
+def test_empty_list():
+    assert transactions_endpoints.TRANSACTION_JSON.response([]).body == b"[]"
+
+
+class Nested(BaseModel):
+    items: list[int]
+
+
+class Aliased(BaseModel):
+    value: int = Field(alias="v")
+
+
+class Floaty(BaseModel):
+    value: Optional[float]
+
+
+@pytest.mark.parametrize("model", [Nested, Aliased, Floaty])
+def test_unsupported_models_fail_at_construction(model):
+    with pytest.raises(TypeError):
+        RecordEncoder(model)
@@ -0,0 +1,38 @@
+import base64
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.pagination import decode_cursor, encode_cursor
+
+
+def test_round_trip_keeps_instant_offset_and_id():
+    created_at = datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=timezone(timedelta(hours=3, minutes=30)))
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor(datetime(2026, 1, 1, tzinfo=timezone.utc), 2 ** 40)
+    assert "=" not in cursor
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+def _raw(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode()).rstrip(b"=").decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "zzz",
+    "!!!!",
+    _raw("not json"),
+    _raw('["2026-01-01T00:00:00+00:00"]'),
+    _raw('["yesterday", 1]'),
+    # بدون tz با timestamptz مقایسه‌پذیر نیست
+    _raw('["2026-01-01T00:00:00", 1]'),
+    _raw('["2026-01-01T00:00:00+00:00", "1"]'),
+    _raw('["2026-01-01T00:00:00+00:00", 1.5]'),
+])
+def test_malformed_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
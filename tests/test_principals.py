@@ -0,0 +1,25 @@
+from app.core import principals
+
+
+def _user(user_id: int, full_name: str) -> dict:
+    return {"id": user_id, "national_code": "0012345678", "full_name": full_name, "phone_number": "09120000000",
+            "email": None, "is_active": True, "hashed_password": "secret"}
+
+
+def test_cached_principal_has_no_password_hash():
+    principals.cache_principal(_user(9001, "A"), principals.principal_generation())
+    assert "hashed_password" not in principals.get_cached_principal(9001)
+    principals.invalidate_principal(9001)
+
+
+def test_miss_started_before_invalidate_is_not_cached():
+    generation = principals.principal_generation()
+    # ردیف کهنه خوانده شده و هم‌زمان کاربر تغییر کرده است
+    principals.invalidate_principal(9002)
+    principal = principals.cache_principal(_user(9002, "stale"), generation)
+    assert principal["full_name"] == "stale"
+    assert principals.get_cached_principal(9002) is None
+
+    principals.cache_principal(_user(9002, "fresh"), principals.principal_generation())
+    assert principals.get_cached_principal(9002)["full_name"] == "fresh"
+    principals.invalidate_principal(9002)
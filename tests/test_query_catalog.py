@@ -0,0 +1,14 @@
+import inspect
+
+import asyncpg
+
+from app.db.query_catalog import CatalogConnection
+
+
+def test_private_prepare_still_fills_the_statement_cache():
+    # prepare_catalog depends on asyncpg's private Connection._prepare;
+    # bumping the asyncpg pin must keep this signature.
+    params = inspect.signature(asyncpg.Connection._prepare).parameters
+    assert "use_cache" in params
+    assert params["use_cache"].kind is inspect.Parameter.KEYWORD_ONLY
+    assert issubclass(CatalogConnection, asyncpg.Connection)
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from asyncpg import DeadlockDetectedError
+
+from app.core.config import settings
+from app.core.exceptions import TransferContentionException
+from app.services.transaction_service import TransactionService
+
+
+def flaky(failures: int):
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise DeadlockDetectedError("deadlock detected")
+        return {"id": len(calls)}
+
+    return execute, calls
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "TRANSFER_RETRY_BASE_DELAY_SECONDS", 0)
+    monkeypatch.setattr(settings, "TRANSFER_RETRY_MAX_DELAY_SECONDS", 0)
+
+
+def test_direct_path_retries_deadlocks(no_backoff):
+    execute, calls = flaky(failures=2)
+    service = TransactionService(None, None, None)
+    assert asyncio.run(service._at_most_once("transfer", None, execute)) == {"id": 3}
+    assert len(calls) == 3
+
+
+def test_direct_path_gives_up_with_503(no_backoff):
+    execute, calls = flaky(failures=settings.TRANSFER_RETRY_ATTEMPTS + 1)
+    service = TransactionService(None, None, None)
+    with pytest.raises(TransferContentionException):
+        asyncio.run(service._at_most_once("transfer", None, execute))
+    assert len(calls) == settings.TRANSFER_RETRY_ATTEMPTS + 1
+
+
+def test_grouped_path_lets_the_deadlock_fail_the_group():
+    execute, calls = flaky(failures=1)
+    service = TransactionService(None, None, None)
+    with pytest.raises(DeadlockDetectedError):
+        asyncio.run(service._at_most_once("transfer", None, execute, retries=False))
+    assert len(calls) == 1